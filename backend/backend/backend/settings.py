@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shelter.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -109,9 +110,16 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Auth
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'shelter.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_FILTER_BACKENDS': (
+        'shelter.filters.IndexedFilterBackend',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'shelter.fastpath.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 # Swagger
 SPECTACULAR_SETTINGS = {
@@ -128,6 +136,7 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'shelter.serializers.TokenObtainPairSerializer',
 }
 
 # Database
@@ -144,6 +153,50 @@ DATABASES = {
     }
 }
 
+# Cache
+# Local-memory LRU with TTL by default; set REDIS_URL to share the cache between workers
+
+REDIS_URL = os.getenv('REDIS_URL')
+DEVICE_CACHE_TIMEOUT = int(os.getenv('DEVICE_CACHE_TIMEOUT', 30))
+# Also how long a worker may keep accepting a deactivated user or changed credentials
+# when its cache is local memory, as invalidation only reaches the worker making the change
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', 60 if REDIS_URL else 5))
+FORECAST_CACHE_TIMEOUT = int(os.getenv('FORECAST_CACHE_TIMEOUT', 3600))
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv('DASHBOARD_CACHE_TIMEOUT', 3600))
+# How long retried IoT updates with the same Idempotency-Key replay the first result
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+# How long processed notification outbox events are kept; at least the dedupe window
+NOTIFICATION_OUTBOX_RETENTION = int(os.getenv('NOTIFICATION_OUTBOX_RETENTION', 7 * 24 * 3600))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'devices': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'devices',
+        'TIMEOUT': DEVICE_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+if REDIS_URL:
+    for alias in CACHES:
+        CACHES[alias] = {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': alias,
+            'TIMEOUT': CACHES[alias].get('TIMEOUT', 300),
+        }
+
+# Metrics
+# Served at /metrics; set METRICS_TOKEN to require it as a bearer token
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_N_PLUS_ONE_THRESHOLD = int(os.getenv('METRICS_N_PLUS_ONE_THRESHOLD', 5))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
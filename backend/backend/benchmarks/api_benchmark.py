@@ -0,0 +1,242 @@
+"""
+Repeatable benchmark of the key API endpoints.
+
+Seed a dataset once, then run the same benchmark on each commit and
+compare the JSON reports:
+
+    python manage.py seed_benchmark_data --logs 2000000
+    python benchmarks/api_benchmark.py --server wsgi --output before.json
+    git checkout <other commit>
+    python benchmarks/api_benchmark.py --server wsgi --compare before.json
+
+Each scenario runs for `--duration` seconds with `--concurrency`
+keep-alive clients and reports throughput, p50/p95/p99 latency and SQL
+queries per request (read from the Server-Timing header). `--server`
+starts gunicorn like load_test.py; `--base-url` targets a running server.
+
+Stdlib only; the database settings come from the usual .env.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from load_test import BASE_DIR, SERVERS, percentile, wait_for_port
+
+QUERIES = re.compile(rb'desc="(\d+) queries"')
+
+# name: (method, path, authentication)
+SCENARIOS = {
+    'device-poll': ('GET', '/api/devices/?serial_number={serial_number}', 'iot'),
+    'update-device-quantity': ('POST', '/api/update-device-quantity/', 'iot'),
+    'usage-log-list': ('GET', '/api/usage-logs/?device_id={device_id}&page_size=100', 'jwt'),
+    'device-list': ('GET', '/api/devices/?user_id={user_id}', 'jwt'),
+}
+
+
+def build_request(host, scenario, manifest, rng, headers, step):
+    method, path, _ = SCENARIOS[scenario]
+    device = rng.choice(manifest['devices'])
+    user = rng.choice(manifest['users'])
+    path = path.format(serial_number=device['serial_number'], device_id=device['id'], user_id=user['id'])
+    body = b''
+    if method == 'POST':
+        # Alternate so quantities stay within the device limits
+        body = json.dumps({
+            'device_id': device['id'], 'type': 'food', 'action': 'add' if step % 2 == 0 else 'subtract', 'quantity': 1,
+        }).encode()
+    head = f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n'
+    head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+    if body:
+        head += f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+    return head.encode() + b'\r\n' + body
+
+
+async def client(host, port, scenario, manifest, headers, deadline, seed, samples):
+    rng = random.Random(seed)
+    reader = writer = None
+    step = 0
+    while time.monotonic() < deadline:
+        request = build_request(host, scenario, manifest, rng, headers, step)
+        step += 1
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.monotonic()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            status = int(head.split(b' ', 2)[1])
+            queries = QUERIES.search(head)
+            samples.append((time.monotonic() - started, status, int(queries.group(1)) if queries else None))
+            if b'connection: close' in head.lower():
+                writer.close()
+                writer = None
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            samples.append((None, None, None))
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def run_scenario(host, port, scenario, manifest, headers, concurrency, duration, seed):
+    samples = []
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(*[
+        client(host, port, scenario, manifest, headers, deadline, seed + i, samples) for i in range(concurrency)
+    ])
+    elapsed = time.monotonic() - started
+
+    latencies = [latency for latency, status, _ in samples if status is not None and status < 400]
+    queries = [count for _, status, count in samples if count is not None]
+    milliseconds = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'failed': sum(1 for _, status, _ in samples if status is not None and status >= 400),
+        'errors': sum(1 for _, status, _ in samples if status is None),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': milliseconds(percentile(latencies, 0.50)),
+        'p95_ms': milliseconds(percentile(latencies, 0.95)),
+        'p99_ms': milliseconds(percentile(latencies, 0.99)),
+        'mean_ms': milliseconds(statistics.mean(latencies)) if latencies else None,
+        'queries_mean': round(statistics.mean(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def obtain_token(base_url, manifest):
+    request = urllib.request.Request(
+        f'{base_url}/api/token/',
+        data=json.dumps({'username': manifest['users'][0]['username'], 'password': manifest['password']}).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)['access']
+
+
+def run_benchmark(base_url, args, manifest):
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    auth = {
+        'iot': {'iot-device-api-key': args.api_key},
+        'jwt': {'Authorization': f'Bearer {obtain_token(base_url, manifest)}'},
+    }
+    results = {}
+    for scenario in args.scenarios:
+        results[scenario] = asyncio.run(run_scenario(
+            host, port, scenario, manifest, auth[SCENARIOS[scenario][2]], args.concurrency, args.duration, args.seed
+        ))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, max_regression):
+    """
+    Print the change of each metric against `baseline` to stderr.
+    Returns False when a p95 latency regressed by more than `max_regression` percent.
+    """
+    ok = True
+    for scenario, result in report['scenarios'].items():
+        previous = baseline['scenarios'].get(scenario)
+        if previous is None:
+            continue
+        changes = []
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_mean'):
+            before, after = previous.get(metric), result.get(metric)
+            if before and after is not None:
+                change = (after - before) / before * 100
+                changes.append(f'{metric} {before} -> {after} ({change:+.1f}%)')
+                if metric == 'p95_ms' and max_regression is not None and change > max_regression:
+                    ok = False
+        sys.stderr.write(f'{scenario}: ' + ', '.join(changes) + '\n')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--server', choices=sorted(SERVERS), help='Start gunicorn in this mode.')
+    target.add_argument('--base-url', help='Benchmark an already running server, e.g. http://127.0.0.1:8000.')
+    parser.add_argument('--manifest', default=str(BASE_DIR / 'benchmark-manifest.json'))
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--api-key', default=os.getenv('IOT_DEVICE_API_KEY', ''))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0, help='Seeds the choice of devices and users.')
+    parser.add_argument('--output', help='Write the JSON report here as well as to stdout.')
+    parser.add_argument('--compare', help='Baseline JSON report to compare against.')
+    parser.add_argument('--max-regression', type=float, help='Exit 1 if any p95 grows by more than this percent.')
+    args = parser.parse_args()
+
+    with open(args.manifest) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    server = None
+    base_url = args.base_url
+    if args.server:
+        command = SERVERS[args.server] + ['--bind', f'{args.host}:{args.port}', '--workers', str(args.workers)]
+        server = subprocess.Popen(command, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base_url = f'http://{args.host}:{args.port}'
+    try:
+        url = urlsplit(base_url)
+        if not wait_for_port(url.hostname, url.port or 80):
+            raise SystemExit(f"Server at {base_url} is not reachable")
+        scenarios = run_benchmark(base_url.rstrip('/'), args, manifest)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'target': args.server or base_url,
+        'workers': args.workers if args.server else None,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'usage_logs': manifest.get('usage_logs'),
+        'scenarios': scenarios,
+    }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            if not compare(report, json.load(baseline), args.max_regression):
+                raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Concurrent-connection load test for the IoT endpoints.
+
+Starts the API under gunicorn in WSGI (sync workers) and/or ASGI
+(uvicorn workers) mode, holds `--slow-clients` connections that dribble
+their request headers like feeders on a bad network, and measures how
+fast `--concurrency` normal clients are served meanwhile.
+
+    python benchmarks/load_test.py --mode both --serial-number SN-1 \\
+        --concurrency 50 --slow-clients 20 --duration 15
+
+Stdlib only; the database settings come from the usual .env.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'wsgi': ['gunicorn', 'backend.wsgi:application'],
+    'asgi': ['gunicorn', 'backend.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'],
+}
+
+PATHS = {
+    'wsgi': '/api/devices/state/?serial_number={serial}',
+    'asgi': '/api/iot/devices/state/?serial_number={serial}',
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def client(host, port, request, deadline, latencies, errors):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.monotonic()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.monotonic() - started)
+            if b'connection: close' in head.lower():
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            errors.append(1)
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def slow_client(host, port, request, deadline):
+    """
+    Send the request one byte at a time, holding the connection open.
+    """
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        for byte in request:
+            if time.monotonic() >= deadline:
+                break
+            writer.write(bytes([byte]))
+            await writer.drain()
+            await asyncio.sleep(0.5)
+        writer.close()
+    except OSError:
+        pass
+
+
+async def run_load(host, port, path, api_key, concurrency, slow_clients, duration):
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {host}\r\niot-device-api-key: {api_key}\r\n'
+        'Connection: keep-alive\r\n\r\n'
+    ).encode()
+    deadline = time.monotonic() + duration
+    latencies, errors = [], []
+    slow = [asyncio.create_task(slow_client(host, port, request, deadline)) for _ in range(slow_clients)]
+    await asyncio.sleep(0.5)
+    started = time.monotonic()
+    await asyncio.gather(*[client(host, port, request, deadline, latencies, errors) for _ in range(concurrency)])
+    elapsed = time.monotonic() - started
+    await asyncio.gather(*slow)
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+
+    async def probe():
+        while time.monotonic() < deadline:
+            try:
+                _, writer = await asyncio.open_connection(host, port)
+                writer.close()
+                return True
+            except OSError:
+                await asyncio.sleep(0.2)
+        return False
+
+    return asyncio.run(probe())
+
+
+def run_mode(mode, args):
+    command = SERVERS[mode] + ['--bind', f'{args.host}:{args.port}', '--workers', str(args.workers)]
+    server = subprocess.Popen(command, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(args.host, args.port):
+            raise SystemExit(f"{mode} server did not start: {' '.join(command)}")
+        path = PATHS[mode].format(serial=args.serial_number)
+        result = asyncio.run(run_load(
+            args.host, args.port, path, args.api_key, args.concurrency, args.slow_clients, args.duration
+        ))
+    finally:
+        server.terminate()
+        server.wait()
+    return {'mode': mode, 'workers': args.workers, 'concurrency': args.concurrency,
+            'slow_clients': args.slow_clients, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+    parser.add_argument('--serial-number', required=True, help='Serial number of an existing device.')
+    parser.add_argument('--api-key', default=os.getenv('IOT_DEVICE_API_KEY', ''))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--slow-clients', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=15)
+    args = parser.parse_args()
+
+    modes = ['wsgi', 'asgi'] if args.mode == 'both' else [args.mode]
+    json.dump([run_mode(mode, args) for mode in modes], sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Batch detection of jammed or leaking feeders from their usage logs.
+
+Devices are scanned in chunks; each chunk is one query over the last
+`BASELINE + WINDOW` of dispense logs, binned per device, kind and hour
+with NumPy. The recent `WINDOW` is compared against the baseline before
+it, so memory is bounded by the chunk size whatever the table size.
+Anomalies are written to the notification outbox, which turns them into
+notifications in bulk and drops repeats within its dedupe window.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Device, UsageLog
+from .notifications import enqueue
+
+WINDOW = timedelta(hours=24)
+BASELINE = timedelta(days=7)
+CHUNK_SIZE = 500
+
+# An hour is a spike when it exceeds the baseline hourly mean by SPIKE_Z
+# standard deviations and by SPIKE_RATIO times
+SPIKE_Z = 4
+SPIKE_RATIO = 3
+# A kind is stalled when the baseline averaged this many dispenses a day
+# and the recent window has none
+STALLED_DAILY_EVENTS = 4
+# This many identical events in a row, each within REPEAT_GAP of the last
+REPEAT_RUN = 10
+REPEAT_GAP = timedelta(minutes=5)
+
+KINDS = ('food', 'water')
+KIND_OF_LOG = {'subtract_food': 0, 'subtract_water': 1}
+
+
+def scan_devices(device_ids, now):
+    """
+    Return (device_id, event_type) pairs for the anomalies of `device_ids`.
+    """
+    device_ids = list(device_ids)
+    start = now - BASELINE - WINDOW
+    rows = list(
+        UsageLog.objects.filter(
+            device_id__in=device_ids, log_type__in=KIND_OF_LOG, time__gte=start, time__lt=now
+        ).order_by('device_id', 'time').values_list('device_id', 'log_type', 'quantity', 'time')
+    )
+    if not rows:
+        return []
+
+    index = {device_id: i for i, device_id in enumerate(device_ids)}
+    log_devices, log_types, quantities, times = zip(*rows)
+    devices = np.array([index[device_id] for device_id in log_devices])
+    kinds = np.array([KIND_OF_LOG[log_type] for log_type in log_types])
+    quantities = np.array(quantities)
+    seconds = np.array([(time - start).total_seconds() for time in times])
+
+    baseline_hours = int(BASELINE.total_seconds() // 3600)
+    hours = baseline_hours + int(WINDOW.total_seconds() // 3600)
+    slots = (devices * len(KINDS) + kinds) * hours + np.minimum(seconds // 3600, hours - 1).astype(int)
+    shape = (len(device_ids), len(KINDS), hours)
+    hourly = np.bincount(slots, weights=quantities, minlength=np.prod(shape)).reshape(shape)
+    counts = np.bincount(slots, minlength=np.prod(shape)).reshape(shape)
+
+    baseline, recent = hourly[:, :, :baseline_hours], hourly[:, :, baseline_hours:]
+    mean, std = baseline.mean(axis=2), baseline.std(axis=2)
+    peak = recent.max(axis=2)
+    active = counts[:, :, :baseline_hours].sum(axis=2) >= STALLED_DAILY_EVENTS * BASELINE.days
+    spikes = active & (peak > mean + SPIKE_Z * std) & (peak > SPIKE_RATIO * mean)
+    stalled = active & (counts[:, :, baseline_hours:].sum(axis=2) == 0)
+
+    # Runs of identical events in the recent window; rows are sorted by device and time
+    recent_rows = seconds >= baseline_hours * 3600
+    run_devices, run_kinds = devices[recent_rows], kinds[recent_rows]
+    run_quantities, run_seconds = quantities[recent_rows], seconds[recent_rows]
+    repeats = (
+        (run_devices[1:] == run_devices[:-1]) & (run_kinds[1:] == run_kinds[:-1])
+        & (run_quantities[1:] == run_quantities[:-1])
+        & (np.diff(run_seconds) <= REPEAT_GAP.total_seconds())
+    )
+    run_ids = np.concatenate(([0], np.cumsum(~repeats)))
+    run_lengths = np.bincount(run_ids)
+    longest = np.zeros(len(device_ids), dtype=int)
+    if run_ids.size:
+        np.maximum.at(longest, run_devices, run_lengths[run_ids])
+
+    events = []
+    for i, device_id in enumerate(device_ids):
+        for k, kind in enumerate(KINDS):
+            if spikes[i, k]:
+                events.append((device_id, f'{kind}_spike'))
+            if stalled[i, k]:
+                events.append((device_id, f'{kind}_stalled'))
+        if longest[i] >= REPEAT_RUN:
+            events.append((device_id, 'repeated_events'))
+    return events
+
+
+def detect_anomalies(now=None, chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Scan every device and enqueue a notification event per anomaly.
+    Returns the (device_id, event_type) pairs found.
+    """
+    now = now or timezone.now()
+    found = []
+    device_ids = Device.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = [device_id for _, device_id in zip(range(chunk_size), device_ids)]
+        if not chunk:
+            return found
+        events = scan_devices(chunk, now)
+        found += events
+        if events and not dry_run:
+            with transaction.atomic():
+                enqueue(events)
@@ -0,0 +1,173 @@
+"""
+Async versions of the IoT endpoints for ASGI deployments.
+
+A feeder waiting on a slow network holds an event-loop task instead of a
+whole sync worker. Reads use the async ORM; the quantity write runs the
+same transactional code as the DRF view in a worker thread, because
+Django transactions are not available to async code yet.
+"""
+import asyncio
+import json
+import os
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import APIException, NotAuthenticated, PermissionDenied, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from .authentication import CachedJWTAuthentication
+from .live import device_event_listener
+from .models import Device
+from .permissions import has_role
+from .serializers import ModifyQuantitySerializer
+from .views import DEVICE_STATE_FIELDS, device_state_etag, idempotency_key, update_device_quantity
+
+
+def api_error(exc):
+    return JsonResponse({'detail': exc.detail} if isinstance(exc.detail, str) else exc.detail,
+                        status=exc.status_code, encoder=JSONEncoder, safe=False)
+
+
+async def authenticate(request):
+    """
+    Same rules as the DRF IoT views: a matching iot-device-api-key skips JWT,
+    otherwise a bearer token, if sent, must be valid.
+    """
+    if request.headers.get('iot-device-api-key') == os.getenv('IOT_DEVICE_API_KEY'):
+        return None
+    return await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+
+
+@require_GET
+async def device_state(request, pk=None):
+    """
+    Async twin of `DeviceViewSet.state`: compact state by serial number or id.
+    """
+    try:
+        await authenticate(request)
+    except APIException as exc:
+        return api_error(exc)
+
+    if pk is not None:
+        try:
+            lookup = {'id': uuid.UUID(str(pk))}
+        except ValueError:
+            return JsonResponse({'detail': 'Device not found'}, status=404)
+    elif request.GET.get('serial_number'):
+        lookup = {'serial_number': request.GET['serial_number']}
+    else:
+        return JsonResponse({'serial_number': ['This query parameter is required.']}, status=400)
+
+    state = await Device.objects.filter(**lookup).values(*DEVICE_STATE_FIELDS).afirst()
+    if state is None:
+        return JsonResponse({'detail': 'Device not found'}, status=404)
+    etag = device_state_etag(state)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        response = JsonResponse(state, encoder=JSONEncoder)
+    response['ETag'] = etag
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def update_quantity(request):
+    """
+    Async twin of `UpdateDeviceQuantityViewSet.create`.
+    """
+    try:
+        await authenticate(request)
+    except APIException as exc:
+        return api_error(exc)
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'JSON parse error'}, status=400)
+    serializer = ModifyQuantitySerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    action = serializer.validated_data['action']
+    try:
+        food_quantity, water_quantity = await sync_to_async(update_device_quantity)(
+            serializer.validated_data['device_id'],
+            serializer.validated_data['type'],
+            action,
+            serializer.validated_data['quantity'],
+            idempotency_key(request),
+        )
+    except APIException as exc:
+        return api_error(exc)
+
+    return JsonResponse({
+        "food_quantity": food_quantity,
+        "water_quantity": water_quantity,
+        "message": f"{action.capitalize()} operation successful and usage log created."
+    })
+
+
+@require_GET
+async def device_events(request):
+    """
+    Server-sent events stream of quantity changes and new usage logs for
+    the authenticated user's devices. Admins may pass `user_id` to follow
+    another user's.
+    """
+    try:
+        # The device API key identifies no user, so only a bearer token will do
+        auth = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+        user_id = await sync_to_async(events_user_id)(auth[0] if auth else None, request.GET.get('user_id'))
+    except APIException as exc:
+        return api_error(exc)
+
+    # A stream never ends, so it would pin a sync worker for good
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'Live updates require the ASGI server.'}, status=501)
+    if connection.vendor != 'postgresql':
+        return JsonResponse({'detail': 'Live updates require PostgreSQL.'}, status=501)
+
+    response = StreamingHttpResponse(stream_events(user_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def events_user_id(user, user_id=None):
+    """
+    The user whose events `user` may stream: their own, or any user's for
+    admins.
+    """
+    if user is None:
+        raise NotAuthenticated()
+    if not user_id:
+        return user.id
+    try:
+        user_id = uuid.UUID(user_id)
+    except ValueError:
+        raise ValidationError({'user_id': ['Must be a valid UUID.']})
+    if user_id != user.id and not has_role(user, ('admin',)):
+        raise PermissionDenied("Only admins can follow another user's devices.")
+    return user_id
+
+
+async def stream_events(user_id, keepalive=15):
+    queue = device_event_listener.subscribe(user_id)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        device_event_listener.unsubscribe(user_id, queue)
@@ -0,0 +1,315 @@
+"""
+Bulk import and export of pets, devices and usage logs as CSV or NDJSON.
+
+Imports stream the input and work in chunks: each chunk is validated
+with one serializer instance, its parents are checked with one query,
+and it is written with one `bulk_create` in its own transaction.
+Exports read rows through `values_list().iterator()` (a server-side
+cursor on PostgreSQL), so memory stays constant in both directions.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils.text import capfirst
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import dashboard, forecasting
+from .cache import device_cache, forecast_cache
+from .models import User, Pet, Device, UsageLog, ConsumptionRollup
+from .ownership import sync_devices, sync_rollups, sync_usage_logs
+from .rollups import rebuild_rollups, record_usage
+from .serializers import PetImportSerializer, DeviceImportSerializer, UsageLogImportSerializer
+
+FORMATS = ('csv', 'ndjson')
+CONFLICT_MODES = ('skip', 'update')
+CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 100
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def read_rows(lines, file_format):
+    """
+    Yield (row number, data) for an iterable of text lines. CSV rows drop
+    empty cells so model defaults apply; NDJSON lines that are not JSON
+    objects yield None as data.
+    """
+    if file_format == 'csv':
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, {key: value for key, value in row.items() if key is not None and value not in ('', None)}
+        return
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+        yield number, data if isinstance(data, dict) else None
+
+
+class Importer:
+    """
+    Chunked bulk import of one model. Rows whose `conflict_field` already
+    exists are skipped, or overwritten with the columns present in the
+    input when `conflict` is 'update'.
+    """
+    model = None
+    serializer_class = None
+    parent_field = None
+    parent_model = None
+    conflict_field = 'id'
+    update_fields = ()
+
+    def __init__(self, conflict='skip', chunk_size=CHUNK_SIZE):
+        if conflict == 'update' and not self.update_fields:
+            raise ValueError(f"{capfirst(self.model._meta.verbose_name_plural)} can only be imported with conflict=skip.")
+        self.conflict = conflict
+        self.chunk_size = chunk_size
+        self.serializer = self.serializer_class()
+        self.result = {'created': 0, 'updated': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+
+    def run(self, rows):
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            with transaction.atomic():
+                self.import_chunk(chunk)
+        self.finish()
+        return self.result
+
+    def fail(self, number, errors):
+        self.result['failed'] += 1
+        if len(self.result['errors']) < MAX_REPORTED_ERRORS:
+            self.result['errors'].append({'row': number, 'errors': errors})
+
+    def import_chunk(self, chunk):
+        columns = set()
+        objects = {}
+        for number, data in chunk:
+            if data is None:
+                self.fail(number, {'non_field_errors': ["Row is not a JSON object."]})
+                continue
+            try:
+                validated_data = self.serializer.run_validation(data)
+            except ValidationError as exc:
+                self.fail(number, exc.detail)
+                continue
+            instance = self.model(**validated_data)
+            key = getattr(instance, self.conflict_field)
+            if key in objects:
+                self.fail(number, {self.conflict_field: ["Repeats an earlier row."]})
+                continue
+            columns.update(validated_data)
+            objects[key] = (number, instance)
+
+        parent_ids = {getattr(instance, self.parent_field) for _, instance in objects.values()}
+        known_parents = set(self.parent_model.objects.filter(id__in=parent_ids).values_list('id', flat=True))
+        for key, (number, instance) in list(objects.items()):
+            if getattr(instance, self.parent_field) not in known_parents:
+                self.fail(number, {self.parent_field: ["Does not exist."]})
+                del objects[key]
+
+        if self.conflict_field != 'id':
+            # An id already taken under another key would fail the whole upsert
+            taken = dict(
+                self.model.objects.filter(id__in=[instance.id for _, instance in objects.values()])
+                .values_list('id', self.conflict_field)
+            )
+            for key, (number, instance) in list(objects.items()):
+                if taken.get(instance.id, key) != key:
+                    self.fail(number, {'id': ["Belongs to another row."]})
+                    del objects[key]
+
+        existing = dict(
+            self.model.objects.filter(**{f'{self.conflict_field}__in': objects})
+            .values_list(self.conflict_field, 'id')
+        )
+        update_fields = [field for field in self.update_fields if field in columns]
+        if self.conflict == 'update' and update_fields:
+            self.updating(list(existing.items()))
+            self.model.objects.bulk_create(
+                [instance for _, instance in objects.values()],
+                update_conflicts=True, unique_fields=[self.conflict_field], update_fields=update_fields,
+            )
+            created = [instance for key, (_, instance) in objects.items() if key not in existing]
+            self.result['updated'] += len(existing)
+            self.updated(list(existing.items()))
+        else:
+            new = {key: item for key, item in objects.items() if key not in existing}
+            # ignore_conflicts also drops rows clashing on another unique column
+            # (e.g. a device id taken under a different serial number) or
+            # inserted concurrently since the lookup, so read back what landed
+            self.model.objects.bulk_create([instance for _, instance in new.values()], ignore_conflicts=True)
+            inserted = set(
+                self.model.objects.filter(id__in=[instance.id for _, instance in new.values()])
+                .values_list('id', self.conflict_field)
+            )
+            created = []
+            for key, (number, instance) in new.items():
+                if (instance.id, key) in inserted:
+                    created.append(instance)
+                else:
+                    self.fail(number, {self.conflict_field: ["Conflicts with an existing row."]})
+            self.result['skipped'] += len(existing)
+        self.result['created'] += len(created)
+        self.created(created)
+
+    def created(self, instances):
+        """
+        Hook for side effects that post_save signals would have handled.
+        """
+
+    def updating(self, keys):
+        """
+        Hook called with (conflict key, id) pairs of rows about to be overwritten.
+        """
+
+    def updated(self, keys):
+        """
+        Hook called with (conflict key, id) pairs of overwritten rows.
+        """
+
+    def finish(self):
+        """
+        Hook called once every chunk has been written.
+        """
+
+
+class PetImporter(Importer):
+    model = Pet
+    serializer_class = PetImportSerializer
+    parent_field = 'user_id'
+    parent_model = User
+    update_fields = ('user_id', 'name', 'breed', 'species', 'birth_date', 'weight', 'age', 'image_url')
+
+    def created(self, instances):
+        dashboard.invalidate({pet.user_id for pet in instances}, 'pets')
+
+    def updating(self, keys):
+        self.previous_owners = set(Pet.objects.filter(id__in=[pk for _, pk in keys]).values_list('user_id', flat=True))
+
+    def updated(self, keys):
+        # Upserts bypass Pet.save, so carry owner changes over here
+        pet_ids = [pk for _, pk in keys]
+        owners = set(Pet.objects.filter(id__in=pet_ids).values_list('user_id', flat=True))
+        dashboard.invalidate(owners | self.previous_owners, 'pets')
+        sync_devices(Device.objects.filter(pet_id__in=pet_ids))
+        sync_usage_logs(UsageLog.objects.filter(pet_id__in=pet_ids))
+        # Cached device payloads embed their pet
+        devices = list(Device.objects.filter(pet_id__in=pet_ids).values_list('id', 'serial_number'))
+        transaction.on_commit(lambda: device_cache.invalidate(devices))
+
+
+class DeviceImporter(Importer):
+    model = Device
+    serializer_class = DeviceImportSerializer
+    parent_field = 'pet_id'
+    parent_model = Pet
+    conflict_field = 'serial_number'
+    update_fields = (
+        'pet_id', 'status', 'food_quantity', 'water_quantity', 'battery_quantity', 'food_limit', 'water_limit',
+    )
+
+    def updated(self, keys):
+        devices = [(pk, serial_number) for serial_number, pk in keys]
+        # The upsert keeps the old owner of devices moved to another pet
+        device_ids = [pk for pk, _ in devices]
+        sync_devices(Device.objects.filter(id__in=device_ids))
+        sync_usage_logs(UsageLog.objects.filter(device_id__in=device_ids))
+        sync_rollups(ConsumptionRollup.objects.filter(device_id__in=device_ids))
+        transaction.on_commit(lambda: device_cache.invalidate(devices))
+
+
+class UsageLogImporter(Importer):
+    """
+    Usage logs are only ever added: overwriting them would put the
+    consumption rollups out of step. Small imports update the rollups
+    incrementally; larger ones rebuild them for the touched devices at
+    the end, one grouped query instead of a write per bucket.
+
+    Once the table is partitioned its primary key is (id, time), so a row
+    reusing an id with another time would not conflict. The id lookup of
+    each chunk is what skips it, and on PostgreSQL imports hold a lock
+    until their chunk commits so concurrent ones cannot both miss an id.
+    """
+    model = UsageLog
+    serializer_class = UsageLogImportSerializer
+    parent_field = 'device_id'
+    parent_model = Device
+    rebuild_threshold = CHUNK_SIZE
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = []
+        self.device_ids = set()
+
+    def import_chunk(self, chunk):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f'{UsageLog._meta.db_table}:import'])
+        super().import_chunk(chunk)
+
+    def created(self, instances):
+        self.device_ids.update(instance.device_id for instance in instances)
+        if self.pending is not None:
+            self.pending += instances
+            if len(self.pending) > self.rebuild_threshold:
+                self.pending = None
+
+    def finish(self):
+        if self.pending is not None:
+            record_usage(self.pending)
+            forecasting.record_usage(self.pending)
+        elif self.device_ids:
+            rebuild_rollups(self.device_ids)
+            forecast_cache.invalidate(self.device_ids)
+
+
+IMPORTERS = {
+    'pets': PetImporter,
+    'devices': DeviceImporter,
+    'usage-logs': UsageLogImporter,
+}
+
+# Export columns match the import serializers so files round-trip
+EXPORT_FIELDS = {
+    Pet: ('id', 'user_id', 'name', 'breed', 'species', 'birth_date', 'weight', 'age', 'image_url'),
+    Device: (
+        'id', 'pet_id', 'serial_number', 'status', 'food_quantity', 'water_quantity',
+        'battery_quantity', 'food_limit', 'water_limit',
+    ),
+    UsageLog: ('id', 'device_id', 'log_type', 'quantity', 'time', 'duration'),
+}
+
+
+class Echo:
+    """
+    File-like object for csv.writer that returns each row instead of storing it.
+    """
+    def write(self, value):
+        return value
+
+
+def export_lines(queryset, file_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield `queryset` as CSV or NDJSON lines, one row at a time.
+    """
+    fields = EXPORT_FIELDS[queryset.model]
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+    encoder = JSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
@@ -0,0 +1,231 @@
+from django.conf import settings
+from django.core.cache import caches
+
+
+class DeviceCache:
+    """
+    Read-through cache of serialized devices keyed by id, with serial
+    numbers mapping to ids. Backed by the `devices` entry in CACHES: a
+    local-memory LRU with TTL by default, or Redis when REDIS_URL is set.
+    """
+    alias = 'devices'
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def serial_key(self, serial_number):
+        return f'device:serial:{serial_number}'
+
+    def id_key(self, device_id):
+        return f'device:id:{device_id}'
+
+    def get_by_serial(self, serial_number, loader):
+        device_id = self.cache.get(self.serial_key(serial_number))
+        data = self.cache.get(self.id_key(device_id)) if device_id else None
+        # A device renamed since it was cached no longer answers to its old serial
+        if data is not None and data['serial_number'] == serial_number:
+            self.hits += 1
+            return data
+        self.misses += 1
+        data = loader()
+        if data is not None:
+            self.set(data)
+        return data
+
+    def get_by_id(self, device_id, loader):
+        data = self.cache.get(self.id_key(device_id))
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+        data = loader()
+        if data is not None:
+            self.set(data)
+        return data
+
+    def set(self, data):
+        data = dict(data)
+        self.cache.set_many({
+            self.serial_key(data['serial_number']): data['id'],
+            self.id_key(data['id']): data,
+        })
+
+    def invalidate(self, devices):
+        """
+        Drop cached entries for an iterable of (device_id, serial_number) pairs.
+        """
+        keys = []
+        for device_id, serial_number in devices:
+            keys += [self.id_key(device_id), self.serial_key(serial_number)]
+        if keys:
+            self.cache.delete_many(keys)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+        }
+
+
+device_cache = DeviceCache()
+
+
+class UserCache:
+    """
+    Short-TTL cache of authenticated users with their role preloaded, so
+    token authentication and role checks run no queries on a hit.
+    Entries are dropped by signals when a user or their role changes. Only
+    a shared cache (REDIS_URL) carries that to every worker; with local
+    memory the others notice once AUTH_USER_CACHE_TIMEOUT, a few seconds
+    by default, runs out.
+    """
+    alias = 'default'
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def timeout(self):
+        return settings.AUTH_USER_CACHE_TIMEOUT
+
+    def key(self, user_id):
+        return f'auth:user:{user_id}'
+
+    def get(self, user_id, loader):
+        user = self.cache.get(self.key(user_id))
+        if user is not None:
+            self.hits += 1
+            return user
+        self.misses += 1
+        user = loader()
+        if user is not None:
+            self.cache.set(self.key(user_id), user, self.timeout)
+        return user
+
+    def invalidate(self, user_ids):
+        keys = [self.key(user_id) for user_id in user_ids]
+        if keys:
+            self.cache.delete_many(keys)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+        }
+
+
+user_cache = UserCache()
+
+
+class ForecastCache:
+    """
+    Decayed consumption totals per device, kept by `shelter.forecasting`
+    and folded forward as new usage logs are written.
+    """
+    alias = 'default'
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def timeout(self):
+        return settings.FORECAST_CACHE_TIMEOUT
+
+    def key(self, device_id):
+        return f'forecast:{device_id}'
+
+    def get_many(self, device_ids):
+        found = self.cache.get_many([self.key(device_id) for device_id in device_ids])
+        return {device_id: found[self.key(device_id)] for device_id in device_ids if self.key(device_id) in found}
+
+    def set_many(self, states):
+        self.cache.set_many({self.key(device_id): state for device_id, state in states.items()}, self.timeout)
+
+    def invalidate(self, device_ids):
+        keys = [self.key(device_id) for device_id in device_ids]
+        if keys:
+            self.cache.delete_many(keys)
+
+
+forecast_cache = ForecastCache()
+
+
+class IdempotencyCache:
+    """
+    Front cache of applied quantity updates by device and Idempotency-Key,
+    holding the (food_quantity, water_quantity) they returned. The
+    `IdempotencyKey` table is the source of truth; this only lets retries
+    skip the database.
+    """
+    alias = 'default'
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def timeout(self):
+        return settings.IDEMPOTENCY_KEY_TTL
+
+    def key(self, device_id, key):
+        return f'idempotency:{device_id}:{key}'
+
+    def get(self, device_id, key):
+        return self.cache.get(self.key(device_id, key))
+
+    def set(self, device_id, key, result):
+        self.cache.set(self.key(device_id, key), result, self.timeout)
+
+
+idempotency_cache = IdempotencyCache()
+
+
+class DashboardCache:
+    """
+    Sections of the per-user dashboard snapshot, keyed by (user_id, section)
+    and kept by `shelter.dashboard`. Writes drop or update the sections they
+    touch; the timeout only bounds how long a missed invalidation lasts.
+    """
+    alias = 'default'
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def timeout(self):
+        return settings.DASHBOARD_CACHE_TIMEOUT
+
+    def key(self, user_id, section):
+        return f'dashboard:{section}:{user_id}'
+
+    def get_many(self, pairs):
+        keys = {pair: self.key(*pair) for pair in pairs}
+        found = self.cache.get_many(keys.values())
+        return {pair: found[key] for pair, key in keys.items() if key in found}
+
+    def set_many(self, values):
+        self.cache.set_many({self.key(*pair): value for pair, value in values.items()}, self.timeout)
+
+    def invalidate(self, pairs):
+        keys = [self.key(*pair) for pair in pairs]
+        if keys:
+            self.cache.delete_many(keys)
+
+
+dashboard_cache = DashboardCache()
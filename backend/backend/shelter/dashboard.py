@@ -0,0 +1,89 @@
+"""
+Per-user dashboard snapshot.
+
+Pet count, unread notification count and active subscription are cached
+per user, one key per section, and writes drop only the sections they
+affect. Device states and consumption change with every feeder event, so
+they are read live: the devices from their owner index, consumption as
+one sum over the hourly rollups of the user's pets, which the write path
+already keeps. A warm snapshot is one cache read and two indexed queries.
+Consumption covers the current hour and the 23 before it.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .cache import dashboard_cache
+from .models import Pet, Notification, Subscription, Device, ConsumptionRollup
+from .rollups import bucket_start
+
+WINDOW_HOURS = 24
+DEVICE_FIELDS = (
+    'id', 'serial_number', 'status', 'food_quantity', 'water_quantity',
+    'battery_quantity', 'food_limit', 'water_limit',
+)
+SUBSCRIPTION_FIELDS = ('id', 'plan_type', 'start_date', 'end_date')
+
+
+def window_start(now):
+    return bucket_start(now, ConsumptionRollup.HOUR) - timedelta(hours=WINDOW_HOURS - 1)
+
+
+def load_pets(user_id, now):
+    return Pet.objects.filter(user_id=user_id).count()
+
+
+def load_notifications(user_id, now):
+    return Notification.objects.filter(user_id=user_id, read_at__isnull=True).count()
+
+
+def load_subscription(user_id, now):
+    return Subscription.objects.filter(user_id=user_id, status='active').order_by('-end_date').values(
+        *SUBSCRIPTION_FIELDS
+    ).first()
+
+
+def consumption(user_id, since):
+    return ConsumptionRollup.objects.filter(
+        pet__user_id=user_id, granularity=ConsumptionRollup.HOUR, bucket_start__gte=since
+    ).aggregate(food=Sum('food_consumption', default=0), water=Sum('water_consumption', default=0))
+
+
+LOADERS = {
+    'pets': load_pets,
+    'notifications': load_notifications,
+    'subscription': load_subscription,
+}
+
+
+def snapshot(user_id, now=None):
+    now = now or timezone.now()
+    cached = dashboard_cache.get_many([(user_id, section) for section in LOADERS])
+    sections = {section: value for (_, section), value in cached.items()}
+    missing = {section: load(user_id, now) for section, load in LOADERS.items() if section not in sections}
+    if missing:
+        dashboard_cache.set_many({(user_id, section): value for section, value in missing.items()})
+        sections.update(missing)
+
+    since = window_start(now)
+    devices = list(Device.objects.filter(owner_id=user_id).order_by('serial_number').values(*DEVICE_FIELDS))
+    return {
+        'user_id': user_id,
+        'computed_at': now,
+        'pet_count': sections['pets'],
+        'devices': devices,
+        'consumption_24h': {'since': since, **consumption(user_id, since)},
+        'unread_notifications': sections['notifications'],
+        'active_subscription': sections['subscription'],
+    }
+
+
+def invalidate(user_ids, *sections):
+    """
+    Drop `sections` of the users' snapshots once the transaction commits.
+    """
+    pairs = [(user_id, section) for user_id in set(user_ids) if user_id is not None for section in sections]
+    if pairs:
+        transaction.on_commit(lambda: dashboard_cache.invalidate(pairs))
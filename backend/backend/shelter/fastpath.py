@@ -0,0 +1,202 @@
+"""
+Read-only fast path for large list responses.
+
+`compile_plan` turns a (shaped) ModelSerializer into the `.values()`
+columns it reads and one converter per field, chosen once: the same
+conversion the DRF field would apply, without building model instances
+or walking serializer fields per row. Output is identical to the
+serializer's; serializers with fields the plan cannot reproduce (method
+fields, dotted sources, to-many relations) get no plan and callers fall
+back to the serializer.
+"""
+from datetime import date
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializers import shaped
+
+# Fields whose own to_representation takes the column value as it is
+SAFE_REPRESENTATIONS = {
+    serializers.BooleanField.to_representation,
+    serializers.ChoiceField.to_representation,
+    serializers.DecimalField.to_representation,
+    serializers.DurationField.to_representation,
+}
+
+
+class Plan:
+    """
+    Builds the serializer's representation of `.values(*plan.columns)` rows.
+    """
+    def __init__(self, columns, fields):
+        self.columns = columns
+        # (name, column, converter) or (name, foreign key column, nested Plan)
+        self.fields = fields
+
+    def row_builder(self, current_timezone):
+        """
+        A function of one row, with converters bound to `current_timezone`.
+        """
+        fields = []
+        for name, column, convert in self.fields:
+            nested = isinstance(convert, Plan)
+            if nested or isinstance(convert, DateTimeConverter):
+                convert = convert.row_builder(current_timezone)
+            fields.append((name, column, convert, nested))
+
+        def build(row):
+            data = {}
+            for name, column, convert, nested in fields:
+                value = row[column]
+                if value is None:
+                    data[name] = None
+                else:
+                    data[name] = convert(row) if nested else convert(value)
+            return data
+        return build
+
+    def build_many(self, rows):
+        build = self.row_builder(timezone.get_current_timezone())
+        return [build(row) for row in rows]
+
+
+class DateTimeConverter:
+    """
+    DateTimeField.to_representation with the timezone looked up once per
+    response instead of once per value.
+    """
+    def __init__(self, field):
+        self.field = field
+
+    def row_builder(self, current_timezone):
+        field = self.field
+        field_timezone = field.timezone if hasattr(field, 'timezone') else (current_timezone if settings.USE_TZ else None)
+        if field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            if value.utcoffset() is None:
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+
+
+@lru_cache(maxsize=1024)
+def compile_plan(serializer_class, fields=None, expand=None):
+    """
+    The Plan of `serializer_class` shaped by `fields` and `expand`, or None.
+    """
+    plan = _compile(shaped(serializer_class, fields, expand), '')
+    if plan is None:
+        return None
+    columns = []
+    _collect_columns(plan, columns)
+    plan.columns = tuple(dict.fromkeys(columns))
+    return plan
+
+
+def _compile(serializer, prefix):
+    model = serializer.Meta.model
+    plan_fields = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*' or len(field.source_attrs) > 1:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        column = prefix + model_field.name
+
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer):
+                return None
+            nested = _compile(field, column + '__')
+            if nested is None:
+                return None
+            plan_fields.append((name, column, nested))
+            continue
+        convert = converter(field, model_field)
+        if convert is None:
+            return None
+        plan_fields.append((name, column, convert))
+    return Plan((), plan_fields)
+
+
+def _collect_columns(plan, columns):
+    for _, column, convert in plan.fields:
+        columns.append(column)
+        if isinstance(convert, Plan):
+            _collect_columns(convert, columns)
+
+
+def converter(field, model_field):
+    """
+    A function of the column value returning what `field.to_representation`
+    returns for the model attribute. None values never reach it.
+    """
+    if isinstance(field, serializers.RelatedField):
+        if not isinstance(field, serializers.PrimaryKeyRelatedField) or field.pk_field is not None:
+            return None
+        # The column holds the related pk; the renderer would str() a UUID
+        if isinstance(model_field.target_field, models.UUIDField):
+            return str
+        return _identity
+
+    method = type(field).to_representation
+    if method is serializers.CharField.to_representation:
+        return str
+    if method is serializers.UUIDField.to_representation:
+        return str if field.uuid_format == 'hex_verbose' else field.to_representation
+    if method is serializers.FloatField.to_representation:
+        return float
+    if method is serializers.IntegerField.to_representation:
+        return int
+    if method is serializers.DateTimeField.to_representation:
+        if getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601:
+            return DateTimeConverter(field)
+        return field.to_representation
+    if method is serializers.DateField.to_representation and getattr(field, 'format', api_settings.DATE_FORMAT) == ISO_8601:
+        return date.isoformat
+    if method in SAFE_REPRESENTATIONS:
+        return field.to_representation
+    return None
+
+
+def _identity(value):
+    return value
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer with one encoder built up front instead of per response.
+    Output is byte-identical; pretty-printed responses use JSONRenderer.
+    """
+    encoder = JSONEncoder(
+        ensure_ascii=JSONRenderer.ensure_ascii,
+        allow_nan=not JSONRenderer.strict,
+        separators=(',', ':') if JSONRenderer.compact else (', ', ': '),
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = self.encoder.encode(data)
+        if '\u2028' in ret or '\u2029' in ret:
+            ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        return ret.encode()
+
@@ -0,0 +1,243 @@
+"""
+Declarative, index-aware list filters.
+
+A FilterSet names the query parameters a view accepts, the model path
+each one filters and the lookups allowed on it:
+
+    class UsageLogFilterSet(FilterSet):
+        model = UsageLog
+        device_id = Filter('device', serializers.UUIDField())
+        time = Filter('time', serializers.DateTimeField(), lookups=['gte', 'lt'], requires=['device_id'])
+        ordering = ['time', '-time']
+
+`time` is exposed as `?time__gte=` and `?time__lt=`, `in` lookups take
+comma-separated values. Every filter must hit an index on its own, or
+`requires` another filter that does, so no accepted combination scans a
+whole table. The same goes for orderings: a column that does not lead an
+index is only accepted together with an exact filter on the column
+before it in one, like `time` with `device_id` above. FilterSets are
+checked and compiled into a query-parameter serializer when the class is
+defined, so a bad declaration fails at startup and requests only run the
+serializer.
+"""
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from .models import UserDetails, Notification, Subscription, Device, UsageLog
+
+ORDERING_PARAM = 'ordering'
+
+
+class CommaSeparatedField(serializers.ListField):
+    """
+    A list given as comma-separated query parameters, `?a=x,y` or `?a=x&a=y`.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [data]
+        data = [value for item in data for value in str(item).split(',') if value]
+        return super().to_internal_value(data)
+
+
+class Filter:
+    def __init__(self, path, field, lookups=('exact',), requires=()):
+        self.path = path
+        self.field = field
+        self.lookups = tuple(lookups)
+        self.requires = tuple(requires)
+
+    def params(self, name):
+        """
+        (query parameter, ORM lookup, serializer field) for each lookup.
+        """
+        for lookup in self.lookups:
+            param = name if lookup == 'exact' else f'{name}__{lookup}'
+            orm_lookup = self.path if lookup == 'exact' else f'{self.path}__{lookup}'
+            field = type(self.field)(*self.field._args, **{**self.field._kwargs, 'required': False})
+            if lookup == 'in':
+                field = CommaSeparatedField(child=field, required=False, min_length=1)
+            yield param, orm_lookup, field
+
+
+class FilterSet:
+    model = None
+    # Accepted `?ordering=` values, each an indexed column; ties break on pk
+    ordering = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.filters = {
+            name: value for base in reversed(cls.__mro__)
+            for name, value in vars(base).items() if isinstance(value, Filter)
+        }
+        cls.check()
+        cls.ordering_requires = {
+            ordering: () if is_indexed(cls.model, ordering.lstrip('-')) else cls.ordering_filters(ordering.lstrip('-'))
+            for ordering in cls.ordering
+        }
+        cls.lookups = {}
+        fields = {}
+        for name, spec in cls.filters.items():
+            for param, orm_lookup, field in spec.params(name):
+                cls.lookups[param] = (name, orm_lookup)
+                fields[param] = field
+        if cls.ordering:
+            fields[ORDERING_PARAM] = serializers.ChoiceField(choices=list(cls.ordering), required=False)
+        cls.serializer_class = type(f'{cls.__name__}Params', (serializers.Serializer,), fields)
+
+    @classmethod
+    def check(cls):
+        if cls.model is None:
+            raise ImproperlyConfigured(f"{cls.__name__} must set `model`")
+        for name, spec in cls.filters.items():
+            unknown = set(spec.requires) - set(cls.filters)
+            if unknown:
+                raise ImproperlyConfigured(f"{cls.__name__}.{name} requires unknown filters {sorted(unknown)}")
+            if not is_indexed(cls.model, spec.path) and not any(
+                is_indexed(cls.model, cls.filters[required].path) and not cls.filters[required].requires
+                for required in spec.requires
+            ):
+                raise ImproperlyConfigured(
+                    f"{cls.__name__}.{name} filters {spec.path!r}, which has no index; "
+                    f"index it or require a filter on an indexed column"
+                )
+        for ordering in cls.ordering:
+            column = ordering.lstrip('-')
+            if not is_indexed(cls.model, column) and not cls.ordering_filters(column):
+                raise ImproperlyConfigured(
+                    f"{cls.__name__} orders by {ordering!r}, which leads no index; "
+                    f"index it or add an exact filter on the column before it in one"
+                )
+
+    @classmethod
+    def ordering_filters(cls, column):
+        """
+        Names of the filters that narrow `column` to a sorted index range:
+        unconditional exact filters on the column right before it in an index.
+        """
+        return tuple(
+            name for name, spec in cls.filters.items()
+            if 'exact' in spec.lookups and not spec.requires and any(
+                columns[:2] == [spec.path, column] for columns in index_columns(cls.model)
+            )
+        )
+
+    @classmethod
+    def filter_queryset(cls, queryset, query_params):
+        serializer = cls.serializer_class(data=query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        used = {cls.lookups[param][0] for param in params if param in cls.lookups}
+        errors = {}
+        for name in used:
+            requires = cls.filters[name].requires
+            if requires and not used.intersection(requires):
+                errors[name] = [f"Filtering by {name} also needs one of: {', '.join(requires)}."]
+        requires = cls.ordering_requires.get(params.get(ORDERING_PARAM), ())
+        if requires and not used.intersection(requires):
+            errors[ORDERING_PARAM] = [f"Ordering by {params[ORDERING_PARAM]} also needs one of: {', '.join(requires)}."]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        lookups = {cls.lookups[param][1]: value for param, value in params.items() if param in cls.lookups}
+        if lookups:
+            queryset = queryset.filter(**lookups)
+        if ORDERING_PARAM in params:
+            queryset = queryset.order_by(params[ORDERING_PARAM], '-pk' if params[ORDERING_PARAM][0] == '-' else 'pk')
+        return queryset
+
+
+def is_indexed(model, path):
+    """
+    Whether filtering `model` by the lookup path `path` can use indexes:
+    every relation it crosses is a foreign key (indexed by default) and
+    the final column leads an index.
+    """
+    names = path.split('__')
+    for name in names[:-1]:
+        field = model._meta.get_field(name)
+        if not (field.many_to_one or field.one_to_one) or not getattr(field, 'db_index', True):
+            return False
+        model = field.related_model
+    try:
+        field = model._meta.get_field(names[-1])
+    except FieldDoesNotExist:
+        return False
+    if field.primary_key or field.unique or field.db_index:
+        return True
+    return any(columns[0] == field.name for columns in index_columns(model))
+
+
+def index_columns(model):
+    """
+    The field names, in order, of each index and unique constraint of `model`.
+    """
+    indexes = [[name.lstrip('-') for name in index.fields] for index in model._meta.indexes]
+    indexes += [list(constraint.fields) for constraint in model._meta.constraints if getattr(constraint, 'fields', None)]
+    indexes += [list(fields) for fields in model._meta.unique_together]
+    return indexes
+
+
+class IndexedFilterBackend(BaseFilterBackend):
+    """
+    Applies the view's `filterset_class`.
+    """
+    def filter_queryset(self, request, queryset, view):
+        filterset_class = getattr(view, 'filterset_class', None)
+        if filterset_class is None:
+            return queryset
+        return filterset_class.filter_queryset(queryset, request.query_params)
+
+    def get_schema_operation_parameters(self, view):
+        filterset_class = getattr(view, 'filterset_class', None)
+        if filterset_class is None:
+            return []
+        parameters = []
+        for param, field in filterset_class.serializer_class().fields.items():
+            schema = {'type': 'string'}
+            if param == ORDERING_PARAM:
+                schema['enum'] = list(filterset_class.ordering)
+            parameters.append({'name': param, 'required': False, 'in': 'query', 'schema': schema})
+        return parameters
+
+
+# Filters of the shelter list endpoints
+class UserDetailsFilterSet(FilterSet):
+    model = UserDetails
+    user_id = Filter('user', serializers.UUIDField())
+
+
+class NotificationFilterSet(FilterSet):
+    model = Notification
+    user_id = Filter('user', serializers.UUIDField())
+    created_at = Filter('created_at', serializers.DateTimeField(), lookups=['gte', 'lt'], requires=['user_id'])
+    ordering = ['created_at', '-created_at']
+
+
+class SubscriptionFilterSet(FilterSet):
+    model = Subscription
+    user_id = Filter('user', serializers.UUIDField())
+    status = Filter('status', serializers.CharField(), lookups=['exact', 'in'], requires=['user_id'])
+
+
+class DeviceFilterSet(FilterSet):
+    model = Device
+    user_id = Filter('owner', serializers.UUIDField())
+    pet_id = Filter('pet', serializers.UUIDField())
+    serial_number = Filter('serial_number', serializers.CharField())
+    status = Filter('status', serializers.CharField(), lookups=['exact', 'in'], requires=['user_id', 'pet_id'])
+    ordering = ['serial_number', '-serial_number']
+
+
+class UsageLogFilterSet(FilterSet):
+    model = UsageLog
+    user_id = Filter('owner', serializers.UUIDField())
+    pet_id = Filter('pet', serializers.UUIDField())
+    device_id = Filter('device', serializers.UUIDField())
+    time = Filter('time', serializers.DateTimeField(), lookups=['gte', 'lt'], requires=['device_id', 'pet_id', 'user_id'])
+    log_type = Filter(
+        'log_type', serializers.CharField(), lookups=['exact', 'in'], requires=['device_id', 'pet_id', 'user_id']
+    )
+    ordering = ['time', '-time']
@@ -0,0 +1,132 @@
+"""
+Per-device dispense rates and predicted empty times.
+
+The rate of each device is an exponentially weighted average of its
+`subtract_*` usage logs with a half-life of `HALF_LIFE`: for a log of
+quantity q at age a the device accumulates q * exp(-a / tau), and that
+total divided by tau is the recent rate per hour. The totals are built
+with NumPy from one query per batch of devices, cached per device and
+folded forward as new logs are written, so a forecast only reads the
+database for devices whose totals are not cached yet. A device with
+less than a half-life of history reads as consuming less than it does.
+"""
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import forecast_cache
+from .models import UsageLog
+from .rollups import CONSUMPTION_FIELDS
+
+HALF_LIFE = timedelta(hours=24)
+TAU = HALF_LIFE.total_seconds() / math.log(2)
+# Older logs weigh under 1% and are not read
+HISTORY = HALF_LIFE * 7
+BATCH_SIZE = 500
+
+KINDS = ('food', 'water')
+KIND_OF_LOG = {'subtract_food': 0, 'subtract_water': 1}
+
+
+def compute_states(device_ids, now):
+    """
+    Decayed consumption totals at `now` for `device_ids`, from one query.
+    """
+    device_ids = list(device_ids)
+    index = {device_id: i for i, device_id in enumerate(device_ids)}
+    totals = np.zeros(len(device_ids) * len(KINDS))
+
+    rows = list(
+        UsageLog.objects.filter(
+            device_id__in=device_ids, log_type__in=CONSUMPTION_FIELDS, time__gte=now - HISTORY, time__lte=now
+        ).values_list('device_id', 'log_type', 'quantity', 'time')
+    )
+    if rows:
+        log_devices, log_types, quantities, times = zip(*rows)
+        slots = np.array([index[device_id] * len(KINDS) + KIND_OF_LOG[log_type]
+                          for device_id, log_type in zip(log_devices, log_types)])
+        ages = now.timestamp() - np.array([time.timestamp() for time in times])
+        totals += np.bincount(slots, weights=np.array(quantities) * np.exp(-ages / TAU), minlength=totals.size)
+
+    totals = totals.reshape(-1, len(KINDS))
+    return {
+        device_id: {'t': now.timestamp(), **dict(zip(KINDS, totals[i].tolist()))}
+        for device_id, i in index.items()
+    }
+
+
+def get_states(device_ids, now):
+    states = forecast_cache.get_many(device_ids)
+    missing = [device_id for device_id in device_ids if device_id not in states]
+    for start in range(0, len(missing), BATCH_SIZE):
+        computed = compute_states(missing[start:start + BATCH_SIZE], now)
+        forecast_cache.set_many(computed)
+        states.update(computed)
+    return states
+
+
+def forecast_devices(devices, now=None):
+    """
+    Forecasts for an iterable of (device_id, food_quantity, water_quantity).
+    """
+    now = now or timezone.now()
+    devices = list(devices)
+    if not devices:
+        return []
+    device_ids = [device_id for device_id, _, _ in devices]
+    states = get_states(device_ids, now)
+
+    totals = np.array([[states[device_id][kind] for kind in KINDS] for device_id in device_ids])
+    ages = now.timestamp() - np.array([states[device_id]['t'] for device_id in device_ids])
+    rates = totals * np.exp(-ages / TAU)[:, None] / (TAU / 3600)
+    quantities = np.array([[food, water] for _, food, water in devices], dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hours = np.where(rates > 1e-9, quantities / rates, np.nan)
+
+    forecasts = []
+    for i, device_id in enumerate(device_ids):
+        forecast = {'device_id': device_id, 'computed_at': now}
+        for k, kind in enumerate(KINDS):
+            hours_left = None if np.isnan(hours[i, k]) else float(hours[i, k])
+            forecast[kind] = {
+                'quantity': float(quantities[i, k]),
+                'rate_per_hour': float(rates[i, k]),
+                'hours_until_empty': hours_left,
+                'empty_at': now + timedelta(hours=hours_left) if hours_left is not None else None,
+            }
+        forecasts.append(forecast)
+    return forecasts
+
+
+def forecast_queryset(queryset, now=None):
+    return forecast_devices(queryset.values_list('id', 'food_quantity', 'water_quantity'), now)
+
+
+def record_usage(usage_logs):
+    """
+    Fold freshly written usage logs into the cached totals once the
+    transaction commits. Devices without cached totals are left to be
+    computed on their next forecast.
+    """
+    usage_logs = [log for log in usage_logs if log.log_type in KIND_OF_LOG]
+    if usage_logs:
+        transaction.on_commit(lambda: _fold(usage_logs))
+
+
+def _fold(usage_logs):
+    states = forecast_cache.get_many({log.device_id for log in usage_logs})
+    for log in usage_logs:
+        state = states.get(log.device_id)
+        if state is None:
+            continue
+        time = log.time.timestamp()
+        if time > state['t']:
+            decay = math.exp(-(time - state['t']) / TAU)
+            state.update({kind: state[kind] * decay for kind in KINDS}, t=time)
+        state[KINDS[KIND_OF_LOG[log.log_type]]] += log.quantity * math.exp(-(state['t'] - time) / TAU)
+    if states:
+        forecast_cache.set_many(states)
+
@@ -0,0 +1,103 @@
+"""
+Live device events over PostgreSQL LISTEN/NOTIFY.
+
+Database triggers (migration 0008) NOTIFY `CHANNEL` when a device's
+quantities change and when a usage log is inserted, so every writer is
+covered. Each process keeps one listening connection and fans the events
+out to the asyncio queues of its connected clients, filtered by owner.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'shelter_device_events'
+
+
+class DeviceEventListener:
+    """
+    One LISTEN connection per process, shared by every subscriber.
+    """
+    poll_timeout = 5
+    queue_size = 100
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, user_id):
+        """
+        Register a queue for `user_id`'s events; call from the event loop.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(str(user_id), {})[queue] = asyncio.get_running_loop()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='device-event-listener', daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(str(user_id), {})
+            subscribers.pop(queue, None)
+            if not subscribers:
+                self._subscribers.pop(str(user_id), None)
+
+    def dispatch(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed device event: %r", payload)
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(event.get('user_id')), {}).items())
+        for queue, loop in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, event)
+
+    @staticmethod
+    def _put(queue, event):
+        # A client that stops reading loses its oldest events, not the stream
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def _run(self):
+        while True:
+            try:
+                return self._listen()
+            except Exception:
+                logger.exception("Device event listener failed; reconnecting")
+                time.sleep(self.poll_timeout)
+
+    def _listen(self):
+        """
+        Relay notifications until the last subscriber leaves.
+        """
+        wrapper = connections.create_connection('default')
+        try:
+            wrapper.ensure_connection()
+            connection = wrapper.connection
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                if select.select([connection], [], [], self.poll_timeout)[0]:
+                    connection.poll()
+                    while connection.notifies:
+                        self.dispatch(connection.notifies.pop(0).payload)
+        finally:
+            wrapper.close()
+
+
+device_event_listener = DeviceEventListener()
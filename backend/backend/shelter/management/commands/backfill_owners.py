@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shelter.ownership import (
+    CHUNK_SIZE, stale_devices, stale_rollups, stale_usage_logs, sync_devices, sync_rollups, sync_usage_logs,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in or repair the denormalized owner columns of devices, usage logs and consumption rollups. "
+        "With --check, only count stale rows and fail if there are any, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Report stale rows without changing them.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['check']:
+            devices, usage_logs, rollups = stale_devices().count(), stale_usage_logs().count(), stale_rollups().count()
+            if devices or usage_logs or rollups:
+                raise CommandError(
+                    f"{devices} devices, {usage_logs} usage logs and {rollups} rollups have stale owner columns"
+                )
+            self.stdout.write(self.style.SUCCESS("Owner columns are consistent"))
+            return
+
+        devices = sync_devices(chunk_size=options['chunk_size'])
+        usage_logs = sync_usage_logs(chunk_size=options['chunk_size'])
+        rollups = sync_rollups(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Repaired {devices} devices, {usage_logs} usage logs and {rollups} rollups"))
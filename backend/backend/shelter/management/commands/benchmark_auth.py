@@ -0,0 +1,53 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from shelter.authentication import CachedJWTAuthentication
+from shelter.cache import user_cache
+from shelter.models import User, Role
+from shelter.serializers import TokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request cost of plain and cached JWT authentication, "
+        "including the role lookup done by the permission classes. "
+        "Works on a throwaway user inside a rolled-back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        with transaction.atomic():
+            role, _ = Role.objects.get_or_create(name='user')
+            suffix = uuid.uuid4().hex[:8]
+            user = User.objects.create_user(username=f'bench-{suffix}', email=f'bench-{suffix}@example.com', password=uuid.uuid4().hex, role=role)
+            token = str(TokenObtainPairSerializer.get_token(user).access_token)
+            user_cache.invalidate([user.pk])
+
+            for authentication in (JWTAuthentication(), CachedJWTAuthentication()):
+                queries, elapsed = self.run(authentication, token, count)
+                self.stdout.write(
+                    f"{type(authentication).__name__:<26} {queries / count:6.2f} queries/request  "
+                    f"{elapsed / count * 1e6:9.1f} us/request"
+                )
+            transaction.set_rollback(True)
+
+    def run(self, authentication, token, count):
+        factory = RequestFactory()
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            for _ in range(count):
+                request = Request(factory.get('/api/pets/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+                request.user, request.auth = authentication.authenticate(request)
+                request.user.role.name
+            elapsed = time.perf_counter() - started
+        return len(context.captured_queries), elapsed
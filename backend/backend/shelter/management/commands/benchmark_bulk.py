@@ -0,0 +1,95 @@
+import csv
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from shelter.bulk import IMPORTERS, export_lines, read_rows
+from shelter.models import User, Role, Pet, Device, UsageLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure bulk import and export throughput on synthetic files: "
+        "--rows usage logs spread over a tenth as many pets and devices. "
+        "Everything is rolled back unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--keep', action='store_true', help='Commit the imported rows.')
+
+    def handle(self, *args, **options):
+        rows, file_format = options['rows'], options['format']
+        with tempfile.TemporaryDirectory() as directory, transaction.atomic():
+            role, _ = Role.objects.get_or_create(name='user')
+            suffix = uuid.uuid4().hex[:8]
+            user = User.objects.create_user(username=f'bench-{suffix}', email=f'bench-{suffix}@example.com', password=uuid.uuid4().hex, role=role)
+
+            pet_ids = [str(uuid.uuid4()) for _ in range(max(1, rows // 10))]
+            device_ids = [str(uuid.uuid4()) for _ in pet_ids]
+            start = timezone.now() - timedelta(days=30)
+            log_types = ['add_food', 'subtract_food', 'add_water', 'subtract_water']
+            files = {
+                'pets': (
+                    {'id': pk, 'user_id': user.id, 'name': f'Pet {i}', 'breed': 'Mixed', 'species': 'Dog',
+                     'birth_date': '2020-01-01', 'weight': 10, 'age': 4}
+                    for i, pk in enumerate(pet_ids)
+                ),
+                'devices': (
+                    {'id': pk, 'pet_id': pet_id, 'serial_number': f'BENCH-{suffix}-{i}', 'status': 'active'}
+                    for i, (pk, pet_id) in enumerate(zip(device_ids, pet_ids))
+                ),
+                'usage-logs': (
+                    {'device_id': random.choice(device_ids), 'log_type': random.choice(log_types),
+                     'quantity': round(random.uniform(1, 50), 2),
+                     'time': (start + timedelta(seconds=random.uniform(0, 30 * 86400))).isoformat()}
+                    for _ in range(rows)
+                ),
+            }
+            querysets = {
+                'pets': Pet.objects.filter(user=user).order_by('id'),
+                'devices': Device.objects.filter(owner=user).order_by('id'),
+                'usage-logs': UsageLog.objects.filter(owner=user).order_by('time', 'id'),
+            }
+
+            for kind, records in files.items():
+                path = os.path.join(directory, f'{kind}.{file_format}')
+                self.write_file(path, records, file_format)
+
+                started = time.perf_counter()
+                with open(path, newline='') as lines:
+                    result = IMPORTERS[kind]().run(read_rows(lines, file_format))
+                imported = time.perf_counter() - started
+
+                started = time.perf_counter()
+                exported = sum(1 for _ in export_lines(querysets[kind], file_format)) - (file_format == 'csv')
+                export_time = time.perf_counter() - started
+
+                self.stdout.write(
+                    f"{kind:<11} import {result['created']:>8} rows {result['created'] / imported:>10.0f} rows/s   "
+                    f"export {exported:>8} rows {exported / export_time:>10.0f} rows/s"
+                )
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def write_file(self, path, records, file_format):
+        with open(path, 'w', newline='') as output:
+            if file_format == 'ndjson':
+                encoder = JSONEncoder()
+                output.writelines(encoder.encode(record) + '\n' for record in records)
+                return
+            writer = None
+            for record in records:
+                if writer is None:
+                    writer = csv.DictWriter(output, fieldnames=list(record))
+                    writer.writeheader()
+                writer.writerow(record)
@@ -0,0 +1,84 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from shelter.fastpath import FastJSONRenderer, compile_plan
+from shelter.models import Pet, Device, UsageLog, Habit
+from shelter.serializers import (
+    PetSerializer, DeviceSerializer, UsageLogSerializer, HabitSerializer, parse_shape, related_lookups
+)
+from shelter.synthetic import seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Render list payloads through the serializers and JSONRenderer, then "
+        "through the values() fast path and FastJSONRenderer, check the bytes "
+        "are identical and report rows/s. Seeds --logs synthetic usage logs in "
+        "a rolled-back transaction unless --existing is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logs', type=int, default=20000)
+        parser.add_argument('--rows', type=int, default=10000, help='Rows rendered per list.')
+        parser.add_argument('--repeat', type=int, default=3, help='Best of this many runs.')
+        parser.add_argument('--fields', help='Shape both paths like ?fields=.')
+        parser.add_argument('--expand', help='Shape both paths like ?expand=.')
+        parser.add_argument('--existing', action='store_true', help='Benchmark the rows already in the database.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not options['existing']:
+                seed_dataset(users=5, pets_per_user=20, devices_per_pet=2, logs=options['logs'],
+                             days=30, prefix=f'serial-{uuid.uuid4().hex[:8]}')
+            lists = [
+                ('usage-logs', UsageLog.objects.order_by('-time', '-id'), UsageLogSerializer),
+                ('devices', Device.objects.order_by('id'), DeviceSerializer),
+                ('pets', Pet.objects.order_by('id'), PetSerializer),
+                ('habits', Habit.objects.order_by('id'), HabitSerializer),
+            ]
+            for name, queryset, serializer_class in lists:
+                self.compare(name, queryset, serializer_class, options)
+            transaction.set_rollback(True)
+
+    def compare(self, name, queryset, serializer_class, options):
+        shape = (options['fields'], options['expand'])
+        plan = compile_plan(serializer_class, *shape)
+        if plan is None:
+            raise CommandError(f"{serializer_class.__name__} has no fast path plan for this shape")
+        select_related, _ = related_lookups(serializer_class, *shape)
+        instances = queryset.select_related(*select_related)[:options['rows']]
+        rows = queryset.values(*plan.columns)[:options['rows']]
+
+        def serializer_path():
+            serializer = serializer_class(list(instances), many=True)
+            serializer.child._shape = parse_shape(*shape)
+            return JSONRenderer().render(serializer.data)
+
+        def fast_path():
+            return FastJSONRenderer().render(plan.build_many(list(rows)))
+
+        expected, serializer_time = self.best(serializer_path, options)
+        actual, fast_time = self.best(fast_path, options)
+        if expected != actual:
+            raise CommandError(f"{name}: fast path output differs from the serializer's")
+        count = len(rows)
+        if not count:
+            self.stdout.write(f"{name:<11} no rows")
+            return
+        self.stdout.write(
+            f"{name:<11} {count:>7} rows  serializer {count / serializer_time:>9.0f} rows/s  "
+            f"fast path {count / fast_time:>9.0f} rows/s  {serializer_time / fast_time:5.1f}x  "
+            f"{len(actual)} identical bytes"
+        )
+
+    def best(self, render, options):
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            content = render()
+            timings.append(time.perf_counter() - started)
+        return content, min(timings)
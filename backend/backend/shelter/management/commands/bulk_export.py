@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from shelter.bulk import EXPORT_CHUNK_SIZE, FORMATS, export_lines
+from shelter.models import Pet, Device, UsageLog
+
+QUERYSETS = {
+    'pets': lambda: Pet.objects.order_by('id'),
+    'devices': lambda: Device.objects.order_by('id'),
+    'usage-logs': lambda: UsageLog.objects.order_by('time', 'id'),
+}
+
+
+class Command(BaseCommand):
+    help = "Export pets, devices or usage logs as CSV or NDJSON ('-' writes stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(QUERYSETS))
+        parser.add_argument('path', nargs='?', default='-')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to csv for .csv files, ndjson otherwise.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        lines = export_lines(QUERYSETS[options['kind']](), file_format, options['chunk_size'])
+        if path == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(path, 'w', newline='', encoding='utf-8') as output:
+            output.writelines(lines)
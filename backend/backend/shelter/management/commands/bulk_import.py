@@ -0,0 +1,38 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shelter.bulk import CHUNK_SIZE, CONFLICT_MODES, FORMATS, IMPORTERS, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import pets, devices or usage logs from a CSV or NDJSON file ('-' reads stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to csv for .csv files, ndjson otherwise.')
+        parser.add_argument('--conflict', choices=CONFLICT_MODES, default='skip')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        try:
+            importer = IMPORTERS[options['kind']](conflict=options['conflict'], chunk_size=options['chunk_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if path == '-':
+            result = importer.run(read_rows(sys.stdin, file_format))
+        else:
+            with open(path, newline='', encoding='utf-8-sig') as lines:
+                result = importer.run(read_rows(lines, file_format))
+
+        for error in result['errors']:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']}, updated {result['updated']}, "
+            f"skipped {result['skipped']}, failed {result['failed']}"
+        ))
@@ -0,0 +1,22 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from shelter.anomalies import CHUNK_SIZE, detect_anomalies
+from shelter.notifications import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Scan recent usage logs for stuck or leaking feeders and notify their owners, e.g. hourly from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Devices scanned per query.')
+        parser.add_argument('--dry-run', action='store_true', help='Report anomalies without notifying.')
+
+    def handle(self, *args, **options):
+        events = detect_anomalies(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        for event_type, count in sorted(Counter(event_type for _, event_type in events).items()):
+            self.stdout.write(f"{event_type}: {count}")
+        if not options['dry_run']:
+            drain_outbox()
+        self.stdout.write(self.style.SUCCESS(f"Found {len(events)} anomalies"))
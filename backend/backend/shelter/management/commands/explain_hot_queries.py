@@ -0,0 +1,57 @@
+import random
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from shelter.models import Notification, Subscription, Device, UsageLog
+from shelter.synthetic import seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Print query plans for the hot API filter paths. Run it before and after "
+        "`migrate shelter 0005` to compare plans; use --seed-logs to build a "
+        "realistic table first (e.g. --seed-logs 10000000)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-logs', type=int, default=0, help='Synthetic usage logs to insert first.')
+        parser.add_argument('--devices', type=int, default=100, help='Devices to spread seeded logs over.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE (PostgreSQL only).')
+
+    def handle(self, *args, **options):
+        if options['seed_logs']:
+            self.seed(options['seed_logs'], options['devices'], options['batch_size'])
+
+        device = Device.objects.order_by('?').first()
+        if device is None:
+            self.stderr.write("No devices found; run with --seed-logs first.")
+            return
+        user_id = device.pet.user_id
+        since = timezone.now() - timedelta(days=1)
+
+        queries = {
+            'device by serial number': Device.objects.filter(serial_number=device.serial_number),
+            'devices by owner': Device.objects.filter(owner_id=user_id),
+            'device logs over time': UsageLog.objects.filter(device__id=device.id).order_by('-time', '-id')[:100],
+            'owner logs over time': UsageLog.objects.filter(owner_id=user_id).order_by('-time', '-id')[:100],
+            'all logs in last day': UsageLog.objects.filter(time__gte=since),
+            'owner notifications': Notification.objects.filter(user__id=user_id).order_by('-created_at')[:100],
+            'owner active subscriptions': Subscription.objects.filter(user__id=user_id, status='active'),
+        }
+        explain_options = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
+
+    def seed(self, count, device_count, batch_size):
+        seed_dataset(
+            users=1, pets_per_user=1, devices_per_pet=device_count, logs=count, batch_size=batch_size,
+            seed=random.randrange(2 ** 32), prefix=f'bench-{uuid.uuid4().hex[:8]}', password=uuid.uuid4().hex,
+            progress=lambda done, total: self.stdout.write(f"Seeded {done}/{total} usage logs"),
+        )
@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shelter import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage monthly range partitions of the usage log table on PostgreSQL. "
+        "Run once with --convert, then regularly (e.g. at startup or daily) to create "
+        "upcoming partitions and apply the retention policy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Rebuild shelter_usagelog as a partitioned table.')
+        parser.add_argument('--keep-legacy', action='store_true', help='Keep the old table as shelter_usagelog_legacy after --convert.')
+        parser.add_argument('--months-ahead', type=int, default=3, help='Future monthly partitions to keep ready.')
+        parser.add_argument('--retention-months', type=int, help='Drop partitions older than this many months.')
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            self.stdout.write("Usage log partitioning requires PostgreSQL; nothing to do.")
+            return
+
+        if options['convert']:
+            if partitions.is_partitioned():
+                raise CommandError("shelter_usagelog is already partitioned.")
+            partitions.convert(options['months_ahead'], options['keep_legacy'])
+            self.stdout.write(self.style.SUCCESS("Converted shelter_usagelog to monthly partitions"))
+        elif not partitions.is_partitioned():
+            self.stdout.write("shelter_usagelog is not partitioned; run with --convert first.")
+            return
+
+        for name in partitions.ensure_partitions(options['months_ahead']):
+            self.stdout.write(f"Created partition {name}")
+
+        if options['retention_months'] is not None:
+            cutoff = partitions.add_months(partitions.month_start(date.today()), -options['retention_months'])
+            for name in partitions.drop_partitions_before(cutoff):
+                self.stdout.write(f"Dropped partition {name}")
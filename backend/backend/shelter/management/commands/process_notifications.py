@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shelter.notifications import BATCH_SIZE, drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Turn pending notification outbox events into notifications, e.g. from cron or after a restart."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        processed = drain_outbox(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} outbox events"))
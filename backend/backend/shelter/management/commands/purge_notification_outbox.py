@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shelter.models import NotificationOutbox
+from shelter.notifications import DEDUPE_WINDOW
+
+
+class Command(BaseCommand):
+    help = "Delete notification outbox events processed before NOTIFICATION_OUTBOX_RETENTION, e.g. daily from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        # The worker reads processed events of the dedupe window to drop repeats
+        retention = max(timedelta(seconds=settings.NOTIFICATION_OUTBOX_RETENTION), DEDUPE_WINDOW)
+        expired = NotificationOutbox.objects.filter(processed_at__lt=timezone.now() - retention)
+        total = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            total += NotificationOutbox.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} processed outbox events"))
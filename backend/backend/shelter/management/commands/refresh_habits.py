@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shelter.rollups import fill_habits, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Fill Habit records from the daily consumption rollups. Meant to run daily from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Length of the habit window, ending yesterday.')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day of the window (YYYY-MM-DD).')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day of the window (YYYY-MM-DD).')
+        parser.add_argument('--rebuild', action='store_true', help='Recompute all rollups from raw usage logs first.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rebuild_rollups()
+            self.stdout.write("Rebuilt consumption rollups from usage logs")
+
+        end_date = options['end'] or timezone.localdate() - timedelta(days=1)
+        start_date = options['start'] or end_date - timedelta(days=options['days'] - 1)
+        count = fill_habits(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f"Filled {count} habits for {start_date} to {end_date}"))
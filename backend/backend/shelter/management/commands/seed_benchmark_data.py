@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shelter.models import User
+from shelter.synthetic import seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a reproducible synthetic dataset for benchmarks/api_benchmark.py "
+        "and write its manifest (credentials, devices) as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--pets-per-user', type=int, default=5)
+        parser.add_argument('--devices-per-pet', type=int, default=2)
+        parser.add_argument('--logs', type=int, default=1000000, help='Usage logs to insert.')
+        parser.add_argument('--days', type=int, default=365, help='Spread usage logs over this many days.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench', help='Prefix for usernames and serial numbers.')
+        parser.add_argument('--password', default='bench-password')
+        parser.add_argument('--manifest', default='benchmark-manifest.json')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f"{options['prefix']}-user-").exists():
+            raise CommandError(f"A dataset with prefix {options['prefix']!r} exists; pick another --prefix.")
+
+        manifest = seed_dataset(
+            users=options['users'], pets_per_user=options['pets_per_user'],
+            devices_per_pet=options['devices_per_pet'], logs=options['logs'], days=options['days'],
+            batch_size=options['batch_size'], seed=options['seed'], prefix=options['prefix'],
+            password=options['password'],
+            progress=lambda done, total: self.stdout.write(f"Seeded {done}/{total} usage logs"),
+        )
+        with open(options['manifest'], 'w') as output:
+            json.dump(manifest, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(manifest['users'])} users, {len(manifest['devices'])} devices and "
+            f"{manifest['usage_logs']} usage logs; manifest in {options['manifest']}"
+        ))
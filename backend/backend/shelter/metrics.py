@@ -0,0 +1,225 @@
+"""
+Per-route request metrics, exported in the Prometheus text format.
+
+`MetricsMiddleware` times each request and `query_recorder`, installed
+on every database connection, counts its queries and DB time. The
+request's stats travel in a context variable, so queries run by async
+views through `sync_to_async` are attributed to the right request.
+Values are kept per process; with several workers, scrape each one.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+from .cache import device_cache, user_cache
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Collapses `IN (%s, %s, ...)` so batches of different sizes share a shape
+IN_LIST = re.compile(r'IN \((?:%s(?:, )?)+\)')
+
+current_request = ContextVar('shelter_request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+
+    def record(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.shapes[IN_LIST.sub('IN (...)', sql)] += 1
+
+    def repeated_shapes(self, threshold):
+        return [(sql, count) for sql, count in self.shapes.items() if count >= threshold]
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that adds each query to the current request's stats.
+    """
+    def __call__(self, execute, sql, params, many, context):
+        stats = current_request.get()
+        if stats is None:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats.record(sql, time.perf_counter() - started)
+
+    def install(self, connection):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+query_recorder = QueryRecorder()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = Counter()
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+            self.db_time = Counter()
+            self.n_plus_one = Counter()
+
+    def observe(self, route, method, status_code, stats, duration, repeated):
+        key = (route, method)
+        with self._lock:
+            self.requests[route, method, status_code] += 1
+            self.latency[key].observe(duration)
+            self.queries[key].observe(stats.queries)
+            self.db_time[key] += stats.db_time
+            if repeated:
+                self.n_plus_one[key] += 1
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            lines += header('shelter_http_requests_total', 'counter', 'Requests by route, method and status.')
+            for (route, method, status_code), count in sorted(self.requests.items()):
+                lines.append(f'shelter_http_requests_total{labels(route=route, method=method, status=status_code)} {count}')
+            lines += render_histograms(
+                'shelter_http_request_duration_seconds', 'Request latency by route.', self.latency
+            )
+            lines += render_histograms(
+                'shelter_http_request_queries', 'SQL queries per request by route.', self.queries
+            )
+            lines += header('shelter_db_duration_seconds_total', 'counter', 'Time spent in SQL queries by route.')
+            for (route, method), seconds in sorted(self.db_time.items()):
+                lines.append(f'shelter_db_duration_seconds_total{labels(route=route, method=method)} {seconds}')
+            lines += header('shelter_n_plus_one_total', 'counter', 'Requests that repeated one SQL shape past the threshold.')
+            for (route, method), count in sorted(self.n_plus_one.items()):
+                lines.append(f'shelter_n_plus_one_total{labels(route=route, method=method)} {count}')
+
+        caches = {'devices': device_cache.stats(), 'users': user_cache.stats()}
+        for kind in ('hits', 'misses'):
+            lines += header(f'shelter_cache_{kind}_total', 'counter', f'Cache {kind} by cache.')
+            for name, stats in caches.items():
+                lines.append(f'shelter_cache_{kind}_total{labels(cache=name)} {stats[kind]}')
+        return '\n'.join(lines) + '\n'
+
+
+def header(name, kind, help_text):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**values):
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in values.items()) + '}'
+
+
+def render_histograms(name, help_text, histograms):
+    lines = header(name, 'histogram', help_text)
+    for (route, method), histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{labels(route=route, method=method, le=bound)} {count}')
+        lines.append(f'{name}_bucket{labels(route=route, method=method, le="+Inf")} {histogram.count}')
+        lines.append(f'{name}_sum{labels(route=route, method=method)} {histogram.sum}')
+        lines.append(f'{name}_count{labels(route=route, method=method)} {histogram.count}')
+    return lines
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """
+    Record latency, query count and DB time per route and add a
+    `Server-Timing` header. Streaming responses are timed until their
+    body starts, since it is produced after the middleware returns.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.n_plus_one_threshold = settings.METRICS_N_PLUS_ONE_THRESHOLD
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        duration = time.perf_counter() - stats.started
+        match = request.resolver_match
+        # Router patterns are regexes; drop their end anchor from the label
+        route = match.route.rstrip('$') if match is not None else 'unmatched'
+        repeated = stats.repeated_shapes(self.n_plus_one_threshold)
+        for sql, count in repeated:
+            logger.warning("Possible N+1 query on %s %s: ran %d times: %s", request.method, route, count, sql)
+        metrics.observe(route, request.method, response.status_code, stats, duration, bool(repeated))
+        response['Server-Timing'] = (
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. When METRICS_TOKEN is set, it must be
+    sent as a bearer token.
+    """
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
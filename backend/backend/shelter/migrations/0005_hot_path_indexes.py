@@ -0,0 +1,39 @@
+# Generated by Django 5.1 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+def create_usagelog_time_brin(apps, schema_editor):
+    # BRIN suits append-only time columns: tiny, and cheap to maintain on insert
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS usagelog_time_brin ON shelter_usagelog USING brin ("time")'
+        )
+
+
+def drop_usagelog_time_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS usagelog_time_brin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelter', '0004_alter_usagelog_duration'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notification_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'status'], name='subscription_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usagelog',
+            index=models.Index(fields=['device', '-time', '-id'], name='usagelog_device_time_idx'),
+        ),
+        migrations.RunPython(create_usagelog_time_brin, drop_usagelog_time_brin),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1 on 2026-10-18 10:13
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelter', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumptionRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('granularity', models.CharField(max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('water_consumption', models.FloatField(default=0)),
+                ('food_consumption', models.FloatField(default=0)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumption_rollups', to='shelter.device')),
+                ('pet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumption_rollups', to='shelter.pet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['pet', 'granularity', 'bucket_start'], name='rollup_pet_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('device', 'granularity', 'bucket_start'), name='rollup_device_bucket_unique')],
+            },
+        ),
+    ]
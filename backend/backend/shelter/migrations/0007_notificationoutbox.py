@@ -0,0 +1,29 @@
+# Generated by Django 5.1 on 2026-10-18 10:18
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelter', '0006_consumptionrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('event_type', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_events', to='shelter.device')),
+                ('notification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shelter.notification')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['processed_at', 'created_at'], name='outbox_pending_idx'), models.Index(fields=['device', 'event_type', '-processed_at'], name='outbox_device_event_idx')],
+            },
+        ),
+    ]
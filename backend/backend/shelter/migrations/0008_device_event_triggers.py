@@ -0,0 +1,81 @@
+from django.db import migrations
+
+CREATE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION shelter_notify_device_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('shelter_device_events', json_build_object(
+        'event', 'device',
+        'device_id', NEW.id,
+        'user_id', (SELECT user_id FROM shelter_pet WHERE id = NEW.pet_id),
+        'serial_number', NEW.serial_number,
+        'status', NEW.status,
+        'food_quantity', NEW.food_quantity,
+        'water_quantity', NEW.water_quantity,
+        'battery_quantity', NEW.battery_quantity
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION shelter_notify_usage_log() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('shelter_device_events', json_build_object(
+        'event', 'usage_log',
+        'id', NEW.id,
+        'device_id', NEW.device_id,
+        'user_id', (
+            SELECT pet.user_id FROM shelter_device device
+            JOIN shelter_pet pet ON pet.id = device.pet_id
+            WHERE device.id = NEW.device_id
+        ),
+        'log_type', NEW.log_type,
+        'quantity', NEW.quantity,
+        'time', NEW.time
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS shelter_device_notify ON shelter_device;
+CREATE TRIGGER shelter_device_notify AFTER UPDATE ON shelter_device
+FOR EACH ROW WHEN (
+    OLD.food_quantity IS DISTINCT FROM NEW.food_quantity
+    OR OLD.water_quantity IS DISTINCT FROM NEW.water_quantity
+    OR OLD.battery_quantity IS DISTINCT FROM NEW.battery_quantity
+    OR OLD.status IS DISTINCT FROM NEW.status
+)
+EXECUTE FUNCTION shelter_notify_device_change();
+
+DROP TRIGGER IF EXISTS shelter_usagelog_notify ON shelter_usagelog;
+CREATE TRIGGER shelter_usagelog_notify AFTER INSERT ON shelter_usagelog
+FOR EACH ROW EXECUTE FUNCTION shelter_notify_usage_log();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS shelter_usagelog_notify ON shelter_usagelog;
+DROP TRIGGER IF EXISTS shelter_device_notify ON shelter_device;
+DROP FUNCTION IF EXISTS shelter_notify_usage_log();
+DROP FUNCTION IF EXISTS shelter_notify_device_change();
+"""
+
+
+def create_triggers(apps, schema_editor):
+    # LISTEN/NOTIFY is PostgreSQL-only; other backends get no live events
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGERS)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelter', '0007_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
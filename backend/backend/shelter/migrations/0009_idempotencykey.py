@@ -0,0 +1,29 @@
+# Generated by Django 5.1 on 2026-10-18 10:49
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelter', '0008_device_event_triggers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('key', models.CharField(max_length=255)),
+                ('food_quantity', models.FloatField(null=True)),
+                ('water_quantity', models.FloatField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to='shelter.device')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('device', 'key'), name='idempotency_device_key_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_owners(apps, schema_editor):
+    # One UPDATE per table; on large tables fake this migration and run
+    # `manage.py backfill_owners`, which works in chunks
+    Pet = apps.get_model('shelter', 'Pet')
+    Device = apps.get_model('shelter', 'Device')
+    UsageLog = apps.get_model('shelter', 'UsageLog')
+    Device.objects.update(owner_id=Subquery(Pet.objects.filter(pk=OuterRef('pet_id')).values('user_id')[:1]))
+    devices = Device.objects.filter(pk=OuterRef('device_id'))
+    UsageLog.objects.update(
+        pet_id=Subquery(devices.values('pet_id')[:1]),
+        owner_id=Subquery(devices.values('owner_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelter', '0010_denormalized_owners'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_owners, migrations.RunPython.noop),
+    ]
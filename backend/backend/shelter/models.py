@@ -1,5 +1,5 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 
 
@@ -47,6 +47,28 @@ class Pet(models.Model):
     age = models.IntegerField()
     image_url = models.URLField(blank=True, null=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Compared on save to carry owner changes over to the denormalized copies
+        instance._loaded_user_id = instance.__dict__.get('user_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        moved = (
+            not self._state.adding and getattr(self, '_loaded_user_id', None) != self.user_id
+            and (update_fields is None or bool({'user', 'user_id'} & set(update_fields)))
+        )
+        if not moved:
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic(using=kwargs.get('using')):
+                super().save(*args, **kwargs)
+                Device.objects.filter(pet=self).update(owner_id=self.user_id)
+                UsageLog.objects.filter(pet=self).update(owner_id=self.user_id)
+        self._loaded_user_id = self.user_id
+
     def __str__(self):
         return self.name
 
@@ -58,6 +80,13 @@ class Notification(models.Model):
     notification_type = models.CharField(max_length=50)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notification_user_created_idx'),
+            models.Index(fields=['user'], condition=models.Q(read_at__isnull=True), name='notification_user_unread_idx'),
+        ]
 
     def __str__(self):
         return f'Notification to {self.user} - {self.notification_type}'
@@ -72,6 +101,11 @@ class Subscription(models.Model):
     end_date = models.DateField()
     status = models.CharField(max_length=20)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status'], name='subscription_user_status_idx'),
+        ]
+
     def __str__(self):
         return f'{self.plan_type} - {self.status}'
 
@@ -89,9 +123,53 @@ class Payment(models.Model):
 
 
 # Tracking
+def set_device_owners(devices):
+    """
+    Copy each device's pet owner into `owner_id`, with one query for the
+    devices whose pet is not loaded.
+    """
+    missing = {device.pet_id for device in devices if not Device.pet.is_cached(device)}
+    owners = dict(Pet.objects.filter(id__in=missing).values_list('id', 'user_id')) if missing else {}
+    for device in devices:
+        device.owner_id = device.pet.user_id if Device.pet.is_cached(device) else owners.get(device.pet_id)
+
+
+def set_usage_log_owners(usage_logs):
+    """
+    Copy each log's device pet and owner into `pet_id` and `owner_id`,
+    with one query for the logs whose device is not loaded.
+    """
+    missing = {log.device_id for log in usage_logs if not UsageLog.device.is_cached(log)}
+    devices = {}
+    if missing:
+        devices = {pk: (pet_id, owner_id) for pk, pet_id, owner_id in
+                   Device.objects.filter(id__in=missing).values_list('id', 'pet_id', 'owner_id')}
+    for log in usage_logs:
+        if UsageLog.device.is_cached(log):
+            log.pet_id, log.owner_id = log.device.pet_id, log.device.owner_id
+        else:
+            log.pet_id, log.owner_id = devices.get(log.device_id, (None, None))
+
+
+class DeviceQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        set_device_owners(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class UsageLogQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        set_usage_log_owners([log for log in objs if log.owner_id is None])
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Device(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='devices')
+    # Denormalized pet.user, so owner-scoped queries skip the pet join
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, editable=False, related_name='+')
     serial_number = models.CharField(max_length=100, unique=True)
     status = models.CharField(max_length=20)
     food_quantity = models.FloatField(default=0)
@@ -100,6 +178,33 @@ class Device(models.Model):
     food_limit = models.FloatField(default=500)
     water_limit = models.FloatField(default=1000)
 
+    objects = DeviceQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Compared on save to carry pet changes over to the device's logs
+        instance._loaded_pet_id = instance.__dict__.get('pet_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        moved = getattr(self, '_loaded_pet_id', None) != self.pet_id and (
+            update_fields is None or bool({'pet', 'pet_id'} & set(update_fields))
+        )
+        if moved or (self.owner_id is None and update_fields is None):
+            set_device_owners([self])
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'owner'}
+        if not moved or self._state.adding:
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic(using=kwargs.get('using')):
+                super().save(*args, **kwargs)
+                UsageLog.objects.filter(device=self).update(pet_id=self.pet_id, owner_id=self.owner_id)
+                ConsumptionRollup.objects.filter(device=self).update(pet_id=self.pet_id)
+        self._loaded_pet_id = self.pet_id
+
     def __str__(self):
         return self.serial_number
 
@@ -107,11 +212,41 @@ class Device(models.Model):
 class UsageLog(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='usage_logs')
+    # Denormalized device.pet and its user; led by the composite indexes below
+    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, null=True, editable=False, db_index=False, related_name='+')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, editable=False, db_index=False, related_name='+')
     log_type = models.CharField(max_length=50)
     quantity = models.FloatField()
     time = models.DateTimeField()
     duration = models.DurationField(null=True, blank=True)
 
+    objects = UsageLogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['device', '-time', '-id'], name='usagelog_device_time_idx'),
+            models.Index(fields=['owner', '-time', '-id'], name='usagelog_owner_time_idx'),
+            models.Index(fields=['pet', '-time', '-id'], name='usagelog_pet_time_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_device_id = instance.__dict__.get('device_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        moved = getattr(self, '_loaded_device_id', self.device_id) != self.device_id
+        if (moved or self.owner_id is None) and (
+            update_fields is None or bool({'device', 'device_id'} & set(update_fields))
+        ):
+            set_usage_log_owners([self])
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'pet', 'owner'}
+        super().save(*args, **kwargs)
+        self._loaded_device_id = self.device_id
+
     def __str__(self):
         return f'{self.log_type} at {self.time}'
 
@@ -126,3 +261,65 @@ class Habit(models.Model):
 
     def __str__(self):
         return f'Habit for {self.pet.name}'
+
+
+class ConsumptionRollup(models.Model):
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITIES = [HOUR, DAY]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='consumption_rollups')
+    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='consumption_rollups')
+    granularity = models.CharField(max_length=10)
+    bucket_start = models.DateTimeField()
+    water_consumption = models.FloatField(default=0)
+    food_consumption = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'granularity', 'bucket_start'], name='rollup_device_bucket_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['pet', 'granularity', 'bucket_start'], name='rollup_pet_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.granularity} rollup for {self.device} at {self.bucket_start}'
+
+
+# Device events waiting to be turned into notifications off the request path
+class NotificationOutbox(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='notification_events')
+    event_type = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    notification = models.ForeignKey(Notification, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_at', 'created_at'], name='outbox_pending_idx'),
+            models.Index(fields=['device', 'event_type', '-processed_at'], name='outbox_device_event_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event_type} for {self.device}'
+
+
+# Client-supplied event ids of applied quantity updates, so retries replay the original result
+class IdempotencyKey(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    food_quantity = models.FloatField(null=True)
+    water_quantity = models.FloatField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'key'], name='idempotency_device_key_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.key} for {self.device}'
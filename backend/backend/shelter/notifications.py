@@ -0,0 +1,168 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import dashboard
+from .models import Notification, NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+# Food/water alerts fire when a dispense takes the level below this share of the limit
+LOW_LEVEL_RATIO = 0.2
+LOW_BATTERY_LEVEL = 20
+DEDUPE_WINDOW = timedelta(hours=6)
+BATCH_SIZE = 500
+
+MESSAGES = {
+    'low_food': "{pet}'s feeder {serial} is low on food ({quantity:.0f} of {limit:.0f}).",
+    'low_water': "{pet}'s feeder {serial} is low on water ({quantity:.0f} of {limit:.0f}).",
+    'low_battery': "{pet}'s feeder {serial} has a low battery ({quantity:.0f}%).",
+    # Raised by the anomaly detection job
+    'food_spike': "{pet}'s feeder {serial} dispensed far more food than usual; it may be leaking.",
+    'water_spike': "{pet}'s feeder {serial} dispensed far more water than usual; it may be leaking.",
+    'food_stalled': "{pet}'s feeder {serial} has not dispensed food for a day; it may be stuck.",
+    'water_stalled': "{pet}'s feeder {serial} has not dispensed water for a day; it may be stuck.",
+    'repeated_events': "{pet}'s feeder {serial} keeps reporting the same dispense; it may be stuck.",
+}
+
+
+def low_level_event(type, action, quantity, new_quantity, limit):
+    """
+    Event type for a dispense that crosses the low-level threshold, else None.
+    Only the crossing is reported, so steady low levels do not spam the outbox.
+    """
+    threshold = limit * LOW_LEVEL_RATIO
+    if action == 'subtract' and new_quantity < threshold <= new_quantity + quantity:
+        return f'low_{type}'
+    return None
+
+
+def enqueue(events):
+    """
+    Write (device_id, event_type) pairs to the outbox in the caller's
+    transaction and wake the worker once it commits. Pairs already waiting
+    in the outbox are skipped, as the worker would drop them anyway.
+    """
+    if not events:
+        return
+    pending = set(
+        NotificationOutbox.objects.filter(
+            device_id__in={device_id for device_id, _ in events},
+            processed_at__isnull=True,
+        ).values_list('device_id', 'event_type')
+    )
+    events = [event for event in dict.fromkeys(events) if event not in pending]
+    if not events:
+        return
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(device_id=device_id, event_type=event_type) for device_id, event_type in events
+    ])
+    transaction.on_commit(notification_worker.wake)
+
+
+def build_message(event):
+    device = event.device
+    quantity = limit = None
+    if event.event_type == 'low_battery':
+        quantity, limit = device.battery_quantity, 100
+    elif event.event_type.startswith('low_'):
+        type = event.event_type[len('low_'):]
+        quantity, limit = getattr(device, f'{type}_quantity'), getattr(device, f'{type}_limit')
+    return MESSAGES[event.event_type].format(
+        pet=device.pet.name, serial=device.serial_number, quantity=quantity, limit=limit
+    )
+
+
+def process_outbox(batch_size=BATCH_SIZE):
+    """
+    Turn one batch of pending outbox events into notifications.
+    An event is dropped if the same device already alerted for the same
+    type within DEDUPE_WINDOW. Returns the number of events processed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            NotificationOutbox.objects.filter(processed_at__isnull=True)
+            .select_related('device__pet')
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('created_at')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        sent = set(
+            NotificationOutbox.objects.filter(
+                device_id__in={event.device_id for event in events},
+                notification__isnull=False,
+                processed_at__gte=now - DEDUPE_WINDOW,
+            ).values_list('device_id', 'event_type')
+        )
+        notifications = []
+        for event in events:
+            event.processed_at = now
+            key = (event.device_id, event.event_type)
+            if key in sent:
+                continue
+            sent.add(key)
+            event.notification = Notification(
+                user_id=event.device.pet.user_id,
+                notification_type=event.event_type,
+                message=build_message(event),
+            )
+            notifications.append(event.notification)
+
+        Notification.objects.bulk_create(notifications)
+        dashboard.invalidate({notification.user_id for notification in notifications}, 'notifications')
+        NotificationOutbox.objects.bulk_update(events, ['processed_at', 'notification'])
+    return len(events)
+
+
+def drain_outbox(batch_size=BATCH_SIZE):
+    total = 0
+    while True:
+        processed = process_outbox(batch_size)
+        total += processed
+        if processed < batch_size:
+            return total
+
+
+class NotificationWorker:
+    """
+    Background thread that drains the outbox when woken after a commit,
+    and every `poll_interval` seconds to pick up events left over from a
+    previous process.
+    """
+    poll_interval = 30
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notification-worker', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                drain_outbox()
+            except Exception:
+                logger.exception("Failed to process notification outbox")
+            finally:
+                close_old_connections()
+
+
+notification_worker = NotificationWorker()
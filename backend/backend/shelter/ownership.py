@@ -0,0 +1,78 @@
+"""
+Consistency of the denormalized owner columns.
+
+`Device.owner` copies `Device.pet.user`, and `UsageLog.pet` and
+`UsageLog.owner` copy the log's device pet and its owner, so owner- and
+pet-scoped queries read one table through its own index. Consumption
+rollups likewise follow their device's pet. Model saves and
+`bulk_create` fill them in and carry pet and owner changes over; writes
+that bypass the models (`QuerySet.update()`, raw SQL) can leave them
+stale, which `stale_devices`/`stale_usage_logs`/`stale_rollups` find and
+`sync_devices`/`sync_usage_logs`/`sync_rollups` repair, in chunks of
+primary keys.
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from .models import Pet, Device, UsageLog, ConsumptionRollup
+
+CHUNK_SIZE = 5000
+
+
+def stale_devices(queryset=None):
+    queryset = Device.objects.all() if queryset is None else queryset
+    return queryset.exclude(owner=F('pet__user'))
+
+
+def stale_usage_logs(queryset=None):
+    queryset = UsageLog.objects.all() if queryset is None else queryset
+    return queryset.exclude(pet=F('device__pet'), owner=F('device__owner'))
+
+
+def stale_rollups(queryset=None):
+    queryset = ConsumptionRollup.objects.all() if queryset is None else queryset
+    return queryset.exclude(pet=F('device__pet'))
+
+
+def sync_devices(queryset=None, chunk_size=CHUNK_SIZE):
+    """
+    Copy the pet owner into the stale devices of `queryset`; returns how many were fixed.
+    """
+    owner = Subquery(Pet.objects.filter(pk=OuterRef('pet_id')).values('user_id')[:1])
+    return _repair(stale_devices(queryset), {'owner_id': owner}, chunk_size)
+
+
+def sync_usage_logs(queryset=None, chunk_size=CHUNK_SIZE):
+    """
+    Copy the device pet and owner into the stale logs of `queryset`; run
+    after `sync_devices`, since logs copy the device's owner column.
+    """
+    devices = Device.objects.filter(pk=OuterRef('device_id'))
+    columns = {
+        'pet_id': Subquery(devices.values('pet_id')[:1]),
+        'owner_id': Subquery(devices.values('owner_id')[:1]),
+    }
+    return _repair(stale_usage_logs(queryset), columns, chunk_size)
+
+
+def sync_rollups(queryset=None, chunk_size=CHUNK_SIZE):
+    """
+    Copy the device pet into the stale consumption rollups of `queryset`.
+    """
+    pet = Subquery(Device.objects.filter(pk=OuterRef('device_id')).values('pet_id')[:1])
+    return _repair(stale_rollups(queryset), {'pet_id': pet}, chunk_size)
+
+
+def _repair(stale, columns, chunk_size):
+    # Walk the stale rows in primary key order so each chunk resumes where the last ended
+    model = stale.model
+    fixed = 0
+    last = None
+    while True:
+        chunk = stale.order_by('pk') if last is None else stale.filter(pk__gt=last).order_by('pk')
+        ids = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return fixed
+        with transaction.atomic():
+            fixed += model.objects.filter(pk__in=ids).update(**columns)
+        last = ids[-1]
@@ -0,0 +1,105 @@
+import json
+import uuid
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TimeCursorPagination(BasePagination):
+    """
+    Keyset pagination over `(time, id)`, newest first, or oldest first
+    when the queryset arrives ordered by `time`.
+    The cursor holds the last row's time and id, so every page is a
+    single indexed range query and cursors stay stable as rows are added.
+    """
+    page_size = 100
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        if queryset.query.order_by[:1] == ('time',):
+            queryset = queryset.order_by('time', 'id')
+            if position is not None:
+                time, pk = position
+                queryset = queryset.filter(Q(time__gt=time) | Q(time=time, id__gt=pk))
+        else:
+            queryset = queryset.order_by('-time', '-id')
+            if position is not None:
+                time, pk = position
+                queryset = queryset.filter(Q(time__lt=time) | Q(time=time, id__lt=pk))
+
+        # Fetch one extra row to know whether there is a next page
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        results = results[:page_size]
+        self.next_position = self.get_position(results[-1]) if self.has_next else None
+        return results
+
+    def get_position(self, row):
+        # Rows are model instances, or dicts from the values() fast path
+        if isinstance(row, dict):
+            return row['time'], row['id']
+        return row.time, row.id
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            time = parse_datetime(data['t'])
+            pk = uuid.UUID(str(data['id']))
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        if time is None:
+            raise NotFound(self.invalid_cursor_message)
+        return time, pk
+
+    def encode_cursor(self, position):
+        time, pk = position
+        data = json.dumps({'t': time.isoformat(), 'id': str(pk)})
+        return urlsafe_b64encode(data.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
@@ -0,0 +1,212 @@
+"""
+Monthly range partitioning of the usage log table on PostgreSQL.
+
+`shelter_usagelog` is append-only and always queried by time, so it is
+split into one partition per calendar month of `time`. Old data is
+removed by dropping whole partitions instead of row-by-row deletes.
+Rows outside every monthly range land in a default partition and are
+moved into their month's partition when it is created.
+"""
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import UsageLog
+
+TABLE = UsageLog._meta.db_table
+LEGACY_TABLE = f'{TABLE}_legacy'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relname = %s AND n.nspname = current_schema()",
+            [TABLE]
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def existing_partitions():
+    """
+    Map of partition table name to the first day of the month it holds.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{TABLE}_p'
+    return {
+        name: date(int(name[len(prefix):len(prefix) + 4]), int(name[len(prefix) + 4:]), 1)
+        for name in names if name.startswith(prefix)
+    }
+
+
+def has_default_partition(cursor):
+    cursor.execute("SELECT to_regclass(%s)", [DEFAULT_PARTITION])
+    return cursor.fetchone()[0] is not None
+
+
+def create_partition(cursor, month):
+    """
+    Create the partition for `month`. PostgreSQL refuses to create it while
+    the default partition holds rows in its range (future timestamps from
+    feeders with bad clocks), so those rows are first moved out: the default
+    partition is detached, the new partition created, the rows moved across
+    and the default partition attached again. Run inside a transaction.
+    """
+    quote = connection.ops.quote_name
+    lower = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    next_month = add_months(month, 1)
+    upper = datetime(next_month.year, next_month.month, 1, tzinfo=dt_timezone.utc)
+    create = (
+        f"CREATE TABLE IF NOT EXISTS {quote(partition_name(month))} PARTITION OF {quote(TABLE)} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    )
+    in_range = f"{quote('time')} >= %s AND {quote('time')} < %s"
+
+    stranded = False
+    if has_default_partition(cursor):
+        cursor.execute(f"SELECT 1 FROM {quote(DEFAULT_PARTITION)} WHERE {in_range} LIMIT 1", [lower, upper])
+        stranded = cursor.fetchone() is not None
+    if not stranded:
+        cursor.execute(create)
+        return
+
+    cursor.execute(f"ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(DEFAULT_PARTITION)}")
+    cursor.execute(create)
+    cursor.execute(
+        f"INSERT INTO {quote(partition_name(month))} SELECT * FROM {quote(DEFAULT_PARTITION)} WHERE {in_range}",
+        [lower, upper]
+    )
+    cursor.execute(f"DELETE FROM {quote(DEFAULT_PARTITION)} WHERE {in_range}", [lower, upper])
+    cursor.execute(f"ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(DEFAULT_PARTITION)} DEFAULT")
+
+
+def ensure_partitions(months_ahead=3, today=None):
+    """
+    Create the partitions for the current month and `months_ahead` more.
+    Returns the names of the partitions that were created.
+    """
+    current = month_start(today or date.today())
+    existing = set(existing_partitions())
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(month) not in existing:
+                create_partition(cursor, month)
+                created.append(partition_name(month))
+    return created
+
+
+def drop_partitions_before(cutoff):
+    """
+    Drop every monthly partition that ends on or before `cutoff`.
+    Returns the names of the dropped partitions.
+    """
+    quote = connection.ops.quote_name
+    dropped = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for name, month in sorted(existing_partitions().items(), key=lambda item: item[1]):
+            if add_months(month, 1) <= cutoff:
+                cursor.execute(f"ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}")
+                cursor.execute(f"DROP TABLE {quote(name)}")
+                dropped.append(name)
+    return dropped
+
+
+def convert(months_ahead=3, keep_legacy=False):
+    """
+    Rebuild the usage log table as a partitioned table in one transaction.
+    Indexes, constraints and triggers are recreated with their original
+    names so later Django migrations keep working; the primary key becomes
+    (id, time) because PostgreSQL requires it to contain the partition key.
+    The database then no longer keeps `id` unique on its own: ids are
+    random UUIDs except in bulk imports, which check them first (see
+    `shelter.bulk.UsageLogImporter`).
+    """
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quote(TABLE)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE tablename = %s AND schemaname = current_schema()",
+            [TABLE]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid), contype FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('p', 'f')",
+            [TABLE]
+        )
+        constraints = cursor.fetchall()
+        primary_key = next(name for name, _, kind in constraints if kind == 'p')
+        cursor.execute(
+            "SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal",
+            [TABLE]
+        )
+        triggers = [row[0] for row in cursor.fetchall()]
+
+        # Free the index names for the new table, then move the data across
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} RENAME TO {quote(LEGACY_TABLE)}")
+        cursor.execute(f"ALTER TABLE {quote(LEGACY_TABLE)} DROP CONSTRAINT {quote(primary_key)}")
+        for name, _ in indexes:
+            if name != primary_key:
+                cursor.execute(f"DROP INDEX IF EXISTS {quote(name)}")
+
+        cursor.execute(
+            f"CREATE TABLE {quote(TABLE)} (LIKE {quote(LEGACY_TABLE)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE ({quote('time')})"
+        )
+        cursor.execute(f"SELECT min({quote('time')}) FROM {quote(LEGACY_TABLE)}")
+        oldest = cursor.fetchone()[0]
+        current = month_start(date.today())
+        month = month_start(oldest) if oldest else current
+        while month <= add_months(current, months_ahead):
+            create_partition(cursor, month)
+            month = add_months(month, 1)
+        # Catches rows from feeders with bad clocks instead of failing the insert
+        cursor.execute(f"CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {quote(TABLE)} SELECT * FROM {quote(LEGACY_TABLE)}")
+
+        cursor.execute(
+            f"ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(primary_key)} "
+            f"PRIMARY KEY ({quote('id')}, {quote('time')})"
+        )
+        for name, definition, kind in constraints:
+            if kind == 'f':
+                cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}")
+        for name, definition in indexes:
+            if name != primary_key:
+                cursor.execute(definition)
+        for definition in triggers:
+            cursor.execute(definition)
+
+        if not keep_legacy:
+            cursor.execute(f"DROP TABLE {quote(LEGACY_TABLE)}")
@@ -1,12 +1,60 @@
+import threading
+import time
+
 from rest_framework import permissions
 
 
+class RoleRegistry:
+    """
+    Role names mapped to ids, loaded once per process and reloaded when a
+    Role changes here (see signals) or after `timeout` seconds, so changes
+    made by other workers are picked up too. Permission checks compare the
+    user's `role_id` against precomputed frozen sets and never query.
+    """
+    timeout = 300
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids_by_name = None
+        self._resolved = {}
+        self._loaded_at = 0
+
+    def refresh(self):
+        from .models import Role
+
+        ids_by_name = {name.lower(): role_id for role_id, name in Role.objects.values_list('id', 'name')}
+        with self._lock:
+            self._ids_by_name = ids_by_name
+            self._resolved = {}
+            self._loaded_at = time.monotonic()
+
+    def role_ids(self, names):
+        """
+        Frozen set of the ids of the roles called `names`, case-insensitive.
+        """
+        if self._ids_by_name is None or time.monotonic() - self._loaded_at > self.timeout:
+            self.refresh()
+        key = frozenset(name.lower() for name in names)
+        resolved = self._resolved.get(key)
+        if resolved is None:
+            resolved = frozenset(self._ids_by_name[name] for name in key if name in self._ids_by_name)
+            self._resolved[key] = resolved
+        return resolved
+
+
+role_registry = RoleRegistry()
+
+
+def has_role(user, names):
+    return bool(user and user.is_authenticated and user.role_id in role_registry.role_ids(names))
+
+
 class IsAdminUser(permissions.BasePermission):
     """
     Allows access only to users with the 'admin' role.
     """
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.role.lower() == 'admin'
+        return has_role(request.user, ('admin',))
 
 
 class IsUser(permissions.BasePermission):
@@ -14,7 +62,7 @@ class IsUser(permissions.BasePermission):
     Allows access only to users with the 'user' role.
     """
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.role.lower() == 'user'
+        return has_role(request.user, ('user',))
 
 
 class IsSpecificRole(permissions.BasePermission):
@@ -23,5 +71,4 @@ class IsSpecificRole(permissions.BasePermission):
     Specify allowed roles in `view.allowed_roles`.
     """
     def has_permission(self, request, view):
-        allowed_roles = getattr(view, 'allowed_roles', [])
-        return request.user and request.user.is_authenticated and request.user.role.lower() in map(str.lower, allowed_roles)
+        return has_role(request.user, getattr(view, 'allowed_roles', ()))
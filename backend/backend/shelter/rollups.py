@@ -0,0 +1,179 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import ConsumptionRollup, Habit, UsageLog
+
+# Only dispensing counts as consumption; `add_*` logs are refills
+CONSUMPTION_FIELDS = {
+    'subtract_food': 'food_consumption',
+    'subtract_water': 'water_consumption',
+}
+
+# Rows per INSERT ... ON CONFLICT statement, well under SQLite's parameter limit
+UPSERT_BATCH_SIZE = 500
+
+TRUNCATE = {
+    ConsumptionRollup.HOUR: TruncHour,
+    ConsumptionRollup.DAY: TruncDay,
+}
+
+
+def bucket_start(value, granularity):
+    """
+    Truncate a datetime to the start of its hour or day bucket.
+    """
+    value = timezone.localtime(value)
+    if granularity == ConsumptionRollup.HOUR:
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def record_usage(usage_logs, sign=1):
+    """
+    Add freshly created usage logs to the hourly and daily rollups, or
+    take them out again with `sign=-1` when logs are changed or deleted.
+    Logs are summed in memory first; on PostgreSQL and SQLite a batch is
+    then one INSERT ... ON CONFLICT DO UPDATE, elsewhere one write per
+    touched bucket.
+    """
+    usage_logs = [log for log in usage_logs if log.log_type in CONSUMPTION_FIELDS]
+    if not usage_logs:
+        return
+
+    totals = defaultdict(lambda: {field: 0.0 for field in CONSUMPTION_FIELDS.values()})
+    for log in usage_logs:
+        for granularity in ConsumptionRollup.GRANULARITIES:
+            key = (log.device_id, log.pet_id, granularity, bucket_start(log.time, granularity))
+            totals[key][CONSUMPTION_FIELDS[log.log_type]] += sign * log.quantity
+
+    if connection.vendor in ('postgresql', 'sqlite'):
+        rows = list(totals.items())
+        for offset in range(0, len(rows), UPSERT_BATCH_SIZE):
+            _upsert_buckets(rows[offset:offset + UPSERT_BATCH_SIZE])
+        return
+    with transaction.atomic():
+        for (device_id, pet_id, granularity, start), amounts in totals.items():
+            _increment_bucket(device_id, pet_id, granularity, start, amounts)
+
+
+def _upsert_buckets(rows):
+    quote = connection.ops.quote_name
+    fields = {field.name: field for field in ConsumptionRollup._meta.concrete_fields}
+    columns = ['id', 'device', 'pet', 'granularity', 'bucket_start', 'food_consumption', 'water_consumption']
+    params = []
+    for (device_id, pet_id, granularity, start), amounts in rows:
+        values = [uuid.uuid4(), device_id, pet_id, granularity, start,
+                  amounts['food_consumption'], amounts['water_consumption']]
+        params += [fields[name].get_db_prep_save(value, connection) for name, value in zip(columns, values)]
+    table = quote(ConsumptionRollup._meta.db_table)
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(rows))
+    increments = ', '.join(
+        f"{quote(name)} = {table}.{quote(name)} + EXCLUDED.{quote(name)}"
+        for name in ('food_consumption', 'water_consumption')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(quote(fields[name].column) for name in columns)}) "
+            f"VALUES {placeholders} "
+            f"ON CONFLICT ({quote('device_id')}, {quote('granularity')}, {quote('bucket_start')}) "
+            f"DO UPDATE SET {increments}",
+            params
+        )
+
+
+def _increment_bucket(device_id, pet_id, granularity, start, amounts):
+    bucket = ConsumptionRollup.objects.filter(device_id=device_id, granularity=granularity, bucket_start=start)
+    increments = {field: F(field) + amount for field, amount in amounts.items()}
+    if bucket.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            ConsumptionRollup.objects.create(
+                device_id=device_id, pet_id=pet_id, granularity=granularity, bucket_start=start, **amounts
+            )
+    except IntegrityError:
+        # A concurrent writer created the bucket first
+        bucket.update(**increments)
+
+
+def rebuild_rollups(device_ids=None):
+    """
+    Recompute rollups from the raw usage logs, e.g. after a backfill.
+    Aggregation runs in the database; one grouped query per granularity.
+    Buckets take the pet from the logs, as `record_usage` does.
+    """
+    logs = UsageLog.objects.filter(log_type__in=CONSUMPTION_FIELDS)
+    rollups = ConsumptionRollup.objects.all()
+    if device_ids is not None:
+        logs = logs.filter(device_id__in=device_ids)
+        rollups = rollups.filter(device_id__in=device_ids)
+
+    with transaction.atomic():
+        rollups.delete()
+        for granularity, truncate in TRUNCATE.items():
+            rows = (
+                # Logs written before the owner backfill have no pet yet
+                logs.annotate(bucket=truncate('time'), log_pet_id=Coalesce('pet_id', 'device__pet_id'))
+                .values('device_id', 'log_pet_id', 'bucket')
+                .annotate(
+                    food=Sum('quantity', filter=Q(log_type='subtract_food'), default=0),
+                    water=Sum('quantity', filter=Q(log_type='subtract_water'), default=0),
+                )
+            )
+            ConsumptionRollup.objects.bulk_create([
+                ConsumptionRollup(
+                    device_id=row['device_id'],
+                    pet_id=row['log_pet_id'],
+                    granularity=granularity,
+                    bucket_start=row['bucket'],
+                    food_consumption=row['food'],
+                    water_consumption=row['water'],
+                )
+                for row in rows.iterator(chunk_size=2000)
+            ], batch_size=2000)
+
+
+def consumption_summary(pet_id, granularity, start, end):
+    """
+    Per-bucket consumption of a pet across all its devices in [start, end).
+    """
+    return list(
+        ConsumptionRollup.objects.filter(
+            pet_id=pet_id, granularity=granularity, bucket_start__gte=start, bucket_start__lt=end
+        )
+        .values('bucket_start')
+        .annotate(food_consumption=Sum('food_consumption'), water_consumption=Sum('water_consumption'))
+        .order_by('bucket_start')
+    )
+
+
+def fill_habits(start_date, end_date, pet_ids=None):
+    """
+    Create or update one Habit per pet covering [start_date, end_date],
+    summed from the daily rollups. Returns the number of habits written.
+    """
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+
+    rollups = ConsumptionRollup.objects.filter(
+        granularity=ConsumptionRollup.DAY, bucket_start__gte=start, bucket_start__lt=end
+    )
+    if pet_ids is not None:
+        rollups = rollups.filter(pet_id__in=pet_ids)
+    totals = rollups.values('pet_id').annotate(food=Sum('food_consumption'), water=Sum('water_consumption'))
+
+    count = 0
+    with transaction.atomic():
+        for row in totals:
+            Habit.objects.update_or_create(
+                pet_id=row['pet_id'], start_date=start_date, end_date=end_date,
+                defaults={'food_consumption': row['food'], 'water_consumption': row['water']},
+            )
+            count += 1
+    return count
@@ -1,17 +1,161 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
 from .models import (
     User, Role, UserDetails, Pet, Notification,
-    Subscription, Payment, Device, UsageLog, Habit
+    Subscription, Payment, Device, UsageLog, Habit, ConsumptionRollup, IdempotencyKey
 )
 
+def parse_paths(value):
+    """
+    'id,pet.name,pet.user' -> {'id': {}, 'pet': {'name': {}, 'user': {}}}
+    """
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def parse_shape(fields=None, expand=None):
+    """
+    The (fields, expand) trees of a `?fields=` / `?expand=` request.
+    None means unrestricted: every field, every nested object expanded.
+    """
+    return (
+        parse_paths(fields) if fields else None,
+        parse_paths(expand) if expand is not None else None,
+    )
+
+
+# Keyed by the raw query parameters, so bounded
+@lru_cache(maxsize=1024)
+def related_lookups(serializer_class, fields=None, expand=None):
+    """
+    Walk the nested serializers of `serializer_class` and return the
+    (select_related, prefetch_related) lookups needed to render it
+    without extra queries per row. Relations pruned by `fields` or
+    collapsed by `expand` are not joined.
+    """
+    return _related_lookups(shaped(serializer_class, fields, expand), '', False)
+
+
+@lru_cache(maxsize=1024)
+def loaded_fields(serializer_class, fields=None, expand=None):
+    """
+    The `.only()` paths covering every column the shaped serializer reads,
+    or None when some field is not a plain model column.
+    """
+    return _loaded_fields(shaped(serializer_class, fields, expand), '')
+
+
+def shaped(serializer_class, fields=None, expand=None):
+    serializer = serializer_class()
+    serializer._shape = parse_shape(fields, expand)
+    return serializer
+
+
+def _related_lookups(serializer, prefix, many):
+    select_related, prefetch_related = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if not isinstance(nested, serializers.BaseSerializer):
+            continue
+        lookup = prefix + field.source.replace('.', '__')
+        nested_many = many or isinstance(field, serializers.ListSerializer)
+        (prefetch_related if nested_many else select_related).append(lookup)
+        nested_select, nested_prefetch = _related_lookups(nested, lookup + '__', nested_many)
+        select_related += nested_select
+        prefetch_related += nested_prefetch
+    return tuple(select_related), tuple(prefetch_related)
+
+
+def _loaded_fields(serializer, prefix):
+    model = serializer.Meta.model
+    paths = []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or len(field.source_attrs) > 1:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete:
+            # Reverse and many-to-many relations are prefetched by primary key
+            continue
+        paths.append(prefix + model_field.name)
+        if isinstance(field, serializers.BaseSerializer) and not isinstance(field, serializers.ListSerializer):
+            # Without paths of its own a joined model loads every column
+            paths += _loaded_fields(field, prefix + model_field.name + '__') or []
+    return tuple(paths)
+
+
+class ShapedSerializerMixin:
+    """
+    Response shaping for `?fields=` and `?expand=`.
+
+    `fields` lists the fields to render, with dotted paths reaching into
+    nested objects: `?fields=id,name,pet.name`. `expand` lists the nested
+    objects to render in full; any other nested object renders as its
+    primary key, which needs no join: `?expand=pet` keeps `pet` but turns
+    `pet.user` into an id. Without either parameter the full shape is
+    rendered. Write-only fields are never pruned, and writes ignore both
+    parameters: they validate and save every field and answer with the
+    full shape.
+    """
+    @property
+    def shape(self):
+        shape = getattr(self, '_shape', None)
+        if shape is None:
+            request = self.context.get('request')
+            reads = request is not None and request.method in SAFE_METHODS
+            params = request.query_params if reads else {}
+            shape = self._shape = parse_shape(params.get('fields'), params.get('expand'))
+        return shape
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, expand = self.shape
+        for name, field in list(fields.items()):
+            if field.write_only:
+                continue
+            if only is not None and name not in only:
+                del fields[name]
+                continue
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if not isinstance(nested, serializers.BaseSerializer):
+                continue
+            nested_only = only.get(name) or None if only is not None else None
+            if expand is not None and name not in expand and nested_only is None:
+                source = {'source': field.source} if field.source and field.source != name else {}
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many, **source)
+                continue
+            nested._shape = (nested_only, expand.get(name, {}) if expand is not None else None)
+        return fields
+
+
+class ShapedModelSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
+    pass
+
+
 # IAM
-class RoleSerializer(serializers.ModelSerializer):
+class RoleSerializer(ShapedModelSerializer):
     class Meta:
         model = Role
         fields = '__all__'
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ShapedModelSerializer):
     role = RoleSerializer(read_only=True)
     role_id = serializers.PrimaryKeyRelatedField(
         queryset=Role.objects.all(), write_only=True, source='role'
@@ -23,7 +167,7 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 # Profiles
-class UserDetailsSerializer(serializers.ModelSerializer):
+class UserDetailsSerializer(ShapedModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), write_only=True, source='user'
@@ -35,7 +179,7 @@ class UserDetailsSerializer(serializers.ModelSerializer):
 
 
 # Pets
-class PetSerializer(serializers.ModelSerializer):
+class PetSerializer(ShapedModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), write_only=True, source='user'
@@ -47,7 +191,7 @@ class PetSerializer(serializers.ModelSerializer):
 
 
 # Communications
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(ShapedModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), write_only=True, source='user'
@@ -55,11 +199,12 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
-        fields = ['id', 'user', 'user_id', 'notification_type', 'message', 'created_at']
+        fields = ['id', 'user', 'user_id', 'notification_type', 'message', 'created_at', 'read_at']
+        read_only_fields = ['read_at']
 
 
 # Subscriptions & Billing
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(ShapedModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), write_only=True, source='user'
@@ -70,7 +215,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'user_id', 'plan_type', 'start_date', 'end_date', 'status']
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(ShapedModelSerializer):
     subscription = SubscriptionSerializer(read_only=True)
     subscription_id = serializers.PrimaryKeyRelatedField(
         queryset=Subscription.objects.all(), write_only=True, source='subscription'
@@ -82,7 +227,7 @@ class PaymentSerializer(serializers.ModelSerializer):
 
 
 # Tracking
-class DeviceSerializer(serializers.ModelSerializer):
+class DeviceSerializer(ShapedModelSerializer):
     pet = PetSerializer(read_only=True)
     pet_id = serializers.PrimaryKeyRelatedField(
         queryset=Pet.objects.all(), write_only=True, source='pet'
@@ -93,7 +238,7 @@ class DeviceSerializer(serializers.ModelSerializer):
         fields = ['id', 'pet', 'pet_id', 'serial_number', 'status', 'food_quantity', 'water_quantity', 'battery_quantity', 'food_limit', 'water_limit']
 
 
-class UsageLogSerializer(serializers.ModelSerializer):
+class UsageLogSerializer(ShapedModelSerializer):
     device_id = serializers.PrimaryKeyRelatedField(
         queryset=Device.objects.all(), write_only=True, source='device'
     )
@@ -103,7 +248,37 @@ class UsageLogSerializer(serializers.ModelSerializer):
         fields = ['id', 'device_id', 'log_type', 'quantity', 'time', 'duration']
 
 
-class HabitSerializer(serializers.ModelSerializer):
+# Bulk import rows reference parents by id; `bulk.Importer` checks them per chunk
+class PetImportSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(required=False)
+    user_id = serializers.UUIDField()
+
+    class Meta:
+        model = Pet
+        fields = ['id', 'user_id', 'name', 'breed', 'species', 'birth_date', 'weight', 'age', 'image_url']
+
+
+class DeviceImportSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(required=False)
+    pet_id = serializers.UUIDField()
+
+    class Meta:
+        model = Device
+        fields = ['id', 'pet_id', 'serial_number', 'status', 'food_quantity', 'water_quantity', 'battery_quantity', 'food_limit', 'water_limit']
+        # Conflicting serial numbers are handled by the importer, not one query per row
+        extra_kwargs = {'serial_number': {'validators': []}}
+
+
+class UsageLogImportSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(required=False)
+    device_id = serializers.UUIDField()
+
+    class Meta:
+        model = UsageLog
+        fields = ['id', 'device_id', 'log_type', 'quantity', 'time', 'duration']
+
+
+class HabitSerializer(ShapedModelSerializer):
     pet = PetSerializer(read_only=True)
     pet_id = serializers.PrimaryKeyRelatedField(
         queryset=Pet.objects.all(), write_only=True, source='pet'
@@ -157,4 +332,46 @@ class ModifyQuantitySerializer(serializers.Serializer):
         """Ensure quantity is positive"""
         if value <= 0:
             raise serializers.ValidationError("Quantity must be positive.")
-        return value
\ No newline at end of file
+        return value
+
+class ModifyQuantityEventSerializer(ModifyQuantitySerializer):
+    """
+    A single buffered feeder event for the batch ingest endpoint.
+    `time` is when the device recorded the event; defaults to now.
+    `event_id` plays the part of the Idempotency-Key header of `create`.
+    """
+    time = serializers.DateTimeField(required=False)
+    event_id = serializers.CharField(required=False, max_length=IdempotencyKey._meta.get_field('key').max_length)
+
+
+class ConsumptionSummaryQuerySerializer(serializers.Serializer):
+    pet_id = serializers.UUIDField()
+    granularity = serializers.ChoiceField(choices=ConsumptionRollup.GRANULARITIES, default=ConsumptionRollup.DAY)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+
+class DashboardQuerySerializer(serializers.Serializer):
+    user_id = serializers.UUIDField(required=False)
+
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    """
+    Adds the user's role to the token claims so clients and permission
+    checks can read it without loading the user.
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['role'] = user.role.name if user.role else None
+        token['role_id'] = str(user.role_id) if user.role_id else None
+        return token
+
+
+class BulkImportQuerySerializer(serializers.Serializer):
+    file_format = serializers.ChoiceField(choices=['csv', 'ndjson'], required=False)
+    conflict = serializers.ChoiceField(choices=['skip', 'update'], default='skip')
+
+
+class BulkExportQuerySerializer(serializers.Serializer):
+    file_format = serializers.ChoiceField(choices=['csv', 'ndjson'], default='ndjson')
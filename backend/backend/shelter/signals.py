@@ -1,8 +1,106 @@
-from django.db.models.signals import post_delete
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from .models import Role
+from . import dashboard, forecasting
+from .cache import device_cache, user_cache
+from .models import User, Role, Pet, Notification, Subscription, Device, UsageLog
+from .metrics import query_recorder
+from .notifications import LOW_BATTERY_LEVEL, enqueue
+from .permissions import role_registry
+from .rollups import record_usage
+
+
 def create_default_roles(sender, **kwargs):
     roles = ['user', 'admin']
     for role_name in roles:
-        Role.objects.get_or_create(name=role_name)
\ No newline at end of file
+        Role.objects.get_or_create(name=role_name)
+    role_registry.refresh()
+
+
+@receiver(post_save, sender=UsageLog)
+def update_consumption_rollups(sender, instance, created, raw=False, **kwargs):
+    # Bulk writers bypass post_save and call record_usage themselves
+    if created and not raw:
+        record_usage([instance])
+        forecasting.record_usage([instance])
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_device_cache(sender, instance, **kwargs):
+    device_cache.invalidate([(instance.id, instance.serial_number)])
+
+
+@receiver(post_save, sender=Device)
+def check_battery_level(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Readings already pending are skipped and the worker drops repeats
+    if created or raw or (update_fields is not None and 'battery_quantity' not in update_fields):
+        return
+    if instance.battery_quantity < LOW_BATTERY_LEVEL:
+        enqueue([(instance.id, 'low_battery')])
+
+
+@receiver(post_save, sender=Pet)
+@receiver(post_save, sender=User)
+def invalidate_owner_device_cache(sender, instance, created=False, raw=False, **kwargs):
+    # Cached device payloads embed the pet and its owner
+    if created or raw:
+        return
+    devices = Device.objects.filter(pet=instance) if sender is Pet else Device.objects.filter(owner=instance)
+    device_cache.invalidate(devices.values_list('id', 'serial_number'))
+
+
+@receiver(post_save, sender=Pet)
+def invalidate_saved_pet_dashboards(sender, instance, created, raw=False, **kwargs):
+    # Pet.save replaces the owner it was loaded with only after post_save
+    previous = getattr(instance, '_loaded_user_id', None)
+    if created or raw:
+        dashboard.invalidate([instance.user_id], 'pets')
+    elif previous != instance.user_id:
+        dashboard.invalidate([instance.user_id, previous], 'pets')
+
+
+@receiver(post_delete, sender=Pet)
+def invalidate_deleted_pet_dashboard(sender, instance, **kwargs):
+    dashboard.invalidate([instance.user_id], 'pets')
+
+
+# Not on post_delete: that would stop cascades from deleting a user's
+# notifications in bulk. NotificationViewSet invalidates deletions itself
+@receiver(post_save, sender=Notification)
+def invalidate_notification_dashboard(sender, instance, **kwargs):
+    dashboard.invalidate([instance.user_id], 'notifications')
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription_dashboard(sender, instance, **kwargs):
+    dashboard.invalidate([instance.user_id], 'subscription')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    user_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Role)
+@receiver(pre_delete, sender=Role)
+def invalidate_role_user_cache(sender, instance, **kwargs):
+    # Cached users carry their role; pre_delete runs before the FK is nulled
+    user_cache.invalidate(User.objects.filter(role=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def refresh_role_registry(sender, instance, raw=False, **kwargs):
+    # After commit, so a rolled-back change never reaches the registry
+    if not raw:
+        transaction.on_commit(role_registry.refresh)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    query_recorder.install(connection)
@@ -0,0 +1,99 @@
+"""
+Synthetic dataset generator for benchmarks and query-plan checks.
+
+Everything is derived from `seed`, so two runs with the same arguments
+produce the same shape of data; `prefix` keeps runs apart in one database.
+"""
+import random
+import uuid
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import User, Role, Pet, Device, UsageLog
+from .rollups import rebuild_rollups
+
+LOG_TYPES = ['add_food', 'subtract_food', 'add_water', 'subtract_water']
+SPECIES = {
+    'Dog': ['Labrador', 'Beagle', 'Mixed', 'Poodle'],
+    'Cat': ['Siamese', 'Persian', 'Mixed', 'Bengal'],
+}
+
+
+def seed_dataset(users=10, pets_per_user=5, devices_per_pet=2, logs=1000000, days=365,
+                 batch_size=10000, seed=0, prefix='bench', password='bench-password', progress=None):
+    """
+    Create users, pets, devices and `logs` usage logs spread over the last
+    `days` days, then rebuild the consumption rollups of the new devices.
+    Returns a manifest describing what was created, for benchmark drivers.
+    """
+    rng = random.Random(seed)
+    role, _ = Role.objects.get_or_create(name='user')
+
+    with transaction.atomic():
+        owners = [
+            User(username=f'{prefix}-user-{i}', email=f'{prefix}-user-{i}@example.com', role=role)
+            for i in range(users)
+        ]
+        for owner in owners:
+            owner.set_password(password)
+        User.objects.bulk_create(owners)
+
+        pets = []
+        for owner in owners:
+            for _ in range(pets_per_user):
+                species = rng.choice(list(SPECIES))
+                age = rng.randint(1, 15)
+                pets.append(Pet(
+                    user=owner, name=f'Pet {len(pets)}', species=species, breed=rng.choice(SPECIES[species]),
+                    birth_date=date.today() - timedelta(days=365 * age), weight=round(rng.uniform(2, 40), 1), age=age,
+                ))
+        Pet.objects.bulk_create(pets, batch_size=batch_size)
+
+        devices = []
+        for pet in pets:
+            for _ in range(devices_per_pet):
+                devices.append(Device(
+                    pet=pet, serial_number=f'{prefix}-{len(devices):06d}', status='active',
+                    food_quantity=round(rng.uniform(0, 500), 1), water_quantity=round(rng.uniform(0, 1000), 1),
+                    battery_quantity=round(rng.uniform(20, 100), 1),
+                ))
+        Device.objects.bulk_create(devices, batch_size=batch_size)
+
+    seed_usage_logs(devices, logs, days, batch_size, rng, progress)
+    rebuild_rollups([device.id for device in devices])
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {UsageLog._meta.db_table}')
+
+    return {
+        'prefix': prefix,
+        'seed': seed,
+        'password': password,
+        'users': [{'id': str(owner.id), 'username': owner.username} for owner in owners],
+        'devices': [{'id': str(device.id), 'serial_number': device.serial_number} for device in devices],
+        'usage_logs': logs,
+    }
+
+
+def seed_usage_logs(devices, count, days=365, batch_size=10000, rng=None, progress=None):
+    """
+    Bulk insert `count` usage logs for `devices`, uniformly over the last `days` days.
+    """
+    rng = rng or random.Random()
+    start = timezone.now() - timedelta(days=days)
+    span = days * 24 * 3600
+    for offset in range(0, count, batch_size):
+        UsageLog.objects.bulk_create([
+            UsageLog(
+                id=uuid.UUID(int=rng.getrandbits(128), version=4),
+                device=rng.choice(devices),
+                log_type=rng.choice(LOG_TYPES),
+                quantity=round(rng.uniform(1, 50), 2),
+                time=start + timedelta(seconds=rng.uniform(0, span)),
+            )
+            for _ in range(min(batch_size, count - offset))
+        ])
+        if progress:
+            progress(min(offset + batch_size, count), count)
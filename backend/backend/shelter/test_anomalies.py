@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .anomalies import detect_anomalies, scan_devices
+from .models import UsageLog, Notification
+from .notifications import drain_outbox
+from .test_iot import ShelterTestCase
+
+
+class AnomalyDetectionTests(ShelterTestCase):
+    def setUp(self):
+        self.user = self.create_user()
+        self.pet = self.create_pet()
+        self.now = timezone.now()
+
+    def create_logged_device(self, serial_number, recent_hours=24, recent_quantity=2):
+        """
+        A device dispensing 2 units of food an hour for the baseline week,
+        then `recent_quantity` an hour for the last `recent_hours` hours.
+        """
+        device = self.create_device(serial_number=serial_number)
+        logs = [
+            UsageLog(device=device, log_type='subtract_food', quantity=2 + hour % 2,
+                     time=self.now - timedelta(hours=hour, minutes=30))
+            for hour in range(24, 8 * 24)
+        ]
+        logs += [
+            UsageLog(device=device, log_type='subtract_food', quantity=recent_quantity + hour % 2,
+                     time=self.now - timedelta(hours=hour, minutes=30))
+            for hour in range(recent_hours)
+        ]
+        UsageLog.objects.bulk_create(logs)
+        return device
+
+    def test_flags_spikes_stalls_and_repeats(self):
+        normal = self.create_logged_device('SN-normal')
+        leaking = self.create_logged_device('SN-leak', recent_quantity=40)
+        stuck = self.create_logged_device('SN-stuck', recent_hours=0)
+        repeating = self.create_logged_device('SN-repeat')
+        UsageLog.objects.bulk_create([
+            UsageLog(device=repeating, log_type='subtract_food', quantity=0.25, time=self.now - timedelta(minutes=minute))
+            for minute in range(1, 13)
+        ])
+
+        events = scan_devices([normal.id, leaking.id, stuck.id, repeating.id], self.now)
+        self.assertEqual(sorted(events, key=str), sorted([
+            (leaking.id, 'food_spike'), (stuck.id, 'food_stalled'), (repeating.id, 'repeated_events'),
+        ], key=str))
+
+    def test_devices_without_history_are_ignored(self):
+        device = self.create_device(serial_number='SN-new')
+        self.assertEqual(scan_devices([device.id], self.now), [])
+
+    def test_detect_anomalies_notifies_once_across_chunks(self):
+        stuck = [self.create_logged_device(f'SN-{i}', recent_hours=0) for i in range(3)]
+        with self.captureOnCommitCallbacks():
+            events = detect_anomalies(now=self.now, chunk_size=2)
+            drain_outbox()
+            detect_anomalies(now=self.now, chunk_size=2)
+            drain_outbox()
+        self.assertEqual(len(events), 3)
+        notifications = Notification.objects.filter(user=self.user, notification_type='food_stalled')
+        self.assertEqual(notifications.count(), 3)
+        self.assertIn(stuck[0].serial_number, ' '.join(notifications.values_list('message', flat=True)))
+
+    def test_dry_run_does_not_notify(self):
+        self.create_logged_device('SN-stuck', recent_hours=0)
+        self.assertEqual(len(detect_anomalies(now=self.now, dry_run=True)), 1)
+        drain_outbox()
+        self.assertFalse(Notification.objects.exists())
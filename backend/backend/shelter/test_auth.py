@@ -0,0 +1,57 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import CachedJWTAuthentication
+from .cache import user_cache
+from .models import User, Role
+from .serializers import TokenObtainPairSerializer
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.cache.clear()
+        self.role, _ = Role.objects.get_or_create(name='user')
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pass123', role=self.role)
+        self.token = str(TokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/api/pets/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_token_carries_role_claims(self):
+        response = self.client.post('/api/token/', {'username': 'owner', 'password': 'pass123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = AccessToken(response.data['access'])
+        self.assertEqual(token['role'], 'user')
+        self.assertEqual(token['role_id'], str(self.role.id))
+
+    def test_cached_user_needs_no_queries(self):
+        self.authenticate()
+        with CaptureQueriesContext(connection) as context:
+            user = self.authenticate()
+            self.assertEqual(user.role.name, 'user')
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_password_hash_is_not_cached(self):
+        self.authenticate()
+        cached = user_cache.cache.get(user_cache.key(self.user.id))
+        self.assertNotIn('password', cached.__dict__)
+        self.assertNotIn(self.user.password, repr(cached.__dict__))
+        self.assertTrue(self.authenticate().check_password('pass123'))
+
+    def test_user_change_invalidates_cache(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(Exception):
+            self.authenticate()
+
+    def test_role_change_invalidates_cache(self):
+        self.authenticate()
+        self.role.name = 'member'
+        self.role.save()
+        self.assertEqual(self.authenticate().role.name, 'member')
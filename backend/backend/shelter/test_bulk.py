@@ -0,0 +1,139 @@
+import json
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from rest_framework import status
+
+from .models import Pet, Device, UsageLog, ConsumptionRollup
+from .test_iot import ShelterTestCase
+
+
+class BulkImportExportTests(ShelterTestCase):
+    def setUp(self):
+        self.user = self.create_user('admin', role='admin')
+        self.client.force_authenticate(self.user)
+        self.pet = self.create_pet()
+        self.device = self.create_device()
+
+    def post_csv(self, url, content):
+        return self.client.generic('POST', url, content.encode(), content_type='text/csv')
+
+    def test_import_pets_csv_reports_row_errors(self):
+        content = (
+            "user_id,name,breed,species,birth_date,weight,age,image_url\n"
+            f"{self.user.id},Milo,Beagle,Dog,2021-02-03,12.5,3,\n"
+            f"{self.user.id},Nala,Siamese,Cat,not-a-date,4,2,\n"
+            f"00000000-0000-0000-0000-000000000000,Ghost,Mixed,Cat,2021-02-03,4,2,\n"
+        )
+        response = self.post_csv('/api/pets/import/', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertTrue(Pet.objects.filter(name='Milo', image_url=None).exists())
+
+    def test_import_devices_conflicts_on_serial_number(self):
+        content = (
+            "pet_id,serial_number,status,food_limit\n"
+            f"{self.pet.id},SN-1,inactive,300\n"
+            f"{self.pet.id},SN-2,active,300\n"
+            f"{self.pet.id},SN-2,active,400\n"
+        )
+        response = self.post_csv('/api/devices/import/', content)
+        self.assertEqual((response.data['created'], response.data['skipped'], response.data['failed']), (1, 1, 1))
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.status, 'active')
+
+        response = self.post_csv('/api/devices/import/?conflict=update', content)
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 2))
+        self.device.refresh_from_db()
+        self.assertEqual((self.device.status, self.device.food_limit), ('inactive', 300))
+        self.assertEqual(Device.objects.count(), 2)
+
+    def test_import_reports_rows_dropped_on_another_unique_key(self):
+        content = (
+            "id,pet_id,serial_number,status\n"
+            f"{self.device.id},{self.pet.id},SN-9,active\n"
+            f"{self.pet.id},{self.pet.id},SN-10,active\n"
+        )
+        response = self.post_csv('/api/devices/import/', content)
+        self.assertEqual((response.data['created'], response.data['skipped'], response.data['failed']), (1, 0, 1))
+        self.assertEqual(response.data['errors'], [{'row': 1, 'errors': {'id': ["Belongs to another row."]}}])
+        self.assertFalse(Device.objects.filter(serial_number='SN-9').exists())
+
+        response = self.post_csv('/api/devices/import/?conflict=update', content + f"{self.device.id},{self.pet.id},SN-1,inactive\n")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['failed']), (0, 2, 1))
+        self.assertEqual(response.data['errors'][0]['errors'], {'id': ["Belongs to another row."]})
+        self.assertFalse(Device.objects.filter(serial_number='SN-9').exists())
+
+    def test_pet_import_updates_owner_dashboards(self):
+        other = self.create_user('other')
+        for user in (self.user, other):
+            self.assertEqual(self.client.get('/api/dashboard/', {'user_id': user.id}).data['pet_count'], int(user == self.user))
+        content = (
+            "id,user_id,name,breed,species,birth_date,weight,age\n"
+            f"{self.pet.id},{other.id},Rex,Labrador,Dog,2020-01-01,20,4\n"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_csv('/api/pets/import/?conflict=update', content)
+        self.assertEqual(response.data['updated'], 1)
+        for user in (self.user, other):
+            self.assertEqual(self.client.get('/api/dashboard/', {'user_id': user.id}).data['pet_count'], int(user == other))
+
+    def test_import_usage_logs_upload_updates_rollups(self):
+        lines = [
+            {'device_id': str(self.device.id), 'log_type': 'subtract_food', 'quantity': 5, 'time': '2024-01-01T10:00:00Z'},
+            {'device_id': str(self.device.id), 'log_type': 'subtract_food', 'quantity': 7, 'time': '2024-01-01T11:00:00Z'},
+        ]
+        upload = SimpleUploadedFile('logs.ndjson', ('\n'.join(map(json.dumps, lines)) + '\nnot json\n').encode())
+        response = self.client.post('/api/usage-logs/import/', {'file': upload}, format='multipart')
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        daily = ConsumptionRollup.objects.get(device=self.device, granularity=ConsumptionRollup.DAY)
+        self.assertEqual(daily.food_consumption, 12)
+
+        response = self.post_csv('/api/usage-logs/import/?conflict=update', 'device_id\n')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_usage_log_ids_are_not_reused_at_another_time(self):
+        log = UsageLog.objects.create(device=self.device, log_type='add_food', quantity=5, time='2024-01-01T10:00:00Z')
+        content = f"id,device_id,log_type,quantity,time\n{log.id},{self.device.id},add_food,5,2024-02-01T10:00:00Z\n"
+        response = self.post_csv('/api/usage-logs/import/', content)
+        self.assertEqual((response.data['created'], response.data['skipped']), (0, 1))
+        self.assertEqual(UsageLog.objects.filter(id=log.id).count(), 1)
+
+    def test_import_requires_admin(self):
+        self.client.force_authenticate(None)
+        response = self.post_csv('/api/pets/import/', 'name\n')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Staff status is not the admin role
+        staff = self.create_user('staff', is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.post_csv('/api/pets/import/', 'name\n')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_round_trips_through_import(self):
+        response = self.client.get('/api/devices/export/?file_format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.splitlines()[0], 'id,pet_id,serial_number,status,food_quantity,water_quantity,battery_quantity,food_limit,water_limit')
+
+        self.device.delete()
+        response = self.post_csv('/api/devices/import/', content)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Device.objects.get().serial_number, 'SN-1')
+
+    def test_commands(self):
+        UsageLog.objects.create(device=self.device, log_type='add_food', quantity=3, time='2024-01-01T10:00:00Z')
+        output = StringIO()
+        call_command('bulk_export', 'usage-logs', stdout=output)
+        exported = output.getvalue()
+        self.assertEqual(json.loads(exported)['quantity'], 3)
+
+        UsageLog.objects.all().delete()
+        with mock.patch('sys.stdin', StringIO(exported)):
+            call_command('bulk_import', 'usage-logs', '-', stdout=StringIO())
+        self.assertEqual(UsageLog.objects.count(), 1)
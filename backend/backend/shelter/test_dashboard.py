@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import status
+
+from .cache import dashboard_cache
+from .models import UsageLog, Notification, Subscription
+from .notifications import enqueue, process_outbox
+from .test_iot import ShelterTestCase
+
+
+class DashboardTests(ShelterTestCase):
+    url = '/api/dashboard/'
+
+    def setUp(self):
+        dashboard_cache.cache.clear()
+        self.user = self.create_user()
+        self.pet = self.create_pet()
+        self.device = self.create_device(food_quantity=50)
+        self.now = timezone.now()
+        for hours, log_type, quantity in [(1, 'subtract_food', 3), (2, 'subtract_water', 5), (2, 'add_food', 100), (30, 'subtract_food', 7)]:
+            self.log(log_type, quantity, self.now - timedelta(hours=hours))
+        Notification.objects.create(user=self.user, notification_type='low_food', message='Low food')
+        Subscription.objects.create(user=self.user, plan_type='premium', start_date='2026-01-01', end_date='2027-01-01', status='active')
+
+    def log(self, log_type, quantity, time):
+        with self.captureOnCommitCallbacks(execute=True):
+            UsageLog.objects.create(device=self.device, log_type=log_type, quantity=quantity, time=time)
+
+    def get(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_snapshot(self):
+        data = self.get()
+        self.assertEqual(data['pet_count'], 1)
+        self.assertEqual([(device['serial_number'], device['food_quantity']) for device in data['devices']], [('SN-1', 50)])
+        self.assertEqual((data['consumption_24h']['food'], data['consumption_24h']['water']), (3, 5))
+        self.assertEqual(data['unread_notifications'], 1)
+        self.assertEqual(data['active_subscription']['plan_type'], 'premium')
+
+    def test_warm_snapshot_reads_devices_and_rollups(self):
+        self.get()
+        with self.assertNumQueries(2):
+            self.get()
+
+    def test_consumption_follows_new_logs(self):
+        self.get()
+        self.log('subtract_food', 4, self.now)
+        with self.assertNumQueries(2):
+            data = self.get()
+        self.assertEqual(data['consumption_24h']['food'], 7)
+
+    def test_writes_invalidate_their_sections(self):
+        self.get()
+        notification = Notification.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_pet()
+            response = self.client.post(f'/api/notifications/{notification.id}/read/')
+        self.assertIsNotNone(response.data['read_at'])
+
+        enqueue([(self.device.id, 'low_water')])
+        with self.captureOnCommitCallbacks(execute=True):
+            process_outbox()
+        data = self.get()
+        self.assertEqual((data['pet_count'], data['unread_notifications']), (2, 1))
+
+    def test_only_admins_see_other_users(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+        other = self.create_user('other')
+        self.client.force_authenticate(other)
+        response = self.client.get(self.url, {'user_id': self.user.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(self.url).data['user_id'], other.id)
+
+        admin = self.create_user('admin', role='admin')
+        self.client.force_authenticate(admin)
+        response = self.client.get(self.url, {'user_id': self.user.id})
+        self.assertEqual(response.data['pet_count'], 1)
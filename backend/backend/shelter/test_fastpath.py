@@ -0,0 +1,105 @@
+from datetime import date, timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import SerializerMethodField
+
+from .fastpath import FastJSONRenderer, compile_plan
+from .models import Pet, Device, UsageLog, Habit, Notification
+from .serializers import (
+    PetSerializer, DeviceSerializer, UsageLogSerializer, HabitSerializer, NotificationSerializer, UserSerializer,
+    parse_shape,
+)
+from .test_iot import ShelterTestCase
+
+
+class FastPathTests(ShelterTestCase):
+    def setUp(self):
+        self.user = self.create_user()
+        # No role: nested objects may be null
+        self.other = self.create_user('other', role=None)
+        now = timezone.now()
+        for i, user in enumerate([self.user, self.other]):
+            pet = self.create_pet(user, name='Zoë ', breed='Lab', birth_date=date(2020, 1, 1), weight=10.5, image_url='')
+            device = self.create_device(pet, serial_number=f'SN-{i}', food_quantity=1e16)
+            Habit.objects.create(pet=pet, water_consumption=0.1, food_consumption=2,
+                                 start_date=date(2024, 1, 1), end_date=date(2024, 1, 2))
+            Notification.objects.create(user=user, notification_type='info', message='hi')
+            UsageLog.objects.create(device=device, log_type='add_food', quantity=2.5e-05, time=now,
+                                    duration=timedelta(seconds=90))
+            UsageLog.objects.create(device=device, log_type='add_food', quantity=3, time=now.replace(microsecond=0))
+
+    def expected(self, serializer_class, queryset, fields=None, expand=None):
+        serializer = serializer_class(list(queryset), many=True)
+        serializer.child._shape = parse_shape(fields, expand)
+        return JSONRenderer().render(serializer.data)
+
+    def assertIdentical(self, url, serializer_class, queryset, fields=None, expand=None):
+        params = {key: value for key, value in (('fields', fields), ('expand', expand)) if value is not None}
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        content, rows = response.content, response.json()
+        if 'results' in rows:
+            rows = rows['results']
+            content = content[len(b'{"next":null,"results":'):-1]
+        # Unordered lists come back in whatever order the plan's query returns
+        order = [row['id'] for row in rows]
+        queryset = sorted(queryset, key=lambda instance: order.index(str(instance.pk)))
+        self.assertEqual(content, self.expected(serializer_class, queryset, fields, expand))
+
+    def test_list_endpoints_are_byte_identical(self):
+        cases = [
+            ('/api/pets/', PetSerializer, Pet.objects.all()),
+            ('/api/devices/', DeviceSerializer, Device.objects.all()),
+            ('/api/habits/', HabitSerializer, Habit.objects.all()),
+            ('/api/notifications/', NotificationSerializer, Notification.objects.all()),
+            ('/api/usage-logs/', UsageLogSerializer, UsageLog.objects.order_by('-time', '-id')),
+        ]
+        shapes = [(None, None), ('id,pet.user.role', None), ('id,time,duration', ''), (None, 'pet')]
+        for url, serializer_class, queryset in cases:
+            for fields, expand in shapes:
+                with self.subTest(url=url, fields=fields, expand=expand):
+                    self.assertIdentical(url, serializer_class, queryset, fields, expand)
+
+    def test_timezone_is_honoured(self):
+        with timezone.override('Asia/Kolkata'):
+            rows = UsageLog.objects.order_by('-time', '-id')
+            plan = compile_plan(UsageLogSerializer)
+            self.assertEqual(
+                FastJSONRenderer().render(plan.build_many(rows.values(*plan.columns))),
+                self.expected(UsageLogSerializer, rows),
+            )
+            self.assertIn('+05:30', plan.build_many(rows.values(*plan.columns))[0]['time'])
+
+    @override_settings(USE_TZ=False)
+    def test_naive_datetimes(self):
+        rows = UsageLog.objects.order_by('-time', '-id')
+        plan = compile_plan(UsageLogSerializer)
+        self.assertEqual(
+            FastJSONRenderer().render(plan.build_many(rows.values(*plan.columns))),
+            self.expected(UsageLogSerializer, rows),
+        )
+
+    def test_unsupported_serializers_have_no_plan(self):
+        self.assertIsNotNone(compile_plan(UserSerializer))
+
+        class WithMethod(PetSerializer):
+            label = SerializerMethodField()
+
+            class Meta(PetSerializer.Meta):
+                fields = PetSerializer.Meta.fields + ['label']
+
+            def get_label(self, pet):
+                return pet.name.upper()
+
+        self.assertIsNone(compile_plan(WithMethod))
+        self.assertIsNotNone(compile_plan(WithMethod, 'id,name'))
+
+    def test_renderer_matches_json_renderer(self):
+        data = {'a': [1.5, None, True, ' '], 'b': {'c': 1e-7}}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import serializers, status
+
+from .cache import device_cache
+from .filters import Filter, FilterSet
+from .models import UsageLog, Notification
+from .test_iot import ShelterTestCase
+
+
+class IndexedFilterTests(ShelterTestCase):
+    def setUp(self):
+        device_cache.cache.clear()
+        self.user = self.create_user()
+        self.pet = self.create_pet()
+        self.device = self.create_device()
+        self.other_device = self.create_device(serial_number='SN-2', status='inactive')
+        self.now = timezone.now()
+        self.logs = UsageLog.objects.bulk_create([
+            UsageLog(device=self.device, log_type=log_type, quantity=hour, time=self.now - timedelta(hours=hour))
+            for hour, log_type in enumerate(['add_food', 'subtract_food', 'add_water', 'subtract_water'])
+        ])
+        UsageLog.objects.create(device=self.other_device, log_type='add_food', quantity=9, time=self.now)
+
+    def get(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json()
+
+    def test_time_range_and_log_type_in(self):
+        data = self.get('/api/usage-logs/', {
+            'device_id': self.device.id,
+            'time__gte': (self.now - timedelta(hours=2)).isoformat(),
+            'time__lt': self.now.isoformat(),
+            'log_type__in': 'subtract_food,add_water,subtract_water',
+        })
+        self.assertEqual([row['quantity'] for row in data['results']], [1, 2])
+
+    def test_ascending_order_pages_oldest_first(self):
+        params = {'device_id': self.device.id, 'ordering': 'time', 'page_size': 3}
+        first = self.get('/api/usage-logs/', params)
+        self.assertEqual([row['quantity'] for row in first['results']], [3, 2, 1])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['quantity'] for row in second['results']], [0])
+
+    def test_unindexed_filter_needs_an_indexed_one(self):
+        response = self.client.get('/api/usage-logs/', {'log_type': 'add_food'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('log_type', response.json())
+
+        data = self.get('/api/usage-logs/', {'user_id': self.user.id, 'log_type': 'add_food'})
+        self.assertEqual(sorted(row['quantity'] for row in data['results']), [0, 9])
+
+    def test_ordering_needs_the_leading_index_column(self):
+        for url, param in (('/api/usage-logs/', 'time'), ('/api/notifications/', 'created_at')):
+            response = self.client.get(url, {'ordering': param})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('ordering', response.json())
+        data = self.get('/api/usage-logs/', {'user_id': self.user.id, 'ordering': 'time'})
+        self.assertEqual([row['quantity'] for row in data['results']][:3], [3, 2, 1])
+        # A unique column leads its own index
+        self.get('/api/devices/', {'ordering': 'serial_number'})
+
+    def test_invalid_values_are_rejected(self):
+        for params in ({'device_id': 'not-a-uuid'}, {'ordering': 'quantity'}, {'user_id': self.user.id, 'time__gte': 'yesterday'}):
+            response = self.client.get('/api/usage-logs/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_device_status_and_ordering(self):
+        data = self.get('/api/devices/', {'user_id': self.user.id, 'status__in': 'active,inactive', 'ordering': '-serial_number'})
+        self.assertEqual([row['serial_number'] for row in data], ['SN-2', 'SN-1'])
+        data = self.get('/api/devices/', {'pet_id': self.pet.id, 'status': 'active'})
+        self.assertEqual([row['serial_number'] for row in data], ['SN-1'])
+
+    def test_notification_created_at_range(self):
+        Notification.objects.create(user=self.user, notification_type='low_food', message='Low food')
+        data = self.get('/api/notifications/', {'user_id': self.user.id, 'created_at__gte': self.now.isoformat()})
+        self.assertEqual(len(data), 1)
+        data = self.get('/api/notifications/', {'user_id': self.user.id, 'created_at__lt': self.now.isoformat()})
+        self.assertEqual(data, [])
+
+    def test_unindexed_declarations_fail_at_definition(self):
+        with self.assertRaises(ImproperlyConfigured):
+            class QuantityFilterSet(FilterSet):
+                model = UsageLog
+                quantity = Filter('quantity', serializers.FloatField())
+
+        with self.assertRaises(ImproperlyConfigured):
+            class OrderingFilterSet(FilterSet):
+                model = UsageLog
+                device_id = Filter('device', serializers.UUIDField())
+                ordering = ['quantity']
+
+        with self.assertRaises(ImproperlyConfigured):
+            class CreatedAtOrderingFilterSet(FilterSet):
+                model = Notification
+                ordering = ['created_at']
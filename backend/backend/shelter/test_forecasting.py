@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import status
+
+from .cache import forecast_cache
+from .forecasting import forecast_devices
+from .models import UsageLog
+from .test_iot import ShelterTestCase
+
+
+class ForecastingTests(ShelterTestCase):
+    def setUp(self):
+        forecast_cache.cache.clear()
+        self.user = self.create_user()
+        self.pet = self.create_pet()
+        self.device = self.create_device(food_quantity=100, water_quantity=50)
+        self.idle_device = self.create_device(serial_number='SN-2')
+        self.now = timezone.now()
+        # 2 units of food per hour for the whole history window
+        UsageLog.objects.bulk_create([
+            UsageLog(device=self.device, log_type='subtract_food', quantity=2, time=self.now - timedelta(hours=hour))
+            for hour in range(7 * 24)
+        ])
+
+    def test_rates_and_empty_times(self):
+        forecast = forecast_devices([(self.device.id, 100, 50), (self.idle_device.id, 0, 0)], self.now)
+        food, water = forecast[0]['food'], forecast[0]['water']
+        self.assertAlmostEqual(food['rate_per_hour'], 2, delta=0.1)
+        self.assertAlmostEqual(food['hours_until_empty'], 50, delta=3)
+        self.assertEqual(food['empty_at'], self.now + timedelta(hours=food['hours_until_empty']))
+        self.assertEqual(water['rate_per_hour'], 0)
+        self.assertIsNone(water['empty_at'])
+        self.assertEqual(forecast[1]['food']['rate_per_hour'], 0)
+
+    def test_one_history_query_per_batch_then_cached(self):
+        devices = [(self.device.id, 100, 50), (self.idle_device.id, 0, 0)]
+        with self.assertNumQueries(1):
+            forecast_devices(devices, self.now)
+        with self.assertNumQueries(0):
+            forecast_devices(devices, self.now)
+
+    def test_new_logs_fold_into_cached_rate(self):
+        before = forecast_devices([(self.device.id, 100, 50)], self.now)[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            UsageLog.objects.create(device=self.device, log_type='subtract_water', quantity=10, time=self.now)
+        with self.assertNumQueries(0):
+            after = forecast_devices([(self.device.id, 100, 50)], self.now)[0]
+        self.assertEqual(after['food']['rate_per_hour'], before['food']['rate_per_hour'])
+        self.assertGreater(after['water']['rate_per_hour'], 0)
+
+    def test_device_endpoints(self):
+        response = self.client.get(f'/api/devices/{self.device.id}/forecast/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['device_id'], self.device.id)
+        self.assertAlmostEqual(response.data['food']['rate_per_hour'], 2, delta=0.1)
+
+        response = self.client.get(f'/api/devices/forecasts/?user_id={self.user.id}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({row['device_id'] for row in response.data}, {self.device.id, self.idle_device.id})
@@ -0,0 +1,398 @@
+import asyncio
+import json
+from base64 import urlsafe_b64encode
+import threading
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User, Role, Pet, Device, UsageLog, IdempotencyKey
+from .cache import device_cache, idempotency_cache
+from .live import DeviceEventListener
+from .views import update_device_quantity
+
+
+class ShelterTestCase(APITestCase):
+    """
+    Fixture helpers shared by the shelter tests. Pets default to belonging
+    to `self.user` and devices to `self.pet`; keyword arguments override
+    any field.
+    """
+    def create_user(self, username='owner', role='user', **fields):
+        if role is not None:
+            role, _ = Role.objects.get_or_create(name=role)
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com', password='pass123', role=role, **fields
+        )
+
+    def create_pet(self, user=None, **fields):
+        return Pet.objects.create(**{
+            'user': user or self.user, 'name': 'Rex', 'breed': 'Labrador', 'species': 'Dog',
+            'birth_date': '2020-01-01', 'weight': 20, 'age': 4, **fields,
+        })
+
+    def create_device(self, pet=None, serial_number='SN-1', **fields):
+        return Device.objects.create(**{'pet': pet or self.pet, 'serial_number': serial_number, 'status': 'active', **fields})
+
+
+class IotTestCase(ShelterTestCase):
+    def setUp(self):
+        self.user = self.create_user()
+        self.pet = self.create_pet()
+        self.device = self.create_device(food_limit=100, water_limit=100)
+        self.other_device = self.create_device(serial_number='SN-2', food_limit=100, water_limit=100)
+
+
+class BatchUpdateDeviceQuantityTests(IotTestCase):
+    url = '/api/update-device-quantity/batch/'
+
+    def test_events_applied_in_time_order_per_device(self):
+        now = timezone.now()
+        events = [
+            # Listed out of order: the subtract only succeeds after the add
+            {'device_id': str(self.device.id), 'type': 'food', 'action': 'subtract', 'quantity': 30, 'time': (now + timedelta(minutes=1)).isoformat()},
+            {'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': 50, 'time': now.isoformat()},
+            {'device_id': str(self.other_device.id), 'type': 'water', 'action': 'add', 'quantity': 40},
+        ]
+        response = self.client.post(self.url, events, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['applied'], 3)
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok', 'ok', 'ok'])
+        self.assertEqual(response.data['results'][0]['food_quantity'], 20)
+
+        self.device.refresh_from_db()
+        self.other_device.refresh_from_db()
+        self.assertEqual(self.device.food_quantity, 20)
+        self.assertEqual(self.other_device.water_quantity, 40)
+        self.assertEqual(UsageLog.objects.count(), 3)
+
+    def test_invalid_events_reported_without_blocking_others(self):
+        events = [
+            {'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': 500},
+            {'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': -1},
+            {'device_id': '00000000-0000-0000-0000-000000000000', 'type': 'food', 'action': 'add', 'quantity': 1},
+            {'device_id': str(self.device.id), 'type': 'water', 'action': 'add', 'quantity': 10},
+        ]
+        response = self.client.post(self.url, events, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in response.data['results']], ['error', 'error', 'error', 'ok'])
+        self.assertEqual(response.data['failed'], 3)
+
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.food_quantity, 0)
+        self.assertEqual(self.device.water_quantity, 10)
+        self.assertEqual(UsageLog.objects.count(), 1)
+
+    def test_retried_events_are_applied_once(self):
+        events = [
+            {'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': 30, 'event_id': 'event-1'},
+            {'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': 30, 'event_id': 'event-1'},
+            {'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': 10},
+        ]
+        response = self.client.post(self.url, events, format='json')
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok', 'duplicate', 'ok'])
+        self.assertEqual(response.data['results'][1]['food_quantity'], 30)
+
+        events.append({'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': 5, 'event_id': 'event-2'})
+        response = self.client.post(self.url, events, format='json')
+        self.assertEqual([r['status'] for r in response.data['results']], ['duplicate', 'duplicate', 'ok', 'ok'])
+        self.assertEqual((response.data['applied'], response.data['duplicates'], response.data['failed']), (2, 2, 0))
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.food_quantity, 55)
+
+        # The keys are shared with the single-event endpoint
+        response = self.client.post('/api/update-device-quantity/', events[3], format='json', HTTP_IDEMPOTENCY_KEY='event-2')
+        self.assertEqual(response.data['food_quantity'], 55)
+        self.assertEqual(UsageLog.objects.count(), 4)
+
+    def test_batch_requires_list(self):
+        response = self.client.post(self.url, {'device_id': str(self.device.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UpdateDeviceQuantityTests(IotTestCase):
+    url = '/api/update-device-quantity/'
+
+    def test_add_and_subtract(self):
+        response = self.client.post(self.url, {'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': 60}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['food_quantity'], 60)
+
+        response = self.client.post(self.url, {'device_id': str(self.device.id), 'type': 'food', 'action': 'subtract', 'quantity': 15}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['food_quantity'], 45)
+        self.assertEqual(UsageLog.objects.filter(device=self.device).count(), 2)
+
+    def test_limits_are_enforced(self):
+        response = self.client.post(self.url, {'device_id': str(self.device.id), 'type': 'water', 'action': 'add', 'quantity': 101}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'device_id': str(self.device.id), 'type': 'food', 'action': 'subtract', 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.device.refresh_from_db()
+        self.assertEqual((self.device.food_quantity, self.device.water_quantity), (0, 0))
+        self.assertFalse(UsageLog.objects.exists())
+
+    def test_unknown_device(self):
+        response = self.client.post(self.url, {'device_id': '00000000-0000-0000-0000-000000000000', 'type': 'food', 'action': 'add', 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_statement_budget(self):
+        Device.objects.filter(pk=self.device.pk).update(food_quantity=50)
+        for action, budget in [('add', 2), ('subtract', 3)]:
+            with CaptureQueriesContext(connection) as context:
+                with self.captureOnCommitCallbacks(execute=True):
+                    update_device_quantity(self.device.id, 'food', action, 10)
+            # UPDATE ... RETURNING and the usage log INSERT; dispenses add one
+            # rollup upsert. The test transaction adds savepoints
+            statements = [q['sql'] for q in context.captured_queries if 'SAVEPOINT' not in q['sql']]
+            self.assertEqual(len(statements), budget, (action, statements))
+
+
+class IdempotencyKeyTests(IotTestCase):
+    url = '/api/update-device-quantity/'
+
+    def setUp(self):
+        super().setUp()
+        idempotency_cache.cache.clear()
+        self.body = {'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': 60}
+
+    def post(self, key, url=None, **body):
+        return self.client.post(url or self.url, {**self.body, **body}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_result_without_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.post('event-1')
+        self.assertEqual(first.data['food_quantity'], 60)
+        with self.assertNumQueries(0):
+            retry = self.post('event-1')
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data['food_quantity'], 60)
+
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.food_quantity, 60)
+        self.assertEqual(UsageLog.objects.count(), 1)
+
+    def test_retry_after_cache_eviction_is_answered_from_the_database(self):
+        self.post('event-1')
+        idempotency_cache.cache.clear()
+        retry = self.post('event-1', url='/api/iot/update-device-quantity/')
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.json()['food_quantity'], 60)
+        self.assertEqual(UsageLog.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().food_quantity, 60)
+
+    def test_keys_are_per_device_and_failures_are_not_recorded(self):
+        self.post('event-1')
+        response = self.post('event-1', device_id=str(self.other_device.id))
+        self.assertEqual(response.data['food_quantity'], 60)
+
+        response = self.post('event-2', quantity=50)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.filter(key='event-2').exists())
+        response = self.post('event-2', action='subtract', quantity=50)
+        self.assertEqual(response.data['food_quantity'], 10)
+
+    def test_unknown_device_and_long_keys(self):
+        response = self.post('event-1', device_id='00000000-0000-0000-0000-000000000000')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.post('x' * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UsageLog.objects.exists())
+
+
+class UsageLogPaginationTests(IotTestCase):
+    url = '/api/usage-logs/'
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        # Two rows share each timestamp so the id tie-breaker is exercised
+        UsageLog.objects.bulk_create([
+            UsageLog(device=self.device, log_type='add_food', quantity=i, time=now - timedelta(minutes=i // 2))
+            for i in range(7)
+        ])
+
+    def test_cursor_walks_every_row_once(self):
+        seen = []
+        url = f'{self.url}?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(set(seen), {str(pk) for pk in UsageLog.objects.values_list('id', flat=True)})
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'{self.url}?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor(self):
+        for data in ({'t': timezone.now().isoformat(), 'id': 'zzz'}, {'t': 1, 'id': 1}, ['t', 'id']):
+            cursor = urlsafe_b64encode(json.dumps(data).encode()).decode()
+            response = self.client.get(f'{self.url}?cursor={cursor}')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, data)
+
+    def test_export_streams_ndjson(self):
+        response = self.client.get(f'{self.url}export/?device_id={self.device.id}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows, sorted(rows, key=lambda row: (row['time'], row['id'])))
+
+
+class DeviceCacheTests(IotTestCase):
+    def setUp(self):
+        super().setUp()
+        device_cache.cache.clear()
+
+    def poll(self):
+        return self.client.get('/api/devices/', {'serial_number': 'SN-1'})
+
+    def test_poll_is_served_from_cache(self):
+        self.assertEqual(self.poll().data[0]['id'], str(self.device.id))
+        with self.assertNumQueries(0):
+            response = self.poll()
+        self.assertEqual(response.data[0]['serial_number'], 'SN-1')
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/devices/{self.device.id}/')
+        self.assertEqual(response.data['serial_number'], 'SN-1')
+
+    def test_quantity_update_invalidates(self):
+        self.poll()
+        with self.captureOnCommitCallbacks(execute=True):
+            update_device_quantity(self.device.id, 'food', 'add', 25)
+        self.assertEqual(self.poll().data[0]['food_quantity'], 25)
+
+    def test_retrieve_keys_by_canonical_id(self):
+        for pk in (str(self.device.id).upper(), self.device.id.hex):
+            self.assertEqual(self.client.get(f'/api/devices/{pk}/').data['food_quantity'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_device_quantity(self.device.id, 'food', 'add', 25)
+        response = self.client.get(f'/api/devices/{str(self.device.id).upper()}/')
+        self.assertEqual(response.data['food_quantity'], 25)
+        self.assertEqual(self.client.get('/api/devices/not-a-uuid/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stats_need_the_admin_role(self):
+        url = '/api/devices/cache-stats/'
+        staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass123',
+                                         role=self.user.role, is_staff=True)
+        self.client.force_authenticate(staff)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass123',
+                                         role=Role.objects.get_or_create(name='admin')[0])
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_device_save_and_delete_invalidate(self):
+        self.poll()
+        self.device.serial_number = 'SN-1b'
+        self.device.save()
+        self.assertEqual(self.poll().data, [])
+        self.assertEqual(self.client.get('/api/devices/', {'serial_number': 'SN-1b'}).data[0]['id'], str(self.device.id))
+
+        self.device.delete()
+        self.assertEqual(self.client.get('/api/devices/', {'serial_number': 'SN-1b'}).data, [])
+
+
+class DeviceStateTests(IotTestCase):
+    def test_state_is_one_query_and_compact(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/devices/state/', {'serial_number': 'SN-1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('pet', response.data)
+        self.assertEqual(response.data['food_limit'], 100)
+        self.assertEqual(self.client.get(f'/api/devices/{self.device.id}/state/')['ETag'], response['ETag'])
+
+    def test_etag_returns_not_modified_until_quantities_change(self):
+        etag = self.client.get('/api/devices/state/', {'serial_number': 'SN-1'})['ETag']
+        response = self.client.get('/api/devices/state/', {'serial_number': 'SN-1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        update_device_quantity(self.device.id, 'water', 'add', 5)
+        response = self.client.get('/api/devices/state/', {'serial_number': 'SN-1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['water_quantity'], 5)
+
+    def test_unknown_device(self):
+        self.assertEqual(self.client.get('/api/devices/state/', {'serial_number': 'nope'}).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/devices/not-a-uuid/state/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/devices/state/').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncIotViewTests(IotTestCase):
+    def test_state_matches_drf_endpoint(self):
+        drf = self.client.get('/api/devices/state/', {'serial_number': 'SN-1'})
+        response = self.client.get('/api/iot/devices/state/', {'serial_number': 'SN-1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), json.loads(drf.content))
+        self.assertEqual(response['ETag'], drf['ETag'])
+
+        response = self.client.get(f'/api/iot/devices/{self.device.id}/state/', HTTP_IF_NONE_MATCH=drf['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get('/api/iot/devices/missing/state/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_quantity(self):
+        url = '/api/iot/update-device-quantity/'
+        response = self.client.post(url, {'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': 30}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['food_quantity'], 30)
+        self.assertEqual(UsageLog.objects.count(), 1)
+
+        response = self.client.post(url, {'device_id': str(self.device.id), 'type': 'food', 'action': 'add', 'quantity': 80}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {'type': 'food'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_token_is_rejected(self):
+        response = self.client.get('/api/iot/devices/state/', {'serial_number': 'SN-1'}, HTTP_IOT_DEVICE_API_KEY='wrong', HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class LiveDeviceEventTests(IotTestCase):
+    def test_events_are_routed_to_the_owner_only(self):
+        listener = DeviceEventListener()
+        # Keep the test from opening a LISTEN connection
+        listener._thread = threading.current_thread()
+
+        async def scenario():
+            owner_queue = listener.subscribe(self.user.id)
+            other_queue = listener.subscribe('someone-else')
+            listener.dispatch(json.dumps({'event': 'device', 'user_id': str(self.user.id), 'food_quantity': 5}))
+            event = await asyncio.wait_for(owner_queue.get(), 1)
+            listener.unsubscribe(self.user.id, owner_queue)
+            listener.unsubscribe('someone-else', other_queue)
+            return event, other_queue.empty()
+
+        event, other_empty = asyncio.run(scenario())
+        self.assertEqual(event['food_quantity'], 5)
+        self.assertTrue(other_empty)
+        self.assertEqual(listener._subscribers, {})
+
+    def stream(self, user=None, **params):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+        return self.client.get('/api/live/devices/', params, **headers)
+
+    def test_stream_requires_asgi(self):
+        response = self.stream(self.user)
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    def test_only_admins_follow_other_users(self):
+        self.assertEqual(self.stream(user_id=str(self.user.id)).status_code, status.HTTP_401_UNAUTHORIZED)
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass123', role=self.user.role)
+        response = self.stream(other, user_id=str(self.user.id))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.stream(other, user_id=str(other.id)).status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass123',
+                                         role=Role.objects.get_or_create(name='admin')[0])
+        response = self.stream(admin, user_id=str(self.user.id))
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
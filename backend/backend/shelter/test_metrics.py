@@ -0,0 +1,41 @@
+import uuid
+
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from .metrics import MetricsMiddleware, metrics
+from .models import Pet
+from .test_iot import ShelterTestCase
+
+
+class MetricsTests(ShelterTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.user = self.create_user()
+
+    def test_requests_are_recorded_per_route(self):
+        response = self.client.get('/api/pets/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$')
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('shelter_http_requests_total{route="api/pets/",method="GET",status="200"} 1', body)
+        self.assertIn('shelter_http_request_duration_seconds_count{route="api/pets/",method="GET"} 1', body)
+        self.assertIn('shelter_http_request_queries_bucket{route="api/pets/",method="GET",le="+Inf"} 1', body)
+        self.assertIn('shelter_cache_hits_total{cache="devices"}', body)
+
+    def test_repeated_query_shape_is_flagged(self):
+        def view(request):
+            for _ in range(5):
+                Pet.objects.filter(id=uuid.uuid4()).exists()
+            return HttpResponse()
+
+        with self.assertLogs('shelter.metrics', 'WARNING'):
+            response = MetricsMiddleware(view)(RequestFactory().get('/pets/'))
+        self.assertIn('desc="5 queries"', response['Server-Timing'])
+        self.assertEqual(metrics.n_plus_one['unmatched', 'GET'], 1)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,76 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from .models import Device, Notification, NotificationOutbox
+from .notifications import DEDUPE_WINDOW, enqueue, process_outbox
+from .test_iot import IotTestCase
+from .views import update_device_quantity
+
+
+class NotificationPipelineTests(IotTestCase):
+    def setUp(self):
+        super().setUp()
+        Device.objects.filter(pk=self.device.pk).update(food_quantity=50, water_quantity=50)
+
+    def test_crossing_low_level_enqueues_once(self):
+        update_device_quantity(self.device.id, 'food', 'subtract', 20)  # 30 left, above 20% of 100
+        self.assertFalse(NotificationOutbox.objects.exists())
+        update_device_quantity(self.device.id, 'food', 'subtract', 15)  # crosses to 15
+        update_device_quantity(self.device.id, 'food', 'subtract', 5)   # already low
+        self.assertEqual(list(NotificationOutbox.objects.values_list('event_type', flat=True)), ['low_food'])
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(process_outbox(), 1)
+        notification = Notification.objects.get()
+        self.assertEqual((notification.user, notification.notification_type), (self.user, 'low_food'))
+        self.assertIn('SN-1', notification.message)
+        self.assertFalse(NotificationOutbox.objects.filter(processed_at__isnull=True).exists())
+
+    def test_repeats_within_window_are_deduplicated(self):
+        NotificationOutbox.objects.bulk_create([
+            NotificationOutbox(device=self.device, event_type='low_water'),
+            NotificationOutbox(device=self.device, event_type='low_water'),
+            NotificationOutbox(device=self.other_device, event_type='low_water'),
+        ])
+        self.assertEqual(process_outbox(), 3)
+        self.assertEqual(Notification.objects.count(), 2)
+
+        NotificationOutbox.objects.create(device=self.device, event_type='low_water')
+        process_outbox()
+        self.assertEqual(Notification.objects.count(), 2)
+
+        outside_window = timezone.now() - DEDUPE_WINDOW - timedelta(minutes=1)
+        NotificationOutbox.objects.filter(notification__isnull=False).update(processed_at=outside_window)
+        NotificationOutbox.objects.create(device=self.device, event_type='low_water')
+        process_outbox()
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_low_battery_on_device_update(self):
+        self.device.battery_quantity = 10
+        self.device.save()
+        self.device.save()
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        process_outbox()
+        self.assertEqual(Notification.objects.get().notification_type, 'low_battery')
+
+    def test_pending_events_are_not_enqueued_twice(self):
+        enqueue([(self.device.id, 'low_water'), (self.device.id, 'low_water'), (self.other_device.id, 'low_water')])
+        enqueue([(self.device.id, 'low_water'), (self.device.id, 'low_food')])
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+        process_outbox()
+        enqueue([(self.device.id, 'low_water')])
+        self.assertEqual(NotificationOutbox.objects.filter(processed_at__isnull=True).count(), 1)
+
+    def test_purge_keeps_pending_and_recent_events(self):
+        enqueue([(self.device.id, 'low_water'), (self.other_device.id, 'low_water')])
+        process_outbox()
+        NotificationOutbox.objects.filter(device=self.device).update(processed_at=timezone.now() - timedelta(days=8))
+        enqueue([(self.device.id, 'low_food')])
+        call_command('purge_notification_outbox', stdout=StringIO())
+        self.assertEqual(
+            sorted(NotificationOutbox.objects.values_list('device__serial_number', 'event_type')),
+            [('SN-1', 'low_food'), ('SN-2', 'low_water')],
+        )
@@ -0,0 +1,89 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .cache import device_cache
+from .models import Pet, Device, UsageLog
+from .ownership import stale_devices, stale_rollups, stale_usage_logs
+from .test_iot import ShelterTestCase
+from .views import update_device_quantity
+
+
+class DenormalizedOwnerTests(ShelterTestCase):
+    def setUp(self):
+        device_cache.cache.clear()
+        self.user = self.create_user()
+        self.other_user = self.create_user('other')
+        self.pet = self.create_pet()
+        self.other_pet = self.create_pet(self.other_user)
+        self.device = self.create_device(food_limit=100)
+
+    def assertOwners(self, log, pet, user):
+        log.refresh_from_db()
+        self.assertEqual((log.pet_id, log.owner_id), (pet.id, user.id))
+
+    def test_writes_fill_owner_columns(self):
+        self.assertEqual(self.device.owner_id, self.user.id)
+        log = UsageLog.objects.create(device=self.device, log_type='add_food', quantity=1, time=timezone.now())
+        self.assertOwners(log, self.pet, self.user)
+
+        device = Device.objects.get(pk=self.device.pk)
+        [log] = UsageLog.objects.bulk_create([
+            UsageLog(device_id=device.id, log_type='add_food', quantity=1, time=timezone.now())
+        ])
+        self.assertOwners(log, self.pet, self.user)
+
+        update_device_quantity(self.device.id, 'food', 'add', 10)
+        self.assertOwners(UsageLog.objects.latest('time'), self.pet, self.user)
+
+    def test_moving_a_device_carries_its_logs(self):
+        log = UsageLog.objects.create(device=self.device, log_type='add_food', quantity=1, time=timezone.now())
+        device = Device.objects.get(pk=self.device.pk)
+        device.pet_id = self.other_pet.id
+        device.save()
+        self.assertEqual(device.owner_id, self.other_user.id)
+        self.assertOwners(log, self.other_pet, self.other_user)
+
+    def test_changing_a_pet_owner_carries_devices_and_logs(self):
+        log = UsageLog.objects.create(device=self.device, log_type='add_food', quantity=1, time=timezone.now())
+        pet = Pet.objects.get(pk=self.pet.pk)
+        pet.user = self.other_user
+        pet.save()
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.owner_id, self.other_user.id)
+        self.assertOwners(log, self.pet, self.other_user)
+
+    def test_unrelated_saves_do_not_touch_logs(self):
+        device = Device.objects.get(pk=self.device.pk)
+        device.status = 'inactive'
+        with CaptureQueriesContext(connection) as context:
+            device.save()
+        tables = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertNotIn('shelter_usagelog', tables)
+        self.assertNotIn('shelter_pet', tables)
+
+    def test_owner_filters_read_one_table(self):
+        UsageLog.objects.create(device=self.device, log_type='add_food', quantity=1, time=timezone.now())
+        for url in ('/api/usage-logs/', '/api/devices/'):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, {'user_id': self.user.id, 'fields': 'id'})
+            self.assertEqual(len(response.data['results'] if 'results' in response.data else response.data), 1)
+            self.assertNotIn('JOIN', context.captured_queries[-1]['sql'])
+
+    def test_backfill_command_repairs_bypassed_writes(self):
+        log = UsageLog.objects.create(device=self.device, log_type='subtract_food', quantity=1, time=timezone.now())
+        Device.objects.filter(pk=self.device.pk).update(pet=self.other_pet)
+        self.assertEqual(stale_rollups().count(), 2)
+        self.assertEqual(stale_devices().count(), 1)
+        with self.assertRaises(CommandError):
+            call_command('backfill_owners', '--check', stdout=StringIO())
+
+        call_command('backfill_owners', '--chunk-size', '1', stdout=StringIO())
+        self.assertOwners(log, self.other_pet, self.other_user)
+        self.assertFalse(stale_devices().exists())
+        self.assertFalse(stale_usage_logs().exists())
+        self.assertFalse(stale_rollups().exists())
+        call_command('backfill_owners', '--check', stdout=StringIO())
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from django.test import TestCase
+
+from .models import User, Role
+from .permissions import IsAdminUser, IsSpecificRole, IsUser, role_registry
+
+
+class RolePermissionTests(TestCase):
+    def setUp(self):
+        self.user_role, _ = Role.objects.get_or_create(name='user')
+        self.admin_role, _ = Role.objects.get_or_create(name='admin')
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pass123', role=self.user_role)
+        self.request = SimpleNamespace(user=self.user)
+        # Role changes committed to the registry by earlier tests were rolled back
+        role_registry.refresh()
+
+    def test_checks_run_without_queries(self):
+        view = SimpleNamespace(allowed_roles=['Admin', 'USER'])
+        with self.assertNumQueries(0):
+            self.assertTrue(IsUser().has_permission(self.request, None))
+            self.assertFalse(IsAdminUser().has_permission(self.request, None))
+            self.assertTrue(IsSpecificRole().has_permission(self.request, view))
+            self.assertFalse(IsSpecificRole().has_permission(self.request, SimpleNamespace()))
+
+    def test_registry_follows_role_changes(self):
+        self.user_role.name = 'member'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_role.save()
+        self.assertFalse(IsUser().has_permission(self.request, None))
+        view = SimpleNamespace(allowed_roles=['member'])
+        self.assertTrue(IsSpecificRole().has_permission(self.request, view))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            staff = Role.objects.create(name='staff')
+        self.user.role = staff
+        self.assertTrue(IsSpecificRole().has_permission(self.request, SimpleNamespace(allowed_roles=['staff'])))
@@ -0,0 +1,55 @@
+from datetime import date
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from .models import (
+    User, Role, UserDetails, Pet, Notification,
+    Subscription, Payment, Device, UsageLog, Habit
+)
+
+
+class ListQueryCountTests(APITestCase):
+    """
+    Every list endpoint must run the same number of queries
+    no matter how many rows it returns.
+    """
+    endpoints = [
+        '/api/users/', '/api/roles/', '/api/user-details/', '/api/pets/',
+        '/api/notifications/', '/api/subscriptions/', '/api/payments/',
+        '/api/devices/', '/api/usage-logs/', '/api/habits/',
+    ]
+
+    def setUp(self):
+        self.sequence = 0
+
+    def seed(self, count):
+        for _ in range(count):
+            self.sequence += 1
+            n = self.sequence
+            role = Role.objects.create(name=f'role-{n}')
+            user = User.objects.create_user(username=f'user-{n}', email=f'user-{n}@example.com', password='pass123', role=role)
+            UserDetails.objects.create(user=user, first_name='A', last_name='B', birth_date=date(1990, 1, 1), phone_number='1')
+            pet = Pet.objects.create(user=user, name='Rex', breed='Lab', species='Dog', birth_date=date(2020, 1, 1), weight=10, age=4)
+            Notification.objects.create(user=user, notification_type='info', message='hi')
+            subscription = Subscription.objects.create(user=user, plan_type='basic', start_date=date(2024, 1, 1), end_date=date(2025, 1, 1), status='active')
+            Payment.objects.create(subscription=subscription, amount=10, payment_date=date(2024, 1, 1), payment_method='card', currency='USD')
+            device = Device.objects.create(pet=pet, serial_number=f'SN-{n}', status='active')
+            UsageLog.objects.create(device=device, log_type='add_food', quantity=1, time=timezone.now())
+            Habit.objects.create(pet=pet, water_consumption=1, food_consumption=1, start_date=date(2024, 1, 1), end_date=date(2024, 1, 2))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        self.seed(1)
+        baseline = {url: self.count_queries(url) for url in self.endpoints}
+        self.seed(5)
+        for url in self.endpoints:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), baseline[url])
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework import status
+
+from .models import ConsumptionRollup, Habit, Pet, UsageLog
+from .rollups import rebuild_rollups, record_usage
+from .test_iot import IotTestCase
+
+
+class ConsumptionRollupTests(IotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = datetime(2024, 5, 1, tzinfo=dt_timezone.utc)
+
+    def log(self, log_type, quantity, hours, device=None):
+        return UsageLog(device=device or self.device, log_type=log_type, quantity=quantity, time=self.day + timedelta(hours=hours))
+
+    def test_created_logs_update_buckets(self):
+        self.log('subtract_food', 10, 1.5).save()
+        self.log('subtract_food', 5, 1.75).save()
+        self.log('add_food', 100, 2).save()
+
+        hourly = ConsumptionRollup.objects.get(granularity='hour')
+        self.assertEqual(hourly.bucket_start, self.day + timedelta(hours=1))
+        self.assertEqual((hourly.food_consumption, hourly.water_consumption), (15, 0))
+        self.assertEqual(ConsumptionRollup.objects.get(granularity='day').food_consumption, 15)
+
+    def test_bulk_record_matches_rebuild(self):
+        logs = [
+            self.log('subtract_food', 10, 1),
+            self.log('subtract_water', 20, 3),
+            self.log('subtract_water', 5, 3.5, device=self.other_device),
+            self.log('subtract_food', 7, 30),
+        ]
+        UsageLog.objects.bulk_create(logs)
+        record_usage(logs)
+        incremental = set(ConsumptionRollup.objects.values_list('device_id', 'granularity', 'bucket_start', 'food_consumption', 'water_consumption'))
+
+        rebuild_rollups()
+        rebuilt = set(ConsumptionRollup.objects.values_list('device_id', 'granularity', 'bucket_start', 'food_consumption', 'water_consumption'))
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(len(rebuilt), 7)
+
+    def test_changed_and_deleted_logs_leave_the_buckets(self):
+        log = self.log('subtract_food', 10, 1)
+        log.save()
+        self.log('subtract_food', 5, 1).save()
+
+        response = self.client.patch(f'/api/usage-logs/{log.id}/', {'quantity': 4, 'log_type': 'subtract_water'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        hourly = ConsumptionRollup.objects.get(granularity='hour')
+        self.assertEqual((hourly.food_consumption, hourly.water_consumption), (5, 4))
+
+        response = self.client.delete(f'/api/usage-logs/{log.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        incremental = set(ConsumptionRollup.objects.values_list('granularity', 'food_consumption', 'water_consumption'))
+        rebuild_rollups()
+        rebuilt = set(ConsumptionRollup.objects.values_list('granularity', 'food_consumption', 'water_consumption'))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_device_moves_take_their_buckets_along(self):
+        self.log('subtract_food', 10, 1).save()
+        pet = Pet.objects.create(user=self.user, name='Max', breed='Beagle', species='Dog', birth_date='2021-01-01', weight=10, age=3)
+        self.device.pet = pet
+        self.device.save()
+        self.log('subtract_food', 5, 1).save()
+
+        incremental = set(ConsumptionRollup.objects.values_list('pet_id', 'granularity', 'food_consumption'))
+        self.assertEqual(incremental, {(pet.id, 'hour', 15), (pet.id, 'day', 15)})
+        rebuild_rollups()
+        self.assertEqual(set(ConsumptionRollup.objects.values_list('pet_id', 'granularity', 'food_consumption')), incremental)
+
+    def test_summary_endpoint(self):
+        logs = [
+            self.log('subtract_food', 10, 1),
+            self.log('subtract_water', 5, 1, device=self.other_device),
+            self.log('subtract_food', 3, 2),
+        ]
+        UsageLog.objects.bulk_create(logs)
+        record_usage(logs)
+
+        response = self.client.get('/api/habits/summary/', {
+            'pet_id': str(self.pet.id), 'granularity': 'hour',
+            'start': self.day.isoformat(), 'end': (self.day + timedelta(days=1)).isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        buckets = [(b['food_consumption'], b['water_consumption']) for b in response.data['buckets']]
+        self.assertEqual(buckets, [(10, 5), (3, 0)])
+
+        response = self.client.get('/api/habits/summary/', {'granularity': 'week'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refresh_habits_command(self):
+        self.log('subtract_food', 10, 1).save()
+        self.log('subtract_water', 4, 25).save()
+        call_command('refresh_habits', '--start=2024-05-01', '--end=2024-05-02', stdout=StringIO())
+
+        habit = Habit.objects.get(pet=self.pet)
+        self.assertEqual((habit.food_consumption, habit.water_consumption), (10, 4))
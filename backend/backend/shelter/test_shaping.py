@@ -0,0 +1,83 @@
+from datetime import date
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .cache import device_cache
+from .models import Pet, UsageLog, Habit
+from .test_iot import ShelterTestCase
+
+
+class ResponseShapingTests(ShelterTestCase):
+    def setUp(self):
+        device_cache.cache.clear()
+        self.user = self.create_user()
+        self.pet = self.create_pet()
+        self.device = self.create_device()
+        for day in range(1, 4):
+            Habit.objects.create(pet=self.pet, water_consumption=1, food_consumption=2,
+                                 start_date=date(2024, 1, day), end_date=date(2024, 1, day + 1))
+            UsageLog.objects.create(device=self.device, log_type='add_food', quantity=day, time=timezone.now())
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [query['sql'] for query in context.captured_queries]
+
+    def test_full_shape_by_default(self):
+        data, _ = self.get('/api/habits/')
+        self.assertEqual(data[0]['pet']['user']['role']['name'], 'user')
+
+    def test_fields_prune_joins_and_columns(self):
+        data, queries = self.get('/api/habits/', {'fields': 'id,food_consumption,pet.name'})
+        self.assertEqual(data[0], {'id': data[0]['id'], 'food_consumption': 2, 'pet': {'name': 'Rex'}})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('shelter_user', queries[0])
+        self.assertNotIn('water_consumption', queries[0])
+        self.assertNotIn('breed', queries[0])
+
+    def test_expand_collapses_unexpanded_objects_to_ids(self):
+        data, queries = self.get('/api/habits/', {'expand': ''})
+        self.assertEqual(data[0]['pet'], str(self.pet.id))
+        self.assertNotIn('JOIN', queries[0])
+
+        data, queries = self.get('/api/habits/', {'expand': 'pet'})
+        self.assertEqual(data[0]['pet']['name'], 'Rex')
+        self.assertEqual(data[0]['pet']['user'], str(self.user.id))
+        self.assertNotIn('shelter_user', queries[0])
+
+        data, _ = self.get('/api/habits/', {'fields': 'pet.user.username', 'expand': ''})
+        self.assertEqual(data[0], {'pet': {'user': {'username': 'owner'}}})
+
+    def test_shaped_lists_run_a_constant_number_of_queries(self):
+        _, queries = self.get('/api/usage-logs/', {'fields': 'quantity'})
+        for _ in range(5):
+            UsageLog.objects.create(device=self.device, log_type='add_food', quantity=1, time=timezone.now())
+        data, more_queries = self.get('/api/usage-logs/', {'fields': 'quantity', 'page_size': 4})
+        self.assertEqual(len(more_queries), len(queries))
+        self.assertEqual(data['results'][0], {'quantity': 1})
+        self.assertIsNotNone(data['next'])
+
+    def test_shaped_device_reads_bypass_the_cache(self):
+        full, _ = self.get(f'/api/devices/{self.device.id}/')
+        data, _ = self.get(f'/api/devices/{self.device.id}/', {'fields': 'serial_number'})
+        self.assertEqual(data, {'serial_number': 'SN-1'})
+        cached, queries = self.get(f'/api/devices/{self.device.id}/')
+        self.assertEqual(cached, full)
+        self.assertEqual(queries, [])
+
+    def test_fields_do_not_prune_writes(self):
+        response = self.client.patch(f'/api/pets/{self.pet.id}/?fields=id', {'name': 'Max'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Max')
+        self.pet.refresh_from_db()
+        self.assertEqual(self.pet.name, 'Max')
+
+        response = self.client.post('/api/pets/?fields=id', {
+            'user_id': str(self.user.id), 'name': 'Bella', 'breed': 'Beagle', 'species': 'Dog',
+            'birth_date': '2021-02-03', 'weight': 10, 'age': 3,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Pet.objects.get(id=response.json()['id']).birth_date, date(2021, 2, 3))
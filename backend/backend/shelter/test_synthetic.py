@@ -0,0 +1,31 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Sum
+from django.test import TestCase
+
+from .models import Pet, Device, UsageLog, ConsumptionRollup
+
+
+class SeedBenchmarkDataTests(TestCase):
+    def test_seeds_dataset_and_manifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manifest_path = os.path.join(directory, 'manifest.json')
+            args = ['--users=2', '--pets-per-user=2', '--devices-per-pet=2', '--logs=500', '--batch-size=200', f'--manifest={manifest_path}']
+            call_command('seed_benchmark_data', *args, stdout=StringIO())
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+
+            with self.assertRaises(CommandError):
+                call_command('seed_benchmark_data', *args, stdout=StringIO())
+
+        self.assertEqual(len(manifest['users']), 2)
+        self.assertEqual(len(manifest['devices']), 8)
+        self.assertEqual((Pet.objects.count(), Device.objects.count(), UsageLog.objects.count()), (4, 8, 500))
+        consumed = UsageLog.objects.filter(log_type='subtract_food').aggregate(total=Sum('quantity'))['total']
+        daily = ConsumptionRollup.objects.filter(granularity=ConsumptionRollup.DAY).aggregate(total=Sum('food_consumption'))['total']
+        self.assertAlmostEqual(consumed, daily, places=4)
@@ -1,9 +1,10 @@
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     SignUpViewSet, UpdateDeviceQuantityViewSet, UserViewSet, RoleViewSet, UserDetailsViewSet, PetViewSet, NotificationViewSet,
-    SubscriptionViewSet, PaymentViewSet, DeviceViewSet, UsageLogViewSet, HabitViewSet
+    SubscriptionViewSet, PaymentViewSet, DeviceViewSet, UsageLogViewSet, HabitViewSet, DashboardViewSet
 )
 
 router = DefaultRouter()
@@ -17,6 +18,7 @@ router.register('payments', PaymentViewSet)
 router.register('devices', DeviceViewSet)
 router.register('usage-logs', UsageLogViewSet)
 router.register('habits', HabitViewSet)
+router.register('dashboard', DashboardViewSet, basename='dashboard')
 router.register(r'update-device-quantity', UpdateDeviceQuantityViewSet, basename='update-device-quantity')
 
 
@@ -28,5 +30,10 @@ urlpatterns = [
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
     path('schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('signup/', SignUpViewSet.as_view({'post': 'create'}), name='signup'),
+    # Async IoT endpoints, served natively under ASGI
+    path('iot/devices/state/', async_views.device_state, name='iot-device-state'),
+    path('iot/devices/<str:pk>/state/', async_views.device_state, name='iot-device-state-detail'),
+    path('iot/update-device-quantity/', async_views.update_quantity, name='iot-update-device-quantity'),
+    path('live/devices/', async_views.device_events, name='live-device-events'),
     path('', include(router.urls)),
 ]
@@ -1,85 +1,216 @@
+import codecs
+import hashlib
 import os
+import uuid
+from copy import copy
+from datetime import timedelta
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from .models import (
     User, Role, UserDetails, Pet, Notification,
-    Subscription, Payment, Device, UsageLog, Habit
+    Subscription, Payment, Device, UsageLog, Habit, ConsumptionRollup, IdempotencyKey
 )
 from .serializers import (
-    ModifyQuantitySerializer, SignUpSerializer, UserSerializer, RoleSerializer, UserDetailsSerializer, PetSerializer, NotificationSerializer,
-    SubscriptionSerializer, PaymentSerializer, DeviceSerializer, UsageLogSerializer, HabitSerializer
+    ModifyQuantitySerializer, ModifyQuantityEventSerializer, SignUpSerializer, UserSerializer, RoleSerializer, UserDetailsSerializer, PetSerializer, NotificationSerializer,
+    SubscriptionSerializer, PaymentSerializer, DeviceSerializer, UsageLogSerializer, HabitSerializer,
+    ConsumptionSummaryQuerySerializer, DashboardQuerySerializer, BulkImportQuerySerializer, BulkExportQuerySerializer, loaded_fields, related_lookups
 )
+from . import dashboard, forecasting
+from .bulk import CONTENT_TYPES, IMPORTERS, export_lines, read_rows
+from .cache import device_cache, forecast_cache, idempotency_cache
+from .fastpath import compile_plan
+from .filters import (
+    UserDetailsFilterSet, NotificationFilterSet, SubscriptionFilterSet, DeviceFilterSet, UsageLogFilterSet
+)
+from .notifications import enqueue, low_level_event
+from .pagination import TimeCursorPagination
+from .permissions import IsAdminUser, has_role
+from .rollups import consumption_summary, record_usage
 
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny
-from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.http import StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
 from django.utils import timezone
 
+
+class RelatedQuerysetMixin:
+    """
+    Join or prefetch every relation the serializer nests, so list
+    endpoints run a constant number of queries regardless of row count.
+    Reads shaped by `?fields=` / `?expand=` join only what they render and
+    load only those columns, plus `required_fields` the view itself reads.
+    """
+    required_fields = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, expand = self.get_shape_params()
+        serializer_class = self.get_serializer_class()
+        select_related, prefetch_related = related_lookups(serializer_class, fields, expand)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if fields or expand is not None:
+            only = loaded_fields(serializer_class, fields, expand)
+            if only is not None:
+                queryset = queryset.only(*only, *self.required_fields)
+        return queryset
+
+    def get_shape_params(self):
+        # Only reads are shaped, see ShapedSerializerMixin
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return None, None
+        return self.request.query_params.get('fields') or None, self.request.query_params.get('expand')
+
+
+class FastListMixin:
+    """
+    Build list responses from `.values()` rows with a precompiled
+    `shelter.fastpath` plan instead of serializer fields per row; the
+    output is the same. Needs RelatedQuerysetMixin. Serializers without
+    a plan use the regular list.
+    """
+    def list(self, request, *args, **kwargs):
+        plan = compile_plan(self.get_serializer_class(), *self.get_shape_params())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        columns = dict.fromkeys((*plan.columns, *self.required_fields))
+        queryset = self.filter_queryset(self.get_queryset()).values(*columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.build_many(page))
+        return Response(plan.build_many(queryset))
+
+
+class BulkImportExportMixin:
+    """
+    `import` and `export` actions moving many rows at once as CSV or
+    NDJSON; see `shelter.bulk`. `import_kind` names the importer to use.
+    """
+    import_kind = None
+    export_ordering = ('id',)
+    export_chunk_size = 2000
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser])
+    def bulk_import(self, request):
+        """
+        Import rows from the request body or an uploaded `file`.
+        The format comes from `file_format`, the file name or the content type.
+        """
+        serializer = BulkImportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                raise ValidationError({'file': ["No file was submitted."]})
+            source, name = upload, upload.name
+        else:
+            source, name = request._request, ''
+        file_format = serializer.validated_data.get('file_format') or (
+            'csv' if name.endswith('.csv') or request.content_type == CONTENT_TYPES['csv'] else 'ndjson'
+        )
+
+        try:
+            importer = IMPORTERS[self.import_kind](conflict=serializer.validated_data['conflict'])
+        except ValueError as exc:
+            raise ValidationError({'conflict': [str(exc)]})
+        rows = read_rows(codecs.iterdecode(source, 'utf-8-sig'), file_format)
+        return Response(importer.run(rows), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Stream the filtered rows as NDJSON or CSV, in `export_ordering`.
+        Rows are read through a server-side cursor so memory stays constant.
+        """
+        serializer = BulkExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        file_format = serializer.validated_data['file_format']
+        queryset = self.filter_queryset(self.get_queryset()).order_by(*self.export_ordering)
+        return StreamingHttpResponse(
+            export_lines(queryset, file_format, self.export_chunk_size), content_type=CONTENT_TYPES[file_format]
+        )
+
+
 # IAM
 class RoleViewSet(viewsets.ModelViewSet):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(RelatedQuerysetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
 
 # Profiles
-class UserDetailsViewSet(viewsets.ModelViewSet):
+class UserDetailsViewSet(RelatedQuerysetMixin, viewsets.ModelViewSet):
     queryset = UserDetails.objects.all()
     serializer_class = UserDetailsSerializer
-
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user_id = self.request.query_params.get('user_id')
-        if user_id:
-            queryset = queryset.filter(user__id=user_id)
-        return queryset
+    filterset_class = UserDetailsFilterSet
 
 
 # Pets
-class PetViewSet(viewsets.ModelViewSet):
+class PetViewSet(BulkImportExportMixin, FastListMixin, RelatedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Pet.objects.all()
     serializer_class = PetSerializer
+    import_kind = 'pets'
 
 
 # Communications
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(FastListMixin, RelatedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
+    filterset_class = NotificationFilterSet
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user_id = self.request.query_params.get('user_id')
-        if user_id:
-            queryset = queryset.filter(user__id=user_id)
-        return queryset
+    @action(detail=True, methods=['post'], url_path='read')
+    def read(self, request, pk=None):
+        """
+        Mark the notification read; repeated calls keep the first read time.
+        """
+        notification = self.get_object()
+        if notification.read_at is None:
+            notification.read_at = timezone.now()
+            notification.save(update_fields=['read_at'])
+        return Response(self.get_serializer(notification).data)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        dashboard.invalidate([instance.user_id], 'notifications')
 
 
 # Subscriptions & Billing
-class SubscriptionViewSet(viewsets.ModelViewSet):
+class SubscriptionViewSet(RelatedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Subscription.objects.all()
     serializer_class = SubscriptionSerializer
-
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user_id = self.request.query_params.get('user_id')
-        if user_id:
-            queryset = queryset.filter(user__id=user_id)
-        return queryset
+    filterset_class = SubscriptionFilterSet
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(RelatedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
 
 
 # Tracking
-class DeviceViewSet(viewsets.ModelViewSet):
+DEVICE_STATE_FIELDS = (
+    'id', 'serial_number', 'status', 'food_quantity', 'water_quantity',
+    'battery_quantity', 'food_limit', 'water_limit',
+)
+
+
+def device_state_etag(state):
+    return quote_etag(hashlib.md5(repr([state[field] for field in DEVICE_STATE_FIELDS]).encode()).hexdigest())
+
+
+class DeviceViewSet(BulkImportExportMixin, FastListMixin, RelatedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Device.objects.all()
     serializer_class = DeviceSerializer
+    filterset_class = DeviceFilterSet
+    import_kind = 'devices'
 
     def get_authenticators(self):
         """
@@ -95,34 +226,160 @@ class DeviceViewSet(viewsets.ModelViewSet):
             return []
         return super().get_authenticators()
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user_id = self.request.query_params.get('user_id', None)
-        if user_id:
-            queryset = queryset.filter(pet__user__id=user_id)
-        serial_number = self.request.query_params.get('serial_number', None)
-        if serial_number:
-            queryset = queryset.filter(serial_number=serial_number)
-        return queryset
+    def list(self, request, *args, **kwargs):
+        """
+        Feeder polls by serial number are served from the device cache.
+        """
+        serial_number = request.query_params.get('serial_number')
+        if not serial_number or set(request.query_params) != {'serial_number'}:
+            return super().list(request, *args, **kwargs)
+
+        def load():
+            device = self.filter_queryset(self.get_queryset()).first()
+            return self.get_serializer(device).data if device else None
+
+        data = device_cache.get_by_serial(serial_number, load)
+        return Response([data] if data else [])
+
+    def retrieve(self, request, *args, **kwargs):
+        # The cache holds the full shape only
+        if self.get_shape_params() != (None, None):
+            return super().retrieve(request, *args, **kwargs)
+        # Key by the canonical form, which invalidation by `instance.id` uses
+        try:
+            device_id = str(uuid.UUID(str(kwargs['pk'])))
+        except ValueError:
+            raise NotFound(detail="Device not found")
+        data = device_cache.get_by_id(device_id, lambda: self.get_serializer(self.get_object()).data)
+        return Response(data)
+
+    @action(detail=False, methods=['get'], url_path='state')
+    def state(self, request):
+        """
+        Compact quantity/status payload for feeders polling by serial number.
+        """
+        serial_number = request.query_params.get('serial_number')
+        if not serial_number:
+            raise ValidationError({'serial_number': ['This query parameter is required.']})
+        return self.state_response(request, serial_number=serial_number)
+
+    @action(detail=True, methods=['get'], url_path='state', url_name='state-detail')
+    def detail_state(self, request, pk=None):
+        try:
+            device_id = uuid.UUID(str(pk))
+        except ValueError:
+            raise NotFound(detail="Device not found")
+        return self.state_response(request, id=device_id)
+
+    def state_response(self, request, **lookup):
+        """
+        One indexed values() query, no model instances. Answers 304 when the
+        client's If-None-Match matches the current state.
+        """
+        state = Device.objects.filter(**lookup).values(*DEVICE_STATE_FIELDS).first()
+        if state is None:
+            raise NotFound(detail="Device not found")
+        etag = device_state_etag(state)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(state)
+        response['ETag'] = etag
+        return response
+
+    @action(detail=True, methods=['get'], url_path='forecast')
+    def forecast(self, request, pk=None):
+        """
+        Recent dispense rates and predicted empty times of one device.
+        """
+        device = self.get_object()
+        forecasts = forecasting.forecast_devices([(device.id, device.food_quantity, device.water_quantity)])
+        return Response(forecasts[0])
 
+    @action(detail=False, methods=['get'], url_path='forecasts')
+    def forecasts(self, request):
+        """
+        Forecasts for every device matching the list filters, e.g. ?user_id=.
+        """
+        return Response(forecasting.forecast_queryset(self.filter_queryset(self.get_queryset())))
 
-class UsageLogViewSet(viewsets.ModelViewSet):
-    queryset = UsageLog.objects.all()
-    serializer_class = UsageLogSerializer
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(device_cache.stats())
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user_id = self.request.query_params.get('user_id')
-        if user_id:
-            queryset = queryset.filter(device__pet__user__id=user_id)
-        device_id = self.request.query_params.get('device_id')
-        if device_id:
-            queryset = queryset.filter(device__id=device_id)
-        return queryset
 
-class HabitViewSet(viewsets.ModelViewSet):
+class UsageLogViewSet(BulkImportExportMixin, FastListMixin, RelatedQuerysetMixin, viewsets.ModelViewSet):
+    queryset = UsageLog.objects.all()
+    serializer_class = UsageLogSerializer
+    pagination_class = TimeCursorPagination
+    import_kind = 'usage-logs'
+    export_ordering = ('time', 'id')
+    # Read by the cursor pagination
+    required_fields = ('time', 'id')
+    filterset_class = UsageLogFilterSet
+
+    # Created logs reach the rollups through post_save; changes and deletes
+    # take the old amounts back out
+    def perform_update(self, serializer):
+        old = copy(serializer.instance)
+        with transaction.atomic():
+            record_usage([old], sign=-1)
+            instance = serializer.save()
+            record_usage([instance])
+        forecast_cache.invalidate({old.device_id, instance.device_id})
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            record_usage([instance], sign=-1)
+            super().perform_destroy(instance)
+        forecast_cache.invalidate([instance.device_id])
+
+
+class HabitViewSet(FastListMixin, RelatedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Habit.objects.all()
     serializer_class = HabitSerializer
+    summary_windows = {
+        ConsumptionRollup.HOUR: timedelta(days=2),
+        ConsumptionRollup.DAY: timedelta(days=30),
+    }
+
+    @action(detail=False, methods=['get'], url_path='summary')
+    def summary(self, request):
+        """
+        Pre-aggregated consumption of a pet per hour or day bucket.
+        """
+        serializer = ConsumptionSummaryQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        granularity = serializer.validated_data['granularity']
+        end = serializer.validated_data.get('end') or timezone.now()
+        start = serializer.validated_data.get('start') or end - self.summary_windows[granularity]
+
+        buckets = consumption_summary(serializer.validated_data['pet_id'], granularity, start, end)
+        return Response({
+            "pet_id": serializer.validated_data['pet_id'],
+            "granularity": granularity,
+            "start": start,
+            "end": end,
+            "buckets": buckets,
+        }, status=status.HTTP_200_OK)
+
+
+# Dashboard
+class DashboardViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        """
+        Snapshot of the authenticated user's pets, devices, last-day
+        consumption, unread notifications and active subscription.
+        Admins may pass `user_id` to see another user's.
+        """
+        serializer = DashboardQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        user_id = serializer.validated_data.get('user_id', request.user.id)
+        if user_id != request.user.id and not has_role(request.user, ('admin',)):
+            raise PermissionDenied("Only admins can view another user's dashboard.")
+        return Response(dashboard.snapshot(user_id), status=status.HTTP_200_OK)
 
 
 class SignUpViewSet(viewsets.ViewSet):
@@ -146,6 +403,156 @@ class SignUpViewSet(viewsets.ViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
+QUANTITY_ERRORS = {
+    ('add', 'food'): "Food quantity cannot exceed the food limit.",
+    ('add', 'water'): "Water quantity cannot exceed the water limit.",
+    ('subtract', 'food'): "Food quantity cannot be negative.",
+    ('subtract', 'water'): "Water quantity cannot be negative.",
+}
+
+
+def apply_quantity_change(device, type, action, quantity):
+    """
+    Apply an add/subtract of food or water to `device` in memory,
+    enforcing the food/water limits. Raises ValidationError on violation.
+    """
+    if action == 'add':
+        if type == 'food':
+            new_food_quantity = device.food_quantity + quantity
+            if new_food_quantity > device.food_limit:
+                raise ValidationError(QUANTITY_ERRORS[('add', 'food')])
+            device.food_quantity = new_food_quantity
+
+        elif type == 'water':
+            new_water_quantity = device.water_quantity + quantity
+            if new_water_quantity > device.water_limit:
+                raise ValidationError(QUANTITY_ERRORS[('add', 'water')])
+            device.water_quantity = new_water_quantity
+
+    elif action == 'subtract':
+        if type == 'food':
+            new_food_quantity = device.food_quantity - quantity
+            if new_food_quantity < 0:
+                raise ValidationError(QUANTITY_ERRORS[('subtract', 'food')])
+            device.food_quantity = new_food_quantity
+
+        elif type == 'water':
+            new_water_quantity = device.water_quantity - quantity
+            if new_water_quantity < 0:
+                raise ValidationError(QUANTITY_ERRORS[('subtract', 'water')])
+            device.water_quantity = new_water_quantity
+
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def idempotency_key(request):
+    """
+    The Idempotency-Key header of an IoT update, or None when not sent.
+    """
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER) or None
+    if key is not None and len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValidationError({IDEMPOTENCY_KEY_HEADER: [
+            f"Ensure this header has no more than {IDEMPOTENCY_KEY_MAX_LENGTH} characters."
+        ]})
+    return key
+
+
+def update_device_quantity(device_id, type, action, quantity, idempotency_key=None):
+    """
+    Atomically add/subtract food or water on a device and log the usage.
+    The limit check runs inside a single conditional UPDATE so concurrent
+    writers never lose updates. Returns (food_quantity, water_quantity).
+
+    With an `idempotency_key`, a retry of an update already applied to the
+    device returns the original result and writes nothing. Keys are claimed
+    by a unique row in the same transaction, so concurrent retries apply once.
+    """
+    if idempotency_key is None:
+        return _update_device_quantity(device_id, type, action, quantity)
+
+    result = idempotency_cache.get(device_id, idempotency_key)
+    if result is not None:
+        return result
+    try:
+        return _update_device_quantity(device_id, type, action, quantity, idempotency_key)
+    except IntegrityError:
+        result = IdempotencyKey.objects.filter(device_id=device_id, key=idempotency_key).values_list(
+            'food_quantity', 'water_quantity'
+        ).first()
+        if result is None:
+            if not Device.objects.filter(id=device_id).exists():
+                raise NotFound(detail="Device not found")
+            raise
+        idempotency_cache.set(device_id, idempotency_key, result)
+        return result
+
+
+def _update_device_quantity(device_id, type, action, quantity, idempotency_key=None):
+    quantity_field = f'{type}_quantity'
+    with transaction.atomic():
+        if idempotency_key is not None:
+            claim = IdempotencyKey.objects.create(device_id=device_id, key=idempotency_key)
+        if connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_columns_from_insert:
+            # UPDATE ... RETURNING: check, write and read back in one statement
+            quote = connection.ops.quote_name
+            column = quote(quantity_field)
+            if action == 'add':
+                assignment = f"{column} = {column} + %s"
+                condition = f"{column} + %s <= {quote(f'{type}_limit')}"
+            else:
+                assignment = f"{column} = {column} - %s"
+                condition = f"{column} - %s >= 0"
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {quote(Device._meta.db_table)} SET {assignment} "
+                    f"WHERE {quote('id')} = %s AND {condition} "
+                    f"RETURNING {quote('food_quantity')}, {quote('water_quantity')}, {quote('serial_number')}, "
+                    f"{quote(f'{type}_limit')}, {quote('pet_id')}, {quote('owner_id')}",
+                    [quantity, Device._meta.pk.get_db_prep_value(device_id, connection), quantity]
+                )
+                row = cursor.fetchone()
+            if row is None:
+                if not Device.objects.filter(id=device_id).exists():
+                    raise NotFound(detail="Device not found")
+                raise ValidationError(QUANTITY_ERRORS[(action, type)])
+            food_quantity, water_quantity, serial_number, limit, pet_id, owner_id = row
+        else:
+            try:
+                device = Device.objects.select_for_update().get(id=device_id)
+            except Device.DoesNotExist:
+                raise NotFound(detail="Device not found")
+            apply_quantity_change(device, type, action, quantity)
+            device.save(update_fields=[quantity_field])
+            food_quantity, water_quantity, serial_number = device.food_quantity, device.water_quantity, device.serial_number
+            limit = getattr(device, f'{type}_limit')
+            pet_id, owner_id = device.pet_id, device.owner_id
+
+        UsageLog.objects.create(
+            device_id=device_id,
+            pet_id=pet_id,
+            owner_id=owner_id,
+            log_type=f"{action}_{type}",
+            quantity=quantity,
+            time=timezone.now(),
+            duration=None  # Assuming you calculate duration if needed
+        )
+        transaction.on_commit(lambda: device_cache.invalidate([(device_id, serial_number)]))
+
+        new_quantity = food_quantity if type == 'food' else water_quantity
+        event_type = low_level_event(type, action, quantity, new_quantity, limit)
+        if event_type:
+            enqueue([(device_id, event_type)])
+
+        if idempotency_key is not None:
+            IdempotencyKey.objects.filter(pk=claim.pk).update(food_quantity=food_quantity, water_quantity=water_quantity)
+            result = (food_quantity, water_quantity)
+            transaction.on_commit(lambda: idempotency_cache.set(device_id, idempotency_key, result))
+
+    return food_quantity, water_quantity
+
+
 class UpdateDeviceQuantityViewSet(viewsets.ViewSet):
 
     def get_authenticators(self):
@@ -168,63 +575,125 @@ class UpdateDeviceQuantityViewSet(viewsets.ViewSet):
             quantity = serializer.validated_data['quantity']
             action = serializer.validated_data['action']
 
-            # Check if the device exists
-            try:
-                device = Device.objects.get(id=device_id)
-            except Device.DoesNotExist:
-                raise NotFound(detail="Device not found")
-
-            # Adjust the quantity based on action
-            if action == 'add':
-                if type == 'food':
-                    new_food_quantity = device.food_quantity + quantity
-                    if new_food_quantity > device.food_limit:
-                        raise ValidationError("Food quantity cannot exceed the food limit.")
-                    device.food_quantity = new_food_quantity
-
-                elif type == 'water':
-                    new_water_quantity = device.water_quantity + quantity
-                    if new_water_quantity > device.water_limit:
-                        raise ValidationError("Water quantity cannot exceed the water limit.")
-                    device.water_quantity = new_water_quantity
-
-            elif action == 'subtract':
-                if type == 'food':
-                    new_food_quantity = device.food_quantity - quantity
-                    if new_food_quantity < 0:
-                        raise ValidationError("Food quantity cannot be negative.")
-                    device.food_quantity = new_food_quantity
-
-                elif type == 'water':
-                    new_water_quantity = device.water_quantity - quantity
-                    if new_water_quantity < 0:
-                        raise ValidationError("Water quantity cannot be negative.")
-                    device.water_quantity = new_water_quantity
-
-            # Save the updated device
-            device.save()
-
-            # Create a UsageLog entry
-            usage_log = UsageLog.objects.create(
-                device=device,
-                log_type=f"{action}_{type}",
-                quantity=quantity,
-                time=timezone.now(),
-                duration=None  # Assuming you calculate duration if needed
+            # Adjust the quantity and create a UsageLog entry in one transaction
+            food_quantity, water_quantity = update_device_quantity(
+                device_id, type, action, quantity, idempotency_key(request)
             )
 
-            # TODO: Create a Notification entry
-            #notification = Notification.objects.create(
-            #    user=device.pet.user,
-            #    notification_type="usage_log_created",
-            #    message=f"{action.capitalize()} operation successful and usage log created."
-            #)
-
             # Return the updated quantities and success message
             return Response({
-                "food_quantity": device.food_quantity,
-                "water_quantity": device.water_quantity,
+                "food_quantity": food_quantity,
+                "water_quantity": water_quantity,
                 "message": f"{action.capitalize()} operation successful and usage log created."
             }, status=status.HTTP_200_OK)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request):
+        """
+        Apply a list of buffered feeder events in one request.
+        Events are applied in time order per device with the same limit rules
+        as `create`; the response holds one result per event, in request order.
+        An event whose `event_id` was already applied to its device, by an
+        earlier batch or as the Idempotency-Key of `create`, is not applied
+        again: its result is 'duplicate' with the quantities first returned.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError("Expected a list of events.")
+
+        now = timezone.now()
+        results = [None] * len(request.data)
+        events = []
+        for index, item in enumerate(request.data):
+            serializer = ModifyQuantityEventSerializer(data=item)
+            if serializer.is_valid():
+                events.append((index, serializer.validated_data))
+            else:
+                results[index] = {"index": index, "status": "error", "errors": serializer.errors}
+
+        with transaction.atomic():
+            device_ids = {event['device_id'] for _, event in events}
+            devices = Device.objects.select_for_update().in_bulk(device_ids)
+            # Event ids already applied to these devices, by earlier batches or `create`
+            applied = {
+                (device_id, key): (food_quantity, water_quantity)
+                for device_id, key, food_quantity, water_quantity in IdempotencyKey.objects.filter(
+                    device_id__in=device_ids, key__in={event['event_id'] for _, event in events if 'event_id' in event}
+                ).values_list('device_id', 'key', 'food_quantity', 'water_quantity')
+            }
+
+            # Replay each device's events in the order they happened on the device
+            events.sort(key=lambda item: (item[1].get('time') or now, item[0]))
+
+            usage_logs = []
+            low_level_events = []
+            claims = []
+            touched = {}
+            for index, event in events:
+                device = devices.get(event['device_id'])
+                if device is None:
+                    results[index] = {"index": index, "status": "error", "errors": {"device_id": ["Device not found"]}}
+                    continue
+                claim = (device.pk, event['event_id']) if 'event_id' in event else None
+                if claim in applied:
+                    food_quantity, water_quantity = applied[claim]
+                    results[index] = {
+                        "index": index,
+                        "status": "duplicate",
+                        "device_id": device.pk,
+                        "food_quantity": food_quantity,
+                        "water_quantity": water_quantity,
+                    }
+                    continue
+                try:
+                    apply_quantity_change(device, event['type'], event['action'], event['quantity'])
+                except ValidationError as exc:
+                    results[index] = {"index": index, "status": "error", "errors": exc.detail}
+                    continue
+
+                touched[device.pk] = device
+                new_quantity = getattr(device, f"{event['type']}_quantity")
+                event_type = low_level_event(
+                    event['type'], event['action'], event['quantity'], new_quantity, getattr(device, f"{event['type']}_limit")
+                )
+                if event_type:
+                    low_level_events.append((device.pk, event_type))
+                usage_logs.append(UsageLog(
+                    device=device,
+                    log_type=f"{event['action']}_{event['type']}",
+                    quantity=event['quantity'],
+                    time=event.get('time') or now,
+                    duration=None
+                ))
+                if claim is not None:
+                    applied[claim] = (device.food_quantity, device.water_quantity)
+                    claims.append(IdempotencyKey(
+                        device=device, key=claim[1], food_quantity=device.food_quantity, water_quantity=device.water_quantity
+                    ))
+                results[index] = {
+                    "index": index,
+                    "status": "ok",
+                    "device_id": device.pk,
+                    "food_quantity": device.food_quantity,
+                    "water_quantity": device.water_quantity,
+                }
+
+            if touched:
+                Device.objects.bulk_update(touched.values(), ['food_quantity', 'water_quantity'])
+                invalidated = [(device.id, device.serial_number) for device in touched.values()]
+                transaction.on_commit(lambda: device_cache.invalidate(invalidated))
+            if usage_logs:
+                UsageLog.objects.bulk_create(usage_logs)
+                record_usage(usage_logs)
+                forecasting.record_usage(usage_logs)
+            IdempotencyKey.objects.bulk_create(claims)
+            enqueue(low_level_events)
+
+        duplicates = sum(result['status'] == 'duplicate' for result in results)
+        return Response({
+            "applied": len(usage_logs),
+            "duplicates": duplicates,
+            "failed": len(results) - len(usage_logs) - duplicates,
+            "results": results,
+        }, status=status.HTTP_200_OK)
@@ -12,8 +12,16 @@ echo "Applying database migrations"
 python manage.py makemigrations
 python manage.py migrate --noinput
 
-# Start the server using gunicorn
+# Keep upcoming usage log partitions ready (no-op unless the table is partitioned)
+python manage.py partition_usage_logs
+
+# Start the server using gunicorn; SERVER_MODE=asgi runs uvicorn workers
+# so slow feeder connections wait on the event loop instead of a worker
 echo "Starting the server"
-gunicorn backend.wsgi:application --bind 0.0.0.0:8000
+if [ "$SERVER_MODE" = "asgi" ]; then
+    gunicorn backend.asgi:application --bind 0.0.0.0:8000 -k uvicorn.workers.UvicornWorker
+else
+    gunicorn backend.wsgi:application --bind 0.0.0.0:8000
+fi
 
 # command docker run -dp 127.0.0.1:8000:8000 <container>
\ No newline at end of file